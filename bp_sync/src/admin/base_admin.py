@@ -1,4 +1,18 @@
+from typing import Any
+
 from sqladmin import ModelView
+from starlette.requests import Request
+
+from services.base_repositories.existence_index import (
+    INDEXED_FIELDS,
+    get_existence_index,
+)
+from services.entities.reference_cache import get_reference_cache
+
+
+def _indexed_values(model: Any) -> dict[str, Any]:
+    """Значения полей индекса существования записи"""
+    return {field: getattr(model, field, None) for field in INDEXED_FIELDS}
 
 
 # Базовые модели
@@ -10,3 +24,43 @@ class BaseAdmin(ModelView):  # type: ignore[misc]
     can_export = True
     can_view_details = True
     icon = "fa-solid fa-table"
+
+    async def on_model_change(
+        self,
+        data: dict[str, Any],
+        model: Any,
+        is_created: bool,
+        request: Request,
+    ) -> None:
+        # Прежние значения нужны, чтобы убрать их из индекса существования
+        request.state.indexed_values = (
+            {} if is_created else _indexed_values(model)
+        )
+
+    async def after_model_change(
+        self,
+        data: dict[str, Any],
+        model: Any,
+        is_created: bool,
+        request: Request,
+    ) -> None:
+        # Правка справочника сбрасывает кэш справочников процесса
+        get_reference_cache().invalidate_for(type(model))
+        index = get_existence_index()
+        previous = getattr(request.state, "indexed_values", {})
+        current = _indexed_values(model)
+        for field, value in previous.items():
+            if value is not None and value != current[field]:
+                await index.discard(type(model), field, value)
+        await index.add_entities([model])
+
+    async def on_model_delete(self, model: Any, request: Request) -> None:
+        request.state.indexed_values = _indexed_values(model)
+
+    async def after_model_delete(self, model: Any, request: Request) -> None:
+        get_reference_cache().invalidate_for(type(model))
+        index = get_existence_index()
+        previous = getattr(request.state, "indexed_values", {})
+        for field, value in previous.items():
+            if value is not None:
+                await index.discard(type(model), field, value)
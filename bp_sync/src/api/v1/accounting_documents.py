@@ -12,7 +12,6 @@ from services.dependencies import (
     get_delivery_note_repository_dep,
     request_context,
 )
-from services.exceptions import ConflictException
 
 from .deps import verify_api_key
 
@@ -29,10 +28,7 @@ async def create_billing(
     ),
 ) -> JSONResponse:
 
-    try:
-        billing_db = await billing_repository.create_entity(billing_create)
-    except ConflictException:
-        billing_db = await billing_repository.update_entity(billing_create)
+    [billing_db] = await billing_repository.upsert_entities([billing_create])
 
     return JSONResponse(
         status_code=status.HTTP_200_OK,
@@ -49,14 +45,9 @@ async def create_delivery_note(
         get_delivery_note_repository_dep
     ),
 ) -> JSONResponse:
-    try:
-        delivery_note_db = await delivery_note_repository.create_entity(
-            delivery_note_create
-        )
-    except ConflictException:
-        delivery_note_db = await delivery_note_repository.update_entity(
-            delivery_note_create
-        )
+    [delivery_note_db] = await delivery_note_repository.upsert_entities(
+        [delivery_note_create]
+    )
 
     return JSONResponse(
         status_code=status.HTTP_200_OK,
@@ -1,4 +1,5 @@
 import time
+import uuid
 from datetime import date
 from typing import Any
 
@@ -7,27 +8,12 @@ from fastapi.responses import JSONResponse
 
 from core.logger import logger
 from core.settings import settings
-from services.deals.deal_bitrix_services import DealBitrixClient
-from services.deals.deal_import_services import DealProcessor
+from models.sync_models import SyncJob
+from schemas.job_schemas import JobDetail, JobRead, LoadDealsParams
 from services.deals.deal_services import DealClient
 from services.deals.enums import NotificationScopeEnum
-from services.dependencies import (
-    get_deal_bitrix_client_dep,
-    get_deal_client_dep,
-    get_invoice_bitrix_client_dep,
-    get_invoice_client_dep,
-    get_timeline_comment_bitrix_client_dep,
-    get_timeline_comment_repository_dep,
-)
-from services.invoices.invoice_bitrix_services import InvoiceBitrixClient
-from services.invoices.invoice_services import InvoiceClient
-from services.rabbitmq_client import RabbitMQClient, get_rabbitmq
-from services.timeline_comments.timeline_comment_bitrix_services import (
-    TimeLineCommentBitrixClient,
-)
-from services.timeline_comments.timeline_comment_repository import (
-    TimelineCommentRepository,
-)
+from services.dependencies import get_deal_client_dep
+from services.jobs.job_service import LOAD_DEALS, get_job_service
 
 from ..deps import verify_api_key
 
@@ -37,7 +23,10 @@ deals_router = APIRouter(prefix="/deals")
 @deals_router.get(
     "/load-deals",
     summary="Load deals",
-    description="Uploading deals for period to db.",
+    description=(
+        "Starts background job uploading deals for period to db. "
+        "Returns job id, progress is available at /deals/jobs/{job_id}."
+    ),
 )  # type: ignore
 async def load_deals(
     start_date: date = Query(
@@ -47,68 +36,77 @@ async def load_deals(
         ..., description="Дата окончания в формате YYYY-MM-DD"
     ),
     deal_id: int | str | None = None,
-    deal_bitrix_client: DealBitrixClient = Depends(get_deal_bitrix_client_dep),
-    deal_client: DealClient = Depends(get_deal_client_dep),
-    invoice_bitrix_client: InvoiceBitrixClient = Depends(
-        get_invoice_bitrix_client_dep
-    ),
-    invoice_client: InvoiceClient = Depends(get_invoice_client_dep),
-    rabbitmq_client: RabbitMQClient = Depends(get_rabbitmq),
-    timeline_client: TimeLineCommentBitrixClient = Depends(
-        get_timeline_comment_bitrix_client_dep
-    ),
-    timeline_repo: TimelineCommentRepository = Depends(
-        get_timeline_comment_repository_dep
-    ),
 ) -> JSONResponse:
-    logger.info("Start loading deals")
-    deal_ids: list[int] = (
-        [int(deal_id)]
-        if deal_id
-        else await deal_bitrix_client.get_deal_ids_for_period(
-            start_date, end_date
-        )
+    params = LoadDealsParams(
+        start_date=start_date,
+        end_date=end_date,
+        deal_id=int(deal_id) if deal_id else None,
     )
-    logger.info(f"Loading deals total: {len(deal_ids)}")
-    # Инициализируем процессор
-    processor = DealProcessor(
-        deal_client=deal_client,
-        invoice_bitrix_client=invoice_bitrix_client,
-        invoice_client=invoice_client,
-        timeline_client=timeline_client,
-        timeline_repo=timeline_repo,
-        rabbitmq_client=rabbitmq_client,
+    job = await get_job_service().submit(
+        LOAD_DEALS, params.model_dump(mode="json")
+    )
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={"job_id": str(job.id), "status": job.status},
     )
 
-    # Обрабатываем сделки
-    deal_success: dict[str, Any] = {}
-    deal_fail: dict[str, Any] = {}
 
-    for current_deal_id in deal_ids:
-        if not current_deal_id:
-            continue
-        logger.info(f"Start loading deal id: {current_deal_id}")
-        is_success, message = await processor.process_single_deal(
-            int(current_deal_id)
-        )
+@deals_router.get(
+    "/jobs",
+    summary="Deal loading jobs",
+    description="Recent background jobs loading deals.",
+    dependencies=[Depends(verify_api_key)],
+)  # type: ignore
+async def list_load_jobs(
+    limit: int = Query(20, ge=1, le=100),
+) -> list[JobRead]:
+    jobs = await get_job_service().list_jobs(LOAD_DEALS, limit)
+    return [JobRead.model_validate(job) for job in jobs]
 
-        if is_success:
-            deal_success[str(current_deal_id)] = message
-        else:
-            deal_fail[str(current_deal_id)] = message
 
-    return JSONResponse(
-        status_code=status.HTTP_200_OK,
-        content={
-            "deal_success": deal_success,
-            "deal_fail": deal_fail,
-            "total_processed": len(deal_ids),
-            "successful": len(deal_success),
-            "failed": len(deal_fail),
-        },
+@deals_router.get(
+    "/jobs/{job_id}",
+    summary="Deal loading job",
+    description="Job status, progress and per-deal results.",
+    dependencies=[Depends(verify_api_key)],
+)  # type: ignore
+async def get_load_job(job_id: uuid.UUID) -> JobDetail:
+    return JobDetail.model_validate(  # type: ignore[no-any-return]
+        _job_or_404(await get_job_service().get(job_id))
+    )
+
+
+@deals_router.post(
+    "/jobs/{job_id}/cancel",
+    summary="Cancel deal loading job",
+    dependencies=[Depends(verify_api_key)],
+)  # type: ignore
+async def cancel_load_job(job_id: uuid.UUID) -> JobRead:
+    return JobRead.model_validate(  # type: ignore[no-any-return]
+        _job_or_404(await get_job_service().cancel(job_id))
     )
 
 
+@deals_router.post(
+    "/jobs/{job_id}/resume",
+    summary="Resume deal loading job",
+    description="Continues cancelled or failed job from unprocessed deals.",
+    dependencies=[Depends(verify_api_key)],
+)  # type: ignore
+async def resume_load_job(job_id: uuid.UUID) -> JobRead:
+    return JobRead.model_validate(  # type: ignore[no-any-return]
+        _job_or_404(await get_job_service().resume(job_id))
+    )
+
+
+def _job_or_404(job: SyncJob | None) -> SyncJob:
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Job not found"
+        )
+    return job
+
+
 @deals_router.post(
     "/set-source",
     summary="Set source deal",
@@ -5,8 +5,10 @@ from fastapi.responses import JSONResponse
 
 from core.logger import logger
 from services.base_services.base_service import BaseEntityClient
+from services.bitrix_services.entity_cache import get_bitrix_entity_cache
 from services.companies.company_services import CompanyClient
 from services.contacts.contact_services import ContactClient
+from services.delta_sync.delta_sync_service import get_delta_sync
 from services.dependencies import (
     get_company_client_dep,
     get_contact_client_dep,
@@ -18,6 +20,8 @@ from services.invoices.invoice_services import InvoiceClient
 from services.leads.lead_services import LeadClient
 from services.users.user_services import UserClient
 
+from ..deps import verify_api_key
+
 entity_router = APIRouter(prefix="/entities")
 
 
@@ -79,6 +83,54 @@ async def handle_bitrix24_webhook_invoice(
     )
 
 
+@entity_router.get(
+    "/cache-stats",
+    summary="Entity cache stats",
+    description="Hit rate of the Bitrix entity get cache.",
+    dependencies=[Depends(verify_api_key)],
+)  # type: ignore
+async def entity_cache_stats() -> JSONResponse:
+    return JSONResponse(content=get_bitrix_entity_cache().stats())
+
+
+@entity_router.post(
+    "/delta-sync",
+    summary="Run delta sync",
+    description=(
+        "Starts incremental sync of entities changed in Bitrix24 since "
+        "the stored watermarks. Runs in background."
+    ),
+    dependencies=[Depends(verify_api_key)],
+)  # type: ignore
+async def run_delta_sync() -> JSONResponse:
+    started = get_delta_sync().trigger()
+    return JSONResponse(
+        status_code=(
+            status.HTTP_202_ACCEPTED if started else status.HTTP_409_CONFLICT
+        ),
+        content={
+            "status": "started" if started else "already running",
+            "timestamp": time.time(),
+        },
+    )
+
+
+@entity_router.get(
+    "/delta-sync",
+    summary="Delta sync state",
+    description="Stored watermarks and results of the last sync run.",
+    dependencies=[Depends(verify_api_key)],
+)  # type: ignore
+async def delta_sync_state() -> JSONResponse:
+    delta_sync = get_delta_sync()
+    return JSONResponse(
+        content={
+            "watermarks": await delta_sync.get_watermarks(),
+            **delta_sync.stats(),
+        }
+    )
+
+
 async def _handle_bitrix24_webhook(
     request: Request,
     entity_client: BaseEntityClient,  # type: ignore[type-arg]
@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse
+
+from services.base_repositories.existence_index import get_existence_index
+from services.base_services.change_stats import get_change_stats
+from services.base_services.related_freshness import get_related_freshness
+from services.bitrix_services.entity_cache import get_bitrix_entity_cache
+from services.circuit_breaker import get_circuit_breakers_metrics
+from services.deals.deal_lock_service import get_deal_lock_metrics
+from services.delta_sync.delta_sync_service import get_delta_sync
+from services.entities.reference_cache import get_reference_cache
+from services.jobs.job_service import get_job_service
+from services.webhook_coalescer import get_webhook_coalescer
+from services.webhook_queue import get_webhook_queue
+
+from .deps import verify_api_key
+
+metrics_router = APIRouter(dependencies=[Depends(verify_api_key)])
+
+
+@metrics_router.get(
+    "/",
+    summary="Service metrics",
+    description="State of upstream circuit breakers, caches and queues.",
+)  # type: ignore
+async def get_metrics() -> JSONResponse:
+    webhook_coalescer = await get_webhook_coalescer()
+    return JSONResponse(
+        content={
+            "upstreams": get_circuit_breakers_metrics(),
+            "entity_cache": get_bitrix_entity_cache().stats(),
+            "webhook_queue": get_webhook_queue().stats(),
+            "webhook_coalescer": webhook_coalescer.stats(),
+            "deal_locks": get_deal_lock_metrics(),
+            "delta_sync": get_delta_sync().stats(),
+            "jobs": get_job_service().stats(),
+            "change_detection": get_change_stats().snapshot(),
+            "related_freshness": get_related_freshness().stats(),
+            "existence_index": get_existence_index().stats(),
+            "reference_cache": get_reference_cache().stats(),
+        }
+    )
@@ -115,7 +115,7 @@ async def check(
     await deal_client.send_notifications_overdue_deals()
     # result = await product_hundler._transformation_fields(2177)
     # print(result)
-    # await deal_client.checking_deals()
+    # await deal_client.checking_deals(resume=False)
     result = None
     if result:
         ...
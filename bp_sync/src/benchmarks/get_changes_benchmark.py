@@ -0,0 +1,154 @@
+"""
+Микробенчмарк сравнения схем: CommonFieldMixin.get_changes против
+прежней реализации с разбором типов на каждое поле.
+
+Запуск из каталога src:
+    python -m benchmarks.get_changes_benchmark [число_повторов]
+"""
+
+import sys
+import timeit
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Any, cast, get_args
+
+from pydantic import BaseModel
+
+from schemas.base_schemas import SERVICE_FIELDS
+from schemas.deal_schemas import DealCreate
+from services.deals.enums import EXCLUDE_FIELDS_FOR_COMPARE
+
+
+def _legacy_values_equal(field_name: str, value1: Any, value2: Any) -> bool:
+    """Прежняя реализация CommonFieldMixin._are_values_equal"""
+    if value1 is None and value2 is None:
+        return True
+    if field_name == "company_id":
+        if value1 in (0, None) and value2 in (0, None):
+            return True
+    if field_name in ("defects", "related_deals"):
+        if value1 in ([], None) and value2 in ([], None):
+            return True
+        return False
+    if value1 is None or value2 is None:
+        return False
+    if hasattr(value1, "value") and hasattr(value2, "value"):
+        return bool(value1.value == value2.value)
+    if isinstance(value1, BaseModel) and isinstance(value2, BaseModel):
+        return bool(value1.model_dump() == value2.model_dump())
+    if isinstance(value1, (list, dict)) and isinstance(value2, (list, dict)):
+        return bool(value1 == value2)
+    return bool(value1 == value2)
+
+
+def legacy_get_changes(
+    schema: BaseModel, entity: BaseModel, exclude_fields: set[str]
+) -> dict[str, dict[str, Any]]:
+    """Прежняя реализация CommonFieldMixin.get_changes"""
+    differences: dict[str, dict[str, Any]] = {}
+    for field_name in schema.__class__.model_fields:
+        if field_name in exclude_fields:
+            continue
+        old_value = getattr(schema, field_name)
+        new_value = getattr(entity, field_name)
+        if not _legacy_values_equal(field_name, old_value, new_value):
+            differences[field_name] = {
+                "internal": old_value,
+                "external": new_value,
+            }
+    return differences
+
+
+def _sample_value(annotation: Any) -> Any:
+    types = [arg for arg in get_args(annotation) or (annotation,)]
+    for arg in types:
+        if isinstance(arg, type) and issubclass(arg, Enum):
+            return next(iter(arg))
+    for arg in types:
+        if arg is bool:
+            return False
+        if arg is int:
+            return 1
+        if arg is float:
+            return 1.0
+        if arg is str:
+            return "value"
+        if arg is datetime:
+            return datetime(2025, 1, 1, tzinfo=timezone.utc)
+    return None
+
+
+def make_deal(**overrides: Any) -> DealCreate:
+    values = {
+        name: (
+            _sample_value(field_info.annotation)
+            if field_info.is_required()
+            else field_info.get_default(call_default_factory=True)
+        )
+        for name, field_info in DealCreate.model_fields.items()
+    }
+    values.update(overrides)
+    # Разбор JSON даёт каждой сделке собственные объекты значений, как у
+    # данных из Битрикс24 и БД: сравнение не сокращается на проверке is
+    return cast(
+        DealCreate,
+        DealCreate.model_validate_json(
+            DealCreate.model_construct(**values).model_dump_json()
+        ),
+    )
+
+
+def main(number: int) -> None:
+    deal_b24 = make_deal(title="new title", opportunity=1500.0)
+    deal_db = make_deal(title="old title", opportunity=1000.0)
+    exclude = set(EXCLUDE_FIELDS_FOR_COMPARE)
+
+    legacy = legacy_get_changes(deal_b24, deal_db, exclude)
+    current = deal_b24.get_changes(deal_db, exclude_fields=exclude)
+    assert legacy == current, (legacy, current)
+
+    cases = {
+        "legacy get_changes": lambda: legacy_get_changes(
+            deal_b24, deal_db, exclude
+        ),
+        "get_changes": lambda: deal_b24.get_changes(
+            deal_db, exclude_fields=exclude
+        ),
+        "get_changes (service fields)": lambda: deal_b24.get_changes(
+            deal_db, exclude_fields=set(SERVICE_FIELDS)
+        ),
+    }
+    timings = {
+        name: min(timeit.repeat(case, number=number, repeat=5)) / number
+        for name, case in cases.items()
+    }
+    fields = len(DealCreate.model_fields)
+    print(f"DealCreate: {fields} fields, {len(current)} changed")
+    for name, seconds in timings.items():
+        print(f"{name:32} {seconds * 1e6:8.2f} us/call")
+    speedup = timings["legacy get_changes"] / timings["get_changes"]
+    print(f"speedup: x{speedup:.1f}")
+
+    pairs = [(deal_b24, deal_db)] * 1000
+    legacy_bulk = min(
+        timeit.repeat(
+            lambda: [legacy_get_changes(a, b, exclude) for a, b in pairs],
+            number=1,
+            repeat=5,
+        )
+    )
+    bulk = min(
+        timeit.repeat(
+            lambda: DealCreate.diff_many(pairs, exclude),
+            number=1,
+            repeat=5,
+        )
+    )
+    print(
+        f"1000 pairs: legacy {legacy_bulk * 1e3:.2f} ms, "
+        f"diff_many {bulk * 1e3:.2f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -8,8 +8,7 @@ from core.settings import settings
 
 
 def create_directory(path: str) -> None:
-    if not os.path.exists(path):
-        os.makedirs(path)
+    os.makedirs(path, exist_ok=True)
 
 
 create_directory(os.path.join(settings.BASE_DIR, "logs"))
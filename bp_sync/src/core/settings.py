@@ -70,6 +70,82 @@ class Settings(BaseSettings):  # type: ignore
     CHAT_SUPERVISOR: int = 115
     TYPE_CHAT_SUPERVISOR: bool = False
 
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    HTTP2_ENABLED: bool = False
+
+    BITRIX_RATE_LIMIT: float = 2.0  # запросов в секунду
+    BITRIX_RATE_BURST: int = 50
+    BITRIX_OPERATING_LIMIT: float = 480.0  # секунд на метод за 10 минут
+    BITRIX_RATE_LIMIT_RETRIES: int = 5
+    BITRIX_BATCH_COALESCING: bool = False
+    BITRIX_BATCH_WINDOW_MS: int = 5
+    BITRIX_LIST_PARALLEL_BATCHES: int = 2
+    BITRIX_SINGLE_FLIGHT: bool = True
+    BITRIX_ENTITY_CACHE_SIZE: int = 5000
+    BITRIX_ENTITY_CACHE_REDIS: bool = False
+    BITRIX_DEAL_BUNDLE: bool = True  # сделка и связанные данные одним batch
+    # Время жизни записей кэша get по типу сущности (секунд)
+    BITRIX_ENTITY_CACHE_TTL: dict[str, int] = {
+        "company": 300,
+        "contact": 300,
+        "lead": 120,
+        "user": 900,
+        "invoice": 60,
+    }
+    # Сколько секунд связанная сущность считается актуальной после
+    # синхронизации и не обновляется при сохранении ссылающихся на неё
+    RELATED_REFRESH_TTL: dict[str, int] = {
+        "user": 86400,
+        "source": 86400,
+        "company": 300,
+        "contact": 300,
+        "lead": 120,
+    }
+    RELATED_FRESHNESS_SIZE: int = 20000
+    # Общий индекс существующих записей для проверки связанных объектов
+    EXISTENCE_INDEX_ENABLED: bool = True
+    EXISTENCE_INDEX_REFRESH: int = 3600  # секунд между перестроениями
+    EXISTENCE_INDEX_REDIS: bool = False
+    # Секунд до перезагрузки кэша справочников (стадии, фирмы отгрузки...)
+    REFERENCE_CACHE_TTL: int = 600
+
+    CIRCUIT_FAILURE_THRESHOLD: int = 5
+    CIRCUIT_RECOVERY_TIMEOUT: float = 30.0  # секунд до пробного запроса
+    BULKHEAD_ACQUIRE_TIMEOUT: float = 10.0  # секунд ожидания слота
+    # Максимум одновременных запросов к апстриму
+    BULKHEAD_LIMITS: dict[str, int] = {
+        "bitrix": 20,
+        "bitrix_oauth": 5,
+        "php_endpoint": 5,
+        "bolashaq": 5,
+    }
+
+    # Обработка вебхуков в фоновых воркерах через очередь RabbitMQ
+    WEBHOOK_ASYNC_PROCESSING: bool = True
+    WEBHOOK_QUEUE_NAME: str = "bitrix_webhooks"
+    WEBHOOK_WORKERS: int = 4
+    WEBHOOK_MAX_ATTEMPTS: int = 3
+    WEBHOOK_RETRY_DELAY: float = 5.0  # задержка первого повтора, удваивается
+    WEBHOOK_DEBOUNCE_SECONDS: float = 2.0  # "тихое" окно перед обработкой
+    WEBHOOK_COALESCE_TTL: int = 600  # секунд жизни состояния объединения
+    WEBHOOK_QUEUED_TTL: int = 60  # секунд жизни запланированной обработки
+    WEBHOOK_ECHO_TTL: int = 120  # секунд хранения отметки о своей записи
+
+    # Инкрементальная синхронизация по дате изменения
+    DELTA_SYNC_ENABLED: bool = True
+    DELTA_SYNC_INTERVAL: int = 300  # секунд между запусками
+    DELTA_SYNC_OVERLAP: int = 60  # секунд запаса к водяному знаку
+    DELTA_SYNC_CHUNK: int = 50  # сущностей в пачке сохранения
+    DELTA_SYNC_LOCK_TTL: int = 3600  # секунд блокировки запуска
+    DELTA_SYNC_MAX_ATTEMPTS: int = 5  # запусков, удерживающих водяной знак
+
+    # Фоновые задания загрузки
+    JOB_CONCURRENCY: int = 4  # параллельных задач в задании
+    JOB_HEARTBEAT_TIMEOUT: int = 120  # секунд до подхвата брошенного
+    JOB_PROGRESS_INTERVAL: float = 5.0  # секунд между сохранениями
+
     @property
     def dsn(self) -> str:
         return (
@@ -13,6 +13,7 @@ from admin.authenticate import BasicAuthBackend
 from api.v1.accounting_documents import account_router
 from api.v1.b24.b24_router import b24_router
 from api.v1.messages import messages_router
+from api.v1.metrics import metrics_router
 from api.v1.reports import reports_router
 from api.v1.test import test_router
 from api.v1.upload_product_codes import upload_codes_router
@@ -20,7 +21,12 @@ from core.logger import LOGGING, logger
 from core.settings import settings
 from db import redis
 from db.postgres import engine
+from services.base_repositories.existence_index import get_existence_index
+from services.delta_sync.delta_sync_service import get_delta_sync
+from services.http_client import get_http_pool
+from services.jobs.job_service import get_job_service
 from services.rabbitmq_client import get_rabbitmq
+from services.webhook_queue import get_webhook_queue
 
 # from cryptography.fernet import Fernet
 # new_key = Fernet.generate_key()
@@ -66,11 +72,69 @@ async def _shutdown_rabbitmq() -> None:
     await rabbitmq_client.shutdown()
 
 
+async def _init_webhook_workers() -> None:
+    if not settings.WEBHOOK_ASYNC_PROCESSING:
+        return
+    webhook_queue = get_webhook_queue()
+    await webhook_queue.startup()
+    await webhook_queue.start_workers()
+
+
+async def _shutdown_webhook_workers() -> None:
+    webhook_queue = get_webhook_queue()
+    await webhook_queue.shutdown()
+
+
+def _init_delta_sync() -> None:
+    if settings.DELTA_SYNC_ENABLED:
+        get_delta_sync().start()
+
+
+async def _shutdown_delta_sync() -> None:
+    await get_delta_sync().stop()
+
+
+async def _init_job_service() -> None:
+    await get_job_service().startup()
+
+
+async def _shutdown_job_service() -> None:
+    await get_job_service().shutdown()
+
+
+async def _init_existence_index() -> None:
+    await get_existence_index().startup()
+
+
+async def _shutdown_existence_index() -> None:
+    await get_existence_index().shutdown()
+
+
+async def _init_http_pool() -> None:
+    http_pool = get_http_pool()
+    await http_pool.startup()
+
+
+async def _shutdown_http_pool() -> None:
+    http_pool = get_http_pool()
+    await http_pool.shutdown()
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncIterator[None]:
     await _init_redis()
     await _init_rabbitmq()
+    await _init_http_pool()
+    await _init_existence_index()
+    await _init_webhook_workers()
+    _init_delta_sync()
+    await _init_job_service()
     yield
+    await _shutdown_job_service()
+    await _shutdown_delta_sync()
+    await _shutdown_webhook_workers()
+    await _shutdown_existence_index()
+    await _shutdown_http_pool()
     await _shutdown_redis()
     await _shutdown_rabbitmq()
 
@@ -114,6 +178,11 @@ app.include_router(
     prefix="/api/v1/account",
     tags=["account"],
 )
+app.include_router(
+    metrics_router,
+    prefix="/api/v1/metrics",
+    tags=["metrics"],
+)
 app.include_router(test_router, prefix="/api/v1/test", tags=["test"])
 
 auth_backend = BasicAuthBackend()
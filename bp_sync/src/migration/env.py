@@ -40,6 +40,7 @@ from models.references import (  # noqa: F401
     Emploees,
     Measure,
 )
+from models.sync_models import SyncJob, SyncWatermark  # noqa: F401
 from models.timeline_comment_models import TimelineComment  # noqa: F401
 from models.user_models import Manager, User  # noqa: F401
 
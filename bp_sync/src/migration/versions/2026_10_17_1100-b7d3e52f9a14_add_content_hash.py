@@ -0,0 +1,61 @@
+"""Add content hash
+
+Revision ID: b7d3e52f9a14
+Revises: 8e1f0b6c3a27
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b7d3e52f9a14"
+down_revision: Union[str, None] = "8e1f0b6c3a27"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = (
+    "categories",
+    "communication_channels",
+    "companies",
+    "contacts",
+    "creation_sources",
+    "deal_failure_reasons",
+    "deals",
+    "defect_types",
+    "departments",
+    "invoices",
+    "leads",
+    "main_activites",
+    "measures",
+    "shipping_companies",
+    "timeline_comments",
+    "users",
+    "warehouses",
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in TABLES:
+        op.add_column(
+            table,
+            sa.Column(
+                "content_hash",
+                sa.String(length=64),
+                nullable=True,
+                comment=(
+                    "Отпечаток данных из Битрикс24 при последней "
+                    "синхронизации"
+                ),
+            ),
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in TABLES:
+        op.drop_column(table, "content_hash")
@@ -2,7 +2,7 @@ from datetime import datetime
 from enum import StrEnum, auto
 from typing import TYPE_CHECKING, ClassVar, Type, TypeVar
 
-from sqlalchemy import DateTime, ForeignKey
+from sqlalchemy import DateTime, ForeignKey, String
 from sqlalchemy.ext.declarative import declared_attr
 from sqlalchemy.orm import (
     Mapped,
@@ -61,6 +61,10 @@ class IntIdEntity(Base):
         unique=True,
         comment="ID во внешней системе",
     )
+    content_hash: Mapped[str | None] = mapped_column(
+        String(64),
+        comment="Отпечаток данных из Битрикс24 при последней синхронизации",
+    )
 
     @classmethod
     def _get_schema_class(cls) -> Type[CommonFieldMixin] | None:
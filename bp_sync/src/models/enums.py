@@ -229,6 +229,16 @@ class DualTypeShipment(
         return DualTypeShipmentEnum.NOT_DEFINE
 
 
+class JobStatusEnum(StrEnum):
+    """Статусы фоновых заданий"""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
 class ProcessingStatusEnum(IntEnum):
     """
     Статусы обработки:
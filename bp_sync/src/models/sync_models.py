@@ -0,0 +1,80 @@
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import DateTime, false
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from db.postgres import Base
+
+from .enums import JobStatusEnum
+
+
+class SyncWatermark(Base):
+    """
+    Водяные знаки инкрементальной синхронизации с Битрикс24
+    """
+
+    __tablename__ = "sync_watermarks"
+
+    def __str__(self) -> str:
+        return str(self.entity_type)
+
+    entity_type: Mapped[str] = mapped_column(
+        unique=True, comment="Тип сущности"
+    )
+    watermark: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True),
+        comment="Дата изменения, до которой сущности синхронизированы",
+    )
+    last_run_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), comment="Время последней синхронизации"
+    )
+    last_synced: Mapped[int] = mapped_column(
+        default=0, comment="Синхронизировано за последний запуск"
+    )
+    last_failed: Mapped[int] = mapped_column(
+        default=0, comment="Ошибок за последний запуск"
+    )
+
+
+class SyncJob(Base):
+    """
+    Фоновые задания загрузки данных из Битрикс24
+    """
+
+    __tablename__ = "sync_jobs"
+
+    def __str__(self) -> str:
+        return f"{self.kind} {self.id}"
+
+    kind: Mapped[str] = mapped_column(comment="Тип задания")
+    status: Mapped[str] = mapped_column(
+        default=JobStatusEnum.PENDING, index=True, comment="Статус задания"
+    )
+    params: Mapped[dict[str, Any]] = mapped_column(
+        JSONB, default=dict, comment="Параметры задания"
+    )
+    items: Mapped[list[int] | None] = mapped_column(
+        JSONB, comment="ID сущностей для обработки"
+    )
+    results: Mapped[dict[str, Any]] = mapped_column(
+        JSONB, default=dict, comment="Результаты по сущностям"
+    )
+    total: Mapped[int] = mapped_column(default=0, comment="Всего сущностей")
+    processed: Mapped[int] = mapped_column(default=0, comment="Обработано")
+    succeeded: Mapped[int] = mapped_column(default=0, comment="Успешно")
+    failed: Mapped[int] = mapped_column(default=0, comment="С ошибкой")
+    cancel_requested: Mapped[bool] = mapped_column(
+        server_default=false(), default=False, comment="Запрошена отмена"
+    )
+    error: Mapped[str | None] = mapped_column(comment="Ошибка задания")
+    started_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), comment="Время запуска"
+    )
+    finished_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), comment="Время завершения"
+    )
+    heartbeat_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), comment="Последний признак работы"
+    )
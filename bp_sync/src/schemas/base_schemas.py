@@ -1,13 +1,33 @@
+import hashlib
+import operator
+import warnings
 from datetime import datetime
 from enum import Enum
-from typing import Any, ClassVar, Generic, Optional, Type, TypeVar, cast
+from typing import (
+    Any,
+    Callable,
+    ClassVar,
+    Generic,
+    Iterable,
+    Iterator,
+    Optional,
+    Type,
+    TypeVar,
+    cast,
+    get_args,
+    get_origin,
+)
 from uuid import UUID
 
+import orjson
 from pydantic import (
     AliasChoices,
     BaseModel,
     ConfigDict,
     Field,
+    PrivateAttr,
+    computed_field,
+    create_model,
     model_validator,
 )
 from typing_extensions import Self
@@ -20,6 +40,14 @@ EnumT = TypeVar("EnumT", bound=Enum)
 T = TypeVar("T")
 SYSTEM_USER_ID = 1
 
+# Служебные поля, не приходящие из Битрикс24
+SERVICE_FIELDS = frozenset(
+    {"internal_id", "created_at", "updated_at", "is_deleted_in_bitrix"}
+)
+
+# Частичные схемы для облегчённой выборки: (схема, поля) -> схема
+_PARTIAL_SCHEMAS: dict[tuple[type[Any], frozenset[str]], type[Any]] = {}
+
 
 class CommonFieldMixin(BaseModel):  # type: ignore[misc]
     internal_id: Optional[UUID] = Field(
@@ -45,84 +73,221 @@ class CommonFieldMixin(BaseModel):  # type: ignore[misc]
     def id(self, value: UUID) -> None:
         self.internal_id = value
 
-    def get_changes(
-        self, entity: Self, exclude_fields: set[str] | None = None
-    ) -> dict[str, dict[str, Any]]:
-        if exclude_fields is None:
-            exclude_fields = {
-                "internal_id",
-                "created_at",
-                "updated_at",
-                "is_deleted_in_bitrix",
-            }
-
-        differences: dict[str, dict[str, Any]] = {}
+    @classmethod
+    def bitrix_aliases(
+        cls, fields: Iterable[str] | None = None, alias_choice: int = 1
+    ) -> list[str]:
+        """
+        Имена полей Битрикс24 для параметра select.
 
-        model_class = self.__class__
-        fields = model_class.model_fields
+        fields - имена полей схемы (по умолчанию все поля), alias_choice -
+        номер варианта алиаса (1 - crm.{entity}.*, 2 - crm.item.*)
+        """
+        names = cls.model_fields if fields is None else fields
+        aliases: list[str] = []
+        for name in names:
+            field_info = cls.model_fields.get(name)
+            if field_info is None:
+                raise ValueError(f"Unknown field {name} for {cls.__name__}")
+            alias = field_info.validation_alias
+            if isinstance(alias, AliasChoices):
+                choice_index = max(
+                    0, min(alias_choice - 1, len(alias.choices) - 1)
+                )
+                alias = alias.choices[choice_index]
+            alias = alias or field_info.alias
+            if isinstance(alias, str) and alias not in aliases:
+                aliases.append(alias)
+        return aliases
 
-        for field_name in fields:
-            # Пропускаем исключенные поля
-            if field_name in exclude_fields:
-                continue
+    @classmethod
+    def partial_schema(cls, fields: Iterable[str]) -> type[Self]:
+        """
+        Схема, в которой обязательны только указанные поля. Используется
+        для облегчённой выборки, когда из Битрикс24 запрашиваются не все
+        поля сущности.
+        """
+        key = (cls, frozenset(fields))
+        schema = _PARTIAL_SCHEMAS.get(key)
+        if schema is None:
+            overrides: dict[str, Any] = {
+                name: (
+                    Optional[field_info.annotation],
+                    Field(
+                        None,
+                        alias=field_info.alias,
+                        validation_alias=field_info.validation_alias,
+                    ),
+                )
+                for name, field_info in cls.model_fields.items()
+                if field_info.is_required() and name not in key[1]
+            }
+            with warnings.catch_warnings():
+                # Поля из миксинов pydantic считает атрибутами родителя
+                warnings.simplefilter("ignore", UserWarning)
+                schema = create_model(
+                    f"{cls.__name__}Partial", __base__=cls, **overrides
+                )
+            _PARTIAL_SCHEMAS[key] = schema
+        return cast(type[Self], schema)
 
-            old_value = getattr(self, field_name)
-            new_value = getattr(entity, field_name)
+    @classmethod
+    def comparator(
+        cls, exclude_fields: Iterable[str] | None = None
+    ) -> "FieldComparator":
+        """Сравнитель полей схемы, собранный один раз на набор исключений"""
+        key = (
+            cls,
+            frozenset(
+                SERVICE_FIELDS if exclude_fields is None else exclude_fields
+            ),
+        )
+        comparator = _COMPARATORS.get(key)
+        if comparator is None:
+            comparator = FieldComparator(cls, key[1])
+            _COMPARATORS[key] = comparator
+        return comparator
 
-            # Сравниваем значения
-            if not self._are_values_equal(field_name, old_value, new_value):
-                differences[field_name] = {
-                    "internal": old_value,
-                    "external": new_value,
-                }
+    def get_changes(
+        self, entity: Self, exclude_fields: set[str] | None = None
+    ) -> dict[str, dict[str, Any]]:
+        return self.comparator(exclude_fields).diff(self, entity)
 
-        return differences
+    @classmethod
+    def diff_many(
+        cls,
+        pairs: Iterable[tuple[Self, Self]],
+        exclude_fields: set[str] | None = None,
+    ) -> list[dict[str, dict[str, Any]]]:
+        """Различия для набора пар (Битрикс24, БД) одним сравнителем"""
+        diff = cls.comparator(exclude_fields).diff
+        return [diff(schema_b24, schema_db) for schema_b24, schema_db in pairs]
+
+    def content_hash(
+        self, exclude_fields: Iterable[str] = SERVICE_FIELDS
+    ) -> str:
+        """
+        Отпечаток содержимого: sha256 значений полей, приведённых к JSON,
+        без exclude_fields. Не зависит от порядка полей
+        """
+        data = self.model_dump(mode="json", exclude=set(exclude_fields))
+        return hashlib.sha256(
+            orjson.dumps(data, option=orjson.OPT_SORT_KEYS)
+        ).hexdigest()
+
+
+def _values_equal(value1: Any, value2: Any) -> bool:
+    """
+    Сравнение значений с разбором типов во время выполнения. Для полей,
+    тип которых нельзя определить по аннотации
+    """
+    if value1 is None or value2 is None:
+        return value1 is value2
+    # Для Enum сравниваем значения
+    if hasattr(value1, "value") and hasattr(value2, "value"):
+        return bool(value1.value == value2.value)
+    # Для Pydantic моделей рекурсивно сравниваем все поля
+    if isinstance(value1, BaseModel) and isinstance(value2, BaseModel):
+        return bool(value1.model_dump() == value2.model_dump())
+    return bool(value1 == value2)
+
+
+def _enum_equal(value1: Any, value2: Any) -> bool:
+    if value1 is None or value2 is None:
+        return value1 is value2
+    if hasattr(value1, "value") and hasattr(value2, "value"):
+        return bool(value1.value == value2.value)
+    return bool(value1 == value2)
+
+
+def _model_equal(value1: Any, value2: Any) -> bool:
+    if value1 is None or value2 is None:
+        return value1 is value2
+    return bool(value1 == value2 or value1.model_dump() == value2.model_dump())
+
+
+def _zero_or_none_equal(value1: Any, value2: Any) -> bool:
+    if value1 in (0, None) and value2 in (0, None):
+        return True
+    return _values_equal(value1, value2)
+
+
+def _empty_or_none_equal(value1: Any, value2: Any) -> bool:
+    return bool((value1 or None) == (value2 or None))
+
+
+# Поля с особыми правилами сравнения
+_FIELD_EQUALS: dict[str, Callable[[Any, Any], bool]] = {
+    "company_id": _zero_or_none_equal,
+    "defects": _empty_or_none_equal,
+    "related_deals": _empty_or_none_equal,
+}
+
+
+def _resolve_equal(name: str, annotation: Any) -> Callable[[Any, Any], bool]:
+    """Выбирает функцию сравнения поля по имени и аннотации типа"""
+    if name in _FIELD_EQUALS:
+        return _FIELD_EQUALS[name]
+    types = [
+        arg
+        for arg in (get_args(annotation) or (annotation,))
+        if arg is not type(None)
+    ]
+    origins = [get_origin(arg) or arg for arg in types]
+    if not all(isinstance(origin, type) for origin in origins):
+        return _values_equal  # Any, TypeVar и т.п.
+    if any(issubclass(origin, BaseModel) for origin in origins):
+        if all(issubclass(origin, BaseModel) for origin in origins):
+            return _model_equal
+        return _values_equal
+    if any(issubclass(origin, Enum) for origin in origins):
+        return _enum_equal
+    return operator.eq
+
+
+class FieldComparator:
+    """
+    Сравнитель полей схемы. Функции сравнения полей выбираются один раз по
+    аннотациям при создании, значения читаются напрямую из __dict__
+    экземпляров
+    """
+
+    __slots__ = ("fields",)
+
+    def __init__(
+        self, schema: type[BaseModel], exclude_fields: frozenset[str]
+    ) -> None:
+        self.fields: tuple[tuple[str, Callable[[Any, Any], bool]], ...] = (
+            tuple(
+                (name, _resolve_equal(name, field_info.annotation))
+                for name, field_info in schema.model_fields.items()
+                if name not in exclude_fields
+            )
+        )
 
-    def _are_values_equal(
-        self, field_name: str, value1: Any, value2: Any
-    ) -> bool:
+    def diff(
+        self, entity: BaseModel, other: BaseModel
+    ) -> dict[str, dict[str, Any]]:
         """
-        Сравнивает два значения с учетом специальных типов данных.
+        Различающиеся поля в формате get_changes: internal - значение
+        entity, external - значение other
         """
-        # Оба значения None
-        if value1 is None and value2 is None:
-            return True
-
-        if field_name == "company_id":
-            if value1 in (0, None) and value2 in (0, None):
-                return True
-
-        if field_name in ("defects", "related_deals"):
-            if value1 in ([], None) and value2 in ([], None):
-                return True
-            return False
-
-        # Одно из значений None
-        if value1 is None or value2 is None:
-            return False
-
-        # Для дат и времени сравниваем как строки в ISO формате
-        # if isinstance(value1, (datetime, date)) and isinstance(
-        #    value2, (datetime, date)
-        # ):
-        #    return value1.isoformat() == value2.isoformat()
-
-        # Для Enum сравниваем значения
-        if hasattr(value1, "value") and hasattr(value2, "value"):
-            return bool(value1.value == value2.value)
-
-        # Для Pydantic моделей рекурсивно сравниваем все поля
-        if isinstance(value1, BaseModel) and isinstance(value2, BaseModel):
-            return bool(value1.model_dump() == value2.model_dump())
-
-        # Для списков и словарей сравниваем содержимое
-        if isinstance(value1, (list, dict)) and isinstance(
-            value2, (list, dict)
-        ):
-            return bool(value1 == value2)
+        values = entity.__dict__
+        other_values = other.__dict__
+        differences: dict[str, dict[str, Any]] = {}
+        for name, equal in self.fields:
+            value = values[name]
+            other_value = other_values[name]
+            if value is not other_value and not equal(value, other_value):
+                differences[name] = {
+                    "internal": value,
+                    "external": other_value,
+                }
+        return differences
+
 
-        # Стандартное сравнение
-        return bool(value1 == value2)
+# Сравнители полей: (схема, исключённые поля) -> сравнитель
+_COMPARATORS: dict[tuple[type[Any], frozenset[str]], FieldComparator] = {}
 
 
 class BaseFieldMixin:
@@ -503,12 +668,27 @@ class BaseUpdateSchema(
 
 
 class ListResponseSchema(BaseModel, Generic[T]):  # type: ignore[misc]
-    """Схема для ответа со списком сущностей"""
-
-    result: list[CommonFieldMixin]  # list[T]
+    """
+    Схема для ответа со списком сущностей.
+
+    Строки хранятся как есть (raw) и валидируются схемой строки только при
+    первом обращении к result или при итерации iter_rows. Вызывающим,
+    которым нужны только ID, достаточно raw. Готовые строки можно
+    передать и по прежнему имени result, при сериализации строки
+    выводятся в result.
+    """
+
+    raw: list[Any] = Field(
+        default_factory=list,
+        exclude=True,
+        validation_alias=AliasChoices("raw", "result"),
+    )
     total: int
     next: Optional[int] = None
 
+    _row_schema: Optional[type[Any]] = PrivateAttr(default=None)
+    _rows: Optional[list[Any]] = PrivateAttr(default=None)
+
     model_config = ConfigDict(
         use_enum_values=True,
         populate_by_name=True,
@@ -516,6 +696,36 @@ class ListResponseSchema(BaseModel, Generic[T]):  # type: ignore[misc]
         extra="ignore",
     )
 
+    @classmethod
+    def lazy(
+        cls,
+        raw: list[dict[str, Any]],
+        row_schema: type[T],
+        total: int,
+        next: Optional[int] = None,
+    ) -> Self:
+        """Ответ, строки которого будут провалидированы по требованию"""
+        response = cls(raw=raw, total=total, next=next)
+        response._row_schema = row_schema
+        return response
+
+    @computed_field  # type: ignore[prop-decorator, untyped-decorator]
+    @property
+    def result(self) -> list[T]:
+        if self._rows is None:
+            self._rows = list(self.iter_rows())
+        return self._rows
+
+    def iter_rows(self) -> Iterator[T]:
+        """Итерация по строкам с валидацией каждой при обращении"""
+        if self._rows is not None:
+            yield from self._rows
+            return
+        for row in self.raw:
+            if self._row_schema is not None and isinstance(row, dict):
+                row = self._row_schema(**row)
+            yield cast(T, row)
+
 
 class CommunicationChannel(BaseModel):  # type: ignore[misc]
     """Схема коммуникации"""
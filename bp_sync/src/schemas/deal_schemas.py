@@ -337,3 +337,14 @@ class BitrixWebhookPayload(BaseModel):  # type: ignore[misc]
             return int(self.data.get("FIELDS", {}).get("ENTITY_TYPE_ID", 0))
         except (ValueError, TypeError):
             return None
+
+
+class WebhookEvent(BaseModel):  # type: ignore[misc]
+    """Проверенное событие вебхука для обработки в фоновом воркере"""
+
+    entity: str
+    entity_id: int
+    entity_type_id: int | None = None
+    event: str
+    ts: int = 0
+    attempt: int = 1
@@ -0,0 +1,40 @@
+import uuid
+from datetime import date, datetime
+from typing import Any
+
+from pydantic import BaseModel, ConfigDict
+
+
+class LoadDealsParams(BaseModel):  # type: ignore[misc]
+    """Параметры задания загрузки сделок за период"""
+
+    start_date: date
+    end_date: date
+    deal_id: int | None = None
+
+
+class JobRead(BaseModel):  # type: ignore[misc]
+    """Состояние фонового задания"""
+
+    model_config = ConfigDict(from_attributes=True)
+
+    id: uuid.UUID
+    kind: str
+    status: str
+    params: dict[str, Any]
+    total: int
+    processed: int
+    succeeded: int
+    failed: int
+    cancel_requested: bool
+    error: str | None = None
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    heartbeat_at: datetime | None = None
+
+
+class JobDetail(JobRead):
+    """Состояние задания с результатами по сущностям"""
+
+    results: dict[str, Any]
@@ -1,12 +1,12 @@
 from collections.abc import Awaitable
-from typing import Any, Callable, Optional, TypeVar
+from typing import Any, Callable, Optional, Sequence, TypeVar
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from models.bases import COMMUNICATION_TYPES, EntityType, IntIdEntity
 from schemas.base_schemas import BaseCreateSchema, BaseUpdateSchema
 
-from .base_repository import BaseRepository
+from .base_repository import UPSERT_CHUNK_SIZE, BaseRepository
 from .communications_service import CommunicationService
 
 SchemaTypeCreate = TypeVar("SchemaTypeCreate", bound=BaseCreateSchema)
@@ -113,6 +113,30 @@ class EntityWithCommunicationsRepository(
         )
         return entity
 
+    async def upsert_many(
+        self,
+        items: Sequence[SchemaTypeCreate],
+        pre_upsert_hook: Optional[Callable[..., Awaitable[None]]] = None,
+        post_upsert_hook: Optional[Callable[..., Awaitable[None]]] = None,
+        chunk_size: int = UPSERT_CHUNK_SIZE,
+    ) -> list[ModelType]:
+        """Пакетная запись сущностей с обработкой коммуникаций"""
+
+        async def _combined_post_upsert_hook(
+            objs: list[ModelType], items: list[SchemaTypeCreate]
+        ) -> None:
+            if post_upsert_hook:
+                await post_upsert_hook(objs, items)
+            for obj, data in zip(objs, items):
+                await self._handle_communications(obj, data, is_update=True)
+
+        return await super().upsert_many(
+            items,
+            pre_upsert_hook=pre_upsert_hook,
+            post_upsert_hook=_combined_post_upsert_hook,
+            chunk_size=chunk_size,
+        )
+
     async def delete(
         self,
         external_id: ExternalIdType,
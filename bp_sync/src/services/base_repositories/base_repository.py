@@ -1,17 +1,23 @@
+import asyncio
 from collections.abc import Awaitable
-from typing import Any, Callable, Generic, Optional, Type, TypeVar
+from datetime import datetime
+from typing import Any, Callable, Generic, Optional, Sequence, Type, TypeVar
 
 from fastapi import HTTPException, status
-from sqlalchemy import Integer, delete, exists, select, update
+from sqlalchemy import Integer, delete, exists, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import IntegrityError, NoResultFound, SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from core.logger import logger
 from db.postgres import Base
 from models.bases import IntIdEntity, NameStrIdEntity
-from schemas.base_schemas import CommonFieldMixin
+from schemas.base_schemas import SERVICE_FIELDS, CommonFieldMixin
 
+from ..base_services.related_freshness import get_related_freshness
+from ..entities.reference_cache import get_reference_cache
 from ..exceptions import ConflictException, CyclicCallException
+from .existence_index import get_existence_index
 
 # Дженерик для схем
 SchemaTypeCreate = TypeVar("SchemaTypeCreate", bound=CommonFieldMixin)
@@ -19,6 +25,9 @@ SchemaTypeUpdate = TypeVar("SchemaTypeUpdate", bound=CommonFieldMixin)
 ModelType = TypeVar("ModelType", bound=IntIdEntity | NameStrIdEntity)
 ExternalIdType = TypeVar("ExternalIdType", int, str)
 
+# Размер пачки одного INSERT ... ON CONFLICT в upsert_many
+UPSERT_CHUNK_SIZE = 1000
+
 
 class BaseRepository(
     Generic[ModelType, SchemaTypeCreate, SchemaTypeUpdate, ExternalIdType]
@@ -36,6 +45,10 @@ class BaseRepository(
     Словарь проверок с созданием сущности по умолчанию в формате:
     {атрибут_схемы: (клиент, модель_бд, проверка обязательна )}
     """
+    content_hash_exclude: frozenset[str] = SERVICE_FIELDS
+    """Поля, не входящие в отпечаток содержимого сущности"""
+    local_fields: frozenset[str] = frozenset()
+    """Поля, которые ведутся локально: upsert не перезаписывает их"""
 
     def __init__(self, session: AsyncSession):
         self.session = session
@@ -65,6 +78,60 @@ class BaseRepository(
             )
             return False
 
+    def content_hash(self, data: Any) -> str | None:
+        """
+        Отпечаток полной схемы сущности. None - модель не хранит отпечаток
+        или схема частичная (обновление отдельных полей)
+        """
+        if not issubclass(self.model, IntIdEntity):
+            return None
+        if type(data) is not self.model._get_schema_class():
+            return None
+        try:
+            return data.content_hash(self.content_hash_exclude)
+        except (TypeError, ValueError) as e:
+            logger.warning(
+                f"Failed to hash {self.model.__name__} "
+                f"ID={data.external_id}: {e}"
+            )
+            return None
+
+    def _db_values(
+        self,
+        data: SchemaTypeCreate | SchemaTypeUpdate,
+        exclude_unset: bool = False,
+    ) -> dict[str, Any]:
+        """Значения для записи в БД вместе с отпечатком содержимого"""
+        values: dict[str, Any] = data.model_dump_db(
+            exclude_unset=exclude_unset
+        )
+        if issubclass(self.model, IntIdEntity):
+            # Частичное обновление сбрасывает отпечаток: данные в БД больше
+            # не соответствуют целиком одному ответу Битрикс24
+            values["content_hash"] = self.content_hash(data)
+        return values
+
+    async def save_content_hash(
+        self, external_id: ExternalIdType, content_hash: str | None
+    ) -> None:
+        """Сохраняет отпечаток данных, совпадающих с Битрикс24"""
+        if not issubclass(self.model, IntIdEntity):
+            return
+        try:
+            await self.session.execute(
+                update(self.model)
+                .where(self.model.external_id == external_id)
+                .values(content_hash=content_hash)
+                .execution_options(synchronize_session=False)
+            )
+            await self.session.commit()
+        except SQLAlchemyError as e:
+            await self.session.rollback()
+            logger.warning(
+                f"Failed to save {self.model.__name__} ID={external_id} "
+                f"content hash: {str(e)}"
+            )
+
     def _not_found_exception(
         self, external_id: ExternalIdType
     ) -> HTTPException:
@@ -113,7 +180,7 @@ class BaseRepository(
                 external_id  # type: ignore[arg-type]
             )
         try:
-            obj = self.model(**data.model_dump_db())
+            obj = self.model(**self._db_values(data))
             self.session.add(obj)
 
             if pre_commit_hook:
@@ -126,6 +193,8 @@ class BaseRepository(
 
             await self.session.commit()
             await self.session.refresh(obj)
+            await get_existence_index().add_entities([obj])
+            get_reference_cache().invalidate_for(self.model)
             logger.info(f"{self.model.__name__} created: ID={external_id}")
             return obj
         except IntegrityError as e:
@@ -204,20 +273,12 @@ class BaseRepository(
             except ValueError:
                 raise ValueError("ID is not correct type")
 
-        if not await self._exists(external_id):  # type: ignore[arg-type]
-            logger.warning(
-                f"Update failed: {self.model.__name__} "
-                f"ID={external_id} not found"
-            )
-            raise self._not_found_exception(
-                external_id  # type: ignore[arg-type]
-            )
-
         try:
+            # Отсутствие сущности определяется по пустому RETURNING
             stmt = (
                 update(self.model)
                 .where(self.model.external_id == external_id)
-                .values(data.model_dump_db(exclude_unset=True))
+                .values(self._db_values(data, exclude_unset=True))
                 .returning(self.model)
             )
 
@@ -231,6 +292,7 @@ class BaseRepository(
                 await post_commit_hook(obj, data)
 
             await self.session.commit()
+            get_reference_cache().invalidate_for(self.model)
             logger.info(f"{self.model.__name__} updated: ID={external_id}")
             return obj  # type: ignore[no-any-return]
         except NoResultFound:
@@ -268,13 +330,6 @@ class BaseRepository(
             except ValueError:
                 raise ValueError("ID is not correct type")
 
-        if not await self._exists(external_id):
-            logger.warning(
-                f"Delete failed: {self.model.__name__} "
-                f"ID={external_id} not found"
-            )
-            raise self._not_found_exception(external_id)
-
         try:
             if pre_delete_hook:
                 await pre_delete_hook(external_id)
@@ -285,9 +340,19 @@ class BaseRepository(
             result = await self.session.execute(stmt)
 
             if result.rowcount == 0:
+                # Откатываем изменения pre_delete_hook
+                await self.session.rollback()
+                logger.warning(
+                    f"Delete failed: {self.model.__name__} "
+                    f"ID={external_id} not found"
+                )
                 raise self._not_found_exception(external_id)
 
             await self.session.commit()
+            await get_existence_index().discard(
+                self.model, "external_id", external_id
+            )
+            get_reference_cache().invalidate_for(self.model)
             logger.info(f"{self.model.__name__} deleted: ID={external_id}")
             return True
         except SQLAlchemyError as e:
@@ -317,6 +382,15 @@ class BaseRepository(
         if cache_key in cache:
             return cache[cache_key]
 
+        # Известные записи берутся из общего индекса без запроса в БД
+        index = get_existence_index()
+        field, value = (
+            next(iter(filters.items())) if len(filters) == 1 else ("", None)
+        )
+        if field and await index.contains(model, field, value):
+            cache[cache_key] = True
+            return True
+
         # Выполняем запрос, если нет в кэше
         stmt = select(model).filter_by(**filters).limit(1)
         result = await self.session.execute(stmt)
@@ -324,6 +398,8 @@ class BaseRepository(
 
         # Сохраняем результат в кэш
         cache[cache_key] = exists
+        if exists and field:
+            await index.add(model, field, value)
         return exists
 
     async def set_deleted_in_bitrix(
@@ -344,13 +420,6 @@ class BaseRepository(
             except ValueError:
                 raise ValueError("ID is not correct type")
 
-        if not await self._exists(external_id):
-            logger.warning(
-                f"Update failed: {self.model.__name__} "
-                f"ID={external_id} not found"
-            )
-            raise self._not_found_exception(external_id)
-
         try:
             stmt = (
                 update(self.model)
@@ -362,11 +431,12 @@ class BaseRepository(
             result = await self.session.execute(stmt)
 
             if result.rowcount == 0:
+                await self.session.rollback()
                 logger.warning(
-                    f"{self.model.__name__} with external_id={external_id} "
-                    "not found"
+                    f"Update failed: {self.model.__name__} "
+                    f"ID={external_id} not found"
                 )
-                return False
+                raise self._not_found_exception(external_id)
 
             await self.session.commit()
             logger.info(
@@ -392,6 +462,218 @@ class BaseRepository(
                 detail="Database operation failed",
             ) from e
 
+    async def set_deleted_in_bitrix_many(
+        self, external_ids: list[ExternalIdType], is_deleted: bool = True
+    ) -> int:
+        """
+        Устанавливает флаг is_deleted_in_bitrix для набора сущностей одним
+        запросом. Возвращает число изменённых строк
+        """
+        if not external_ids:
+            return 0
+        try:
+            stmt = (
+                update(self.model)
+                .where(self.model.external_id.in_(external_ids))
+                .where(self.model.is_deleted_in_bitrix.is_not(is_deleted))
+                .values(is_deleted_in_bitrix=is_deleted)
+                .execution_options(synchronize_session=False)
+            )
+            result = await self.session.execute(stmt)
+            await self.session.commit()
+            logger.info(
+                f"{result.rowcount} {self.model.__name__} marked as "
+                f"deleted={is_deleted}"
+            )
+            return int(result.rowcount)
+        except SQLAlchemyError as e:
+            await self.session.rollback()
+            logger.exception(
+                f"Database error updating {self.model.__name__} "
+                f"deletion flags: {str(e)}"
+            )
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Database operation failed",
+            ) from e
+
+    async def upsert_entities(
+        self, items: Sequence[SchemaTypeCreate]
+    ) -> list[ModelType]:
+        """
+        Создаёт или обновляет набор сущностей из Битрикс24 с проверкой
+        связанных объектов
+        """
+        for data in items:
+            await self._check_related_objects(data)
+            await self._create_or_update_related(data)
+        return await self.upsert_many(items)
+
+    async def upsert_many(
+        self,
+        items: Sequence[SchemaTypeCreate],
+        pre_upsert_hook: Optional[Callable[..., Awaitable[None]]] = None,
+        post_upsert_hook: Optional[Callable[..., Awaitable[None]]] = None,
+        chunk_size: int = UPSERT_CHUNK_SIZE,
+    ) -> list[ModelType]:
+        """
+        Создаёт или обновляет сущности по external_id: один
+        INSERT ... ON CONFLICT (external_id) DO UPDATE ... RETURNING на
+        пачку, каждая пачка в своей транзакции. Хуки вызываются один раз на
+        пачку: pre_upsert_hook(схемы) до записи, post_upsert_hook(объекты,
+        схемы) после записи до commit. Ожидаются полные схемы создания:
+        записываются все поля схемы
+        """
+        # Одна команда не может обновить строку дважды - оставляем
+        # последнюю схему для каждого external_id
+        unique: dict[Any, SchemaTypeCreate] = {}
+        for data in items:
+            unique[self._coerce_external_id(data)] = data
+        schemas = list(unique.values())
+        entities: list[ModelType] = []
+        for start in range(0, len(schemas), chunk_size):
+            entities.extend(
+                await self._upsert_chunk(
+                    schemas[start : start + chunk_size],
+                    pre_upsert_hook,
+                    post_upsert_hook,
+                )
+            )
+        return entities
+
+    async def _upsert_chunk(
+        self,
+        chunk: list[SchemaTypeCreate],
+        pre_upsert_hook: Optional[Callable[..., Awaitable[None]]],
+        post_upsert_hook: Optional[Callable[..., Awaitable[None]]],
+    ) -> list[ModelType]:
+        # Строки с одинаковым набором полей пишутся одной командой
+        groups: dict[frozenset[str], list[tuple[Any, dict[str, Any]]]] = {}
+        for data in chunk:
+            row = self._upsert_row(data)
+            groups.setdefault(frozenset(row), []).append((data, row))
+        # Порядок схем совпадает с порядком возвращаемых объектов
+        chunk = [data for group in groups.values() for data, _ in group]
+        try:
+            if pre_upsert_hook:
+                await pre_upsert_hook(chunk)
+            entities: list[ModelType] = []
+            for keys, group in groups.items():
+                result = await self.session.scalars(
+                    self._upsert_statement(keys),
+                    [row for _, row in group],
+                    execution_options={"populate_existing": True},
+                )
+                entities.extend(result.all())
+            if post_upsert_hook:
+                await post_upsert_hook(entities, chunk)
+            await self.session.commit()
+            await get_existence_index().add_entities(entities)
+            get_reference_cache().invalidate_for(self.model)
+            logger.info(
+                f"{self.model.__name__} upserted: {len(entities)} entities"
+            )
+            return entities
+        except SQLAlchemyError as e:
+            await self.session.rollback()
+            logger.exception(
+                f"Database error upserting {len(chunk)} "
+                f"{self.model.__name__}: {str(e)}"
+            )
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=(
+                    f"Database operation failed upserting "
+                    f"{self.model.__name__}"
+                ),
+            ) from e
+
+    def _upsert_row(self, data: SchemaTypeCreate) -> dict[str, Any]:
+        """
+        Значения строки upsert: только заданные в схеме поля, как при
+        update. None не передаётся в поля со значением по умолчанию -
+        при вставке его заполнит БД, как при create через ORM
+        """
+        columns = self.model.__mapper__.columns
+        row: dict[str, Any] = {}
+        for key, value in self._db_values(data, exclude_unset=True).items():
+            # Служебные поля заполняются значениями по умолчанию БД
+            if key in SERVICE_FIELDS:
+                continue
+            column = columns.get(key)
+            if (
+                value is None
+                and column is not None
+                and (
+                    column.default is not None
+                    or column.server_default is not None
+                )
+            ):
+                continue
+            row[key] = value
+        return row
+
+    def _upsert_statement(self, keys: frozenset[str]) -> Any:
+        """INSERT ... ON CONFLICT (external_id) DO UPDATE для набора полей"""
+        stmt = pg_insert(self.model)
+        return stmt.on_conflict_do_update(
+            index_elements=[self.model.external_id],
+            set_={
+                **{
+                    key: stmt.excluded[key]
+                    for key in keys
+                    if key != "external_id" and key not in self.local_fields
+                },
+                "updated_at": func.now(),
+            },
+        ).returning(self.model, sort_by_parameter_order=True)
+
+    def _coerce_external_id(self, data: SchemaTypeCreate) -> Any:
+        """Проверяет external_id схемы и приводит его к типу поля модели"""
+        if not data.external_id:
+            logger.error("Upsert failed: Missing ID")
+            raise ValueError("ID is required for upsert")
+        if isinstance(self.model.external_id.type, Integer) and isinstance(
+            data.external_id, str
+        ):
+            try:
+                data.external_id = int(data.external_id)
+            except ValueError:
+                raise ValueError("ID is not correct type")
+        return data.external_id
+
+    async def get_many(
+        self, external_ids: list[ExternalIdType]
+    ) -> list[ModelType]:
+        """Сущности по набору external_id одним запросом"""
+        if not external_ids:
+            return []
+        stmt = select(self.model).where(
+            self.model.external_id.in_(external_ids)
+        )
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
+
+    async def get_existing_ids(
+        self, external_ids: list[ExternalIdType]
+    ) -> set[ExternalIdType]:
+        """Возвращает external_id из списка, которые уже есть в БД"""
+        if not external_ids:
+            return set()
+        stmt = select(self.model.external_id).where(
+            self.model.external_id.in_(external_ids)
+        )
+        result = await self.session.execute(stmt)
+        return set(result.scalars().all())
+
+    async def get_last_modified(self) -> datetime | None:
+        """Максимальная дата изменения сущностей в БД"""
+        date_modify = getattr(self.model, "date_modify", None)
+        if date_modify is None:
+            return None
+        result = await self.session.execute(select(func.max(date_modify)))
+        return result.scalar()  # type: ignore[no-any-return]
+
     async def _get_related_checks(self) -> list[tuple[str, Type[Base], str]]:
         """Возвращает кастомные проверки для дочерних классов"""
         return self._default_related_checks
@@ -430,6 +712,30 @@ class BaseRepository(
         """Возвращает кастомные проверки для дочерних классов"""
         return self._default_related_create
 
+    async def _prefetch_related(
+        self, stale: list[tuple[Any, Any, Any]]
+    ) -> list[Any]:
+        """
+        Параллельно получает данные устаревших связанных сущностей из
+        Bitrix. None - данные будут запрошены при обновлении сущности
+        """
+
+        async def fetch(client: Any, value: Any) -> Any:
+            bitrix_client = getattr(client, "bitrix_client", None)
+            if bitrix_client is None:
+                return None
+            try:
+                return await bitrix_client.get(value, use_cache=False)
+            except Exception as e:
+                logger.debug(f"Prefetch of related id={value} failed: {e}")
+                return None
+
+        return list(
+            await asyncio.gather(
+                *(fetch(client, value) for client, _, value in stale)
+            )
+        )
+
     async def _create_or_update_related(
         self,
         data: SchemaTypeCreate | SchemaTypeUpdate,
@@ -450,6 +756,9 @@ class BaseRepository(
         updated_cache = get_updated_cache()
         creation_cache = get_creation_cache()
         update_needed_cache = get_update_needed_cache()
+        freshness = get_related_freshness()
+        # Существующие сущности, которые нужно обновить из Bitrix
+        stale: list[tuple[Any, Any, Any]] = []
 
         if additional_checks:
             checks.update(additional_checks)
@@ -466,7 +775,10 @@ class BaseRepository(
                 # Ключ для отслеживания уже обработанных сущностей
                 entity_key = (model, value)
                 # Пропускаем, если уже обрабатывали эту сущность
-                if entity_key in processed_entities | updated_cache:
+                if (
+                    entity_key in processed_entities
+                    or entity_key in updated_cache
+                ):
                     continue
 
                 # Добавляем в отслеживаемые
@@ -487,11 +799,33 @@ class BaseRepository(
                     cache = get_exists_cache()
                     if cache_key in cache:
                         del cache[cache_key]
-                else:
-                    if entity_key in creation_cache.keys():
-                        continue
-                    await client.refresh_from_bitrix(value)
+                    freshness.mark(model, value)
+                    creation_cache[entity_key] = True
+                elif entity_key in creation_cache.keys():
+                    continue
+                elif freshness.is_fresh(model, value):
                     updated_cache.add(entity_key)
+                else:
+                    stale.append((client, model, value))
+            except CyclicCallException:
+                raise
+            except Exception as e:
+                errors.append(
+                    f"{model.__name__} with id={value} failed: {str(e)}"
+                )
+
+        prefetched = await self._prefetch_related(stale)
+        for (client, model, value), entity_data in zip(stale, prefetched):
+            entity_key = (model, value)
+            # Могла быть обновлена при импорте другой связанной сущности
+            if entity_key in creation_cache.keys():
+                continue
+            try:
+                await client.refresh_from_bitrix(
+                    value, entity_data=entity_data
+                )
+                updated_cache.add(entity_key)
+                freshness.mark(model, value)
                 creation_cache[entity_key] = True
             except CyclicCallException:
                 raise
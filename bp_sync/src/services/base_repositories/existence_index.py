@@ -0,0 +1,285 @@
+import asyncio
+from collections import defaultdict
+from typing import Any, Iterable, Type
+
+from redis.exceptions import RedisError
+from sqlalchemy import select
+
+from core.logger import logger
+from core.settings import settings
+from db.postgres import Base, async_session
+from db.redis import get_redis
+from models.references import (
+    Category,
+    ContactType,
+    CreationSource,
+    Currency,
+    DealFailureReason,
+    DealStage,
+    DealType,
+    DefectType,
+    Department,
+    Emploees,
+    Industry,
+    InvoiceStage,
+    LeadStatus,
+    MainActivity,
+    Measure,
+    ShippingCompany,
+    Source,
+    Warehouse,
+)
+from models.user_models import User
+
+KEY_PREFIX = "existence"
+# Поля, по которым ищутся связанные объекты
+INDEXED_FIELDS = ("external_id", "ext_alt_id")
+# Модели, индекс которых загружается при старте
+WARM_MODELS: tuple[Type[Base], ...] = (
+    User,
+    Department,
+    Category,
+    ContactType,
+    CreationSource,
+    Currency,
+    DealFailureReason,
+    DealStage,
+    DealType,
+    DefectType,
+    Emploees,
+    Industry,
+    InvoiceStage,
+    LeadStatus,
+    MainActivity,
+    Measure,
+    ShippingCompany,
+    Source,
+    Warehouse,
+)
+REDIS_CHUNK_SIZE = 1000
+
+IndexKey = tuple[Type[Base], str]
+
+
+class ExistenceIndex:
+    """
+    Общий для запросов индекс существующих записей: множества значений
+    полей поиска связанных объектов (external_id, ext_alt_id) по моделям.
+
+    Найденное в индексе значение считается существующим без запроса в
+    БД. Отсутствие в индексе проверяется запросом: запись могла быть
+    создана другим процессом. Справочники и пользователи загружаются при
+    старте, остальные модели пополняются по мере проверок, все индексы
+    перестраиваются по расписанию. Опционально зеркалируется в Redis,
+    чтобы воркеры видели записи, созданные друг другом.
+    """
+
+    def __init__(
+        self,
+        refresh_interval: int = settings.EXISTENCE_INDEX_REFRESH,
+        use_redis: bool = settings.EXISTENCE_INDEX_REDIS,
+        enabled: bool = settings.EXISTENCE_INDEX_ENABLED,
+    ) -> None:
+        self.refresh_interval = refresh_interval
+        self.use_redis = use_redis
+        self.enabled = enabled
+        self._values: dict[IndexKey, set[str]] = {}
+        self._task: asyncio.Task[None] | None = None
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+
+    def make_key(self, model: Type[Base], field: str) -> str:
+        return f"{KEY_PREFIX}:{model.__tablename__}:{field}"
+
+    def is_indexed(self, model: Type[Base], field: str) -> bool:
+        return (
+            self.enabled and field in INDEXED_FIELDS and hasattr(model, field)
+        )
+
+    async def contains(
+        self, model: Type[Base], field: str, value: Any
+    ) -> bool:
+        """
+        True - запись точно есть в БД. False - в индексе её нет, нужна
+        проверка запросом
+        """
+        if not self.is_indexed(model, field):
+            return False
+        value = str(value)
+        if value in self._values.get((model, field), ()):
+            self.hits += 1
+            return True
+        redis = await self._get_redis()
+        if redis is not None:
+            try:
+                found = await redis.sismember(
+                    self.make_key(model, field), value
+                )
+            except RedisError as e:
+                logger.warning(f"Failed to read existence index: {e}")
+                found = False
+            if found:
+                self.redis_hits += 1
+                self._values.setdefault((model, field), set()).add(value)
+                return True
+        self.misses += 1
+        return False
+
+    async def add(self, model: Type[Base], field: str, value: Any) -> None:
+        """Добавляет значение, найденное в БД"""
+        if value is None or not self.is_indexed(model, field):
+            return
+        await self._add_values({(model, field): {str(value)}})
+
+    async def add_entities(self, objs: Iterable[Any]) -> None:
+        """Добавляет созданные или обновлённые записи во все их индексы"""
+        if not self.enabled:
+            return
+        values: dict[IndexKey, set[str]] = defaultdict(set)
+        for obj in objs:
+            model = type(obj)
+            for field in INDEXED_FIELDS:
+                value = getattr(obj, field, None)
+                if value is not None and self.is_indexed(model, field):
+                    values[(model, field)].add(str(value))
+        if values:
+            await self._add_values(values)
+
+    async def discard(self, model: Type[Base], field: str, value: Any) -> None:
+        """Удаляет значение удалённой записи"""
+        if not self.is_indexed(model, field):
+            return
+        value = str(value)
+        self._values.get((model, field), set()).discard(value)
+        redis = await self._get_redis()
+        if redis is None:
+            return
+        try:
+            await redis.srem(self.make_key(model, field), value)
+        except RedisError as e:
+            logger.warning(f"Failed to update existence index: {e}")
+
+    async def load(self, session: Any, model: Type[Base], field: str) -> int:
+        """Загружает из БД все значения поля модели"""
+        column = getattr(model, field)
+        result = await session.execute(
+            select(column).where(column.is_not(None)).distinct()
+        )
+        values = {str(value) for value in result.scalars().all()}
+        self._values[(model, field)] = values
+        await self._replace_redis(model, field, values)
+        return len(values)
+
+    async def rebuild(self) -> None:
+        """Перезагружает индексы справочников и всех встреченных моделей"""
+        keys = {
+            (model, field)
+            for model in WARM_MODELS
+            for field in INDEXED_FIELDS
+            if self.is_indexed(model, field)
+        }
+        keys.update(self._values)
+        async with async_session() as session:
+            for model, field in keys:
+                try:
+                    await self.load(session, model, field)
+                except Exception as e:
+                    logger.error(
+                        f"Failed to load existence index "
+                        f"{model.__tablename__}.{field}: {e}"
+                    )
+                    await session.rollback()
+        self.rebuilds += 1
+
+    async def startup(self) -> None:
+        """Загрузка индексов и перестроение по расписанию"""
+        if not self.enabled or self._task is not None:
+            return
+        try:
+            await self.rebuild()
+        except Exception as e:
+            logger.error(f"Failed to build existence index: {e}")
+        self._task = asyncio.create_task(
+            self._schedule(), name="existence-index"
+        )
+
+    async def shutdown(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def clear(self) -> None:
+        self._values.clear()
+
+    def stats(self) -> dict[str, Any]:
+        checks = self.hits + self.redis_hits + self.misses
+        return {
+            "models": len(self._values),
+            "size": sum(len(values) for values in self._values.values()),
+            "hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "rebuilds": self.rebuilds,
+            "hit_rate": (
+                round((self.hits + self.redis_hits) / checks, 4)
+                if checks
+                else 0.0
+            ),
+        }
+
+    async def _schedule(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.rebuild()
+            except Exception as e:
+                logger.error(f"Failed to rebuild existence index: {e}")
+
+    async def _add_values(self, values: dict[IndexKey, set[str]]) -> None:
+        for key, new_values in values.items():
+            self._values.setdefault(key, set()).update(new_values)
+        redis = await self._get_redis()
+        if redis is None:
+            return
+        try:
+            async with redis.pipeline(transaction=False) as pipe:
+                for (model, field), new_values in values.items():
+                    pipe.sadd(self.make_key(model, field), *new_values)
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Failed to update existence index: {e}")
+
+    async def _replace_redis(
+        self, model: Type[Base], field: str, values: set[str]
+    ) -> None:
+        redis = await self._get_redis()
+        if redis is None:
+            return
+        key = self.make_key(model, field)
+        items = list(values)
+        try:
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.delete(key)
+                for start in range(0, len(items), REDIS_CHUNK_SIZE):
+                    pipe.sadd(key, *items[start : start + REDIS_CHUNK_SIZE])
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Failed to store existence index: {e}")
+
+    async def _get_redis(self) -> Any:
+        if not self.use_redis:
+            return None
+        return await get_redis()
+
+
+_existence_index_instance: ExistenceIndex | None = None
+
+
+def get_existence_index() -> ExistenceIndex:
+    global _existence_index_instance
+    if _existence_index_instance is None:
+        _existence_index_instance = ExistenceIndex()
+    return _existence_index_instance
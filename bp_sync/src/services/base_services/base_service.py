@@ -6,10 +6,16 @@ from fastapi import Request, status
 from fastapi.responses import JSONResponse
 
 from core.logger import logger
+from core.settings import settings
 from models.bases import IntIdEntity
+from schemas.deal_schemas import WebhookEvent
 
 from ..bitrix_services.webhook_service import WebhookService
 from ..exceptions import BitrixApiError, ConflictException, CyclicCallException
+from ..webhook_coalescer import get_webhook_coalescer
+from ..webhook_queue import get_webhook_queue
+from .change_stats import get_change_stats
+from .related_freshness import get_related_freshness
 
 ExternalIdType = TypeVar("ExternalIdType", int, str)
 
@@ -19,11 +25,30 @@ class BitrixClientProtocol(Protocol):
 
     @abstractmethod
     async def get(
-        self, entity_id: str | int, entity_type_id: int | None = None
+        self,
+        entity_id: str | int,
+        entity_type_id: int | None = None,
+        *,
+        use_cache: bool = True,
     ) -> Any:
         """Получает сущность по ID из Bitrix"""
         ...
 
+    @abstractmethod
+    async def get_many(
+        self, entity_ids: Any, entity_type_id: int | None = None
+    ) -> tuple[dict[Any, Any], list[Any]]:
+        """
+        Получает набор сущностей из Bitrix через batch и ID, которые
+        получить не удалось
+        """
+        ...
+
+    @abstractmethod
+    async def evict_cached(self, entity_id: int | str) -> None:
+        """Удаляет сущность из кэша get"""
+        ...
+
     @abstractmethod
     def get_default_create_schema(self, external_id: int | str) -> Any:
         """Получает дефолтную схему для создания сущности"""
@@ -60,6 +85,16 @@ class RepositoryProtocol(Protocol):
         """Получает сущность по ID"""
         ...
 
+    @abstractmethod
+    async def get_many(self, external_ids: Any) -> list[Any]:
+        """Получает сущности по набору ID"""
+        ...
+
+    @abstractmethod
+    def content_hash(self, data: Any) -> str | None:
+        """Отпечаток содержимого полной схемы сущности"""
+        ...
+
 
 T = TypeVar("T", bound=IntIdEntity)  # Тип для сущности базы данных
 R = TypeVar("R", bound=RepositoryProtocol)  # Тип для репозитория
@@ -124,6 +159,17 @@ class BaseEntityClient(ABC, Generic[T, R, C]):
             entity_data = await self.bitrix_client.get(
                 entity_id, entity_type_id=entity_type_id
             )
+            entity_db = await self.repo.get(entity_id)
+            if entity_db is not None and self._check_unchanged(
+                entity_data, entity_db
+            ):
+                logger.info(
+                    f"{self.entity_name} is unchanged in Bitrix, "
+                    "import skipped",
+                    extra={f"{self.entity_name}_id": entity_id},
+                )
+                self._mark_synced(entity_id)
+                return entity_db, bool(update_needed_cache)
         except BitrixApiError as e:
             if e.is_not_found_error():
                 entity_data = self.bitrix_client.get_default_create_schema(
@@ -154,13 +200,21 @@ class BaseEntityClient(ABC, Generic[T, R, C]):
             f"Successfully imported {self.entity_name} from Bitrix",
             extra={f"{self.entity_name}_id": entity_id, "db_id": entity_db.id},
         )
+        self._mark_synced(entity_id)
         update_needed = bool(update_needed_cache)
         return entity_db, update_needed
 
     async def refresh_from_bitrix(
-        self, entity_id: int | str, entity_type_id: int | None = None
+        self,
+        entity_id: int | str,
+        entity_type_id: int | None = None,
+        *,
+        entity_data: Any = None,
     ) -> T:
-        """Обновляет данные сущности из Bitrix в базе данных"""
+        """
+        Обновляет данные сущности из Bitrix в базе данных. entity_data -
+        уже полученные из Bitrix данные, запрос к Bitrix не выполняется
+        """
 
         from ..dependencies import get_creation_cache
 
@@ -175,9 +229,21 @@ class BaseEntityClient(ABC, Generic[T, R, C]):
             extra={f"{self.entity_name}_id": entity_id},
         )
         try:
-            entity_data = await self.bitrix_client.get(
-                entity_id, entity_type_id=entity_type_id
-            )
+            if entity_data is None:
+                entity_data = await self.bitrix_client.get(
+                    entity_id, entity_type_id=entity_type_id, use_cache=False
+                )
+            entity_db = await self.repo.get(entity_id)
+            if entity_db is not None and self._check_unchanged(
+                entity_data, entity_db
+            ):
+                logger.info(
+                    f"{self.entity_name} is unchanged in Bitrix, "
+                    "refresh skipped",
+                    extra={f"{self.entity_name}_id": entity_id},
+                )
+                self._mark_synced(entity_id)
+                return entity_db  # type: ignore[no-any-return]
         except BitrixApiError as e:
             if e.is_not_found_error():
                 # await self.set_deleted_in_bitrix(entity_id)
@@ -207,6 +273,7 @@ class BaseEntityClient(ABC, Generic[T, R, C]):
             f"Successfully refreshed {self.entity_name} data from Bitrix",
             extra={f"{self.entity_name}_id": entity_id, "db_id": entity_db.id},
         )
+        self._mark_synced(entity_id)
         return entity_db  # type: ignore[no-any-return]
 
     async def delete_entity(self, entity_id: int) -> bool:
@@ -227,18 +294,27 @@ class BaseEntityClient(ABC, Generic[T, R, C]):
         except Exception:
             return False
 
+    async def fetch_for_compare(
+        self, entity_id: ExternalIdType, entity_type_id: int | None = None
+    ) -> Any:
+        """Получает сущность из Bitrix для сравнения с базой данных"""
+        return await self.bitrix_client.get(entity_id, entity_type_id)
+
     async def get_changes_b24_db(
         self,
         entity_id: ExternalIdType,
         entity_type_id: int | None = None,
         exclude_fields: set[str] | None = None,
     ) -> tuple[Any, Any, dict[str, dict[str, Any]] | None]:
-        schema_b24 = await self.bitrix_client.get(entity_id, entity_type_id)
+        schema_b24 = await self.fetch_for_compare(entity_id, entity_type_id)
         schema_db = await self.repo.get(entity_id)
 
         if schema_db is None:
             return schema_b24, schema_db, None
 
+        if self._check_unchanged(schema_b24, schema_db):
+            return schema_b24, schema_db, {}
+
         if not hasattr(schema_db, "to_pydantic"):
             logger.warning(
                 f"Entity {schema_db} does not have to_pydantic method"
@@ -272,6 +348,74 @@ class BaseEntityClient(ABC, Generic[T, R, C]):
             schema_b24.get_changes(pydantic_db, exclude_fields=exclude_fields),
         )
 
+    async def get_changes_many(
+        self,
+        entity_ids: list[ExternalIdType],
+        entity_type_id: int | None = None,
+        exclude_fields: set[str] | None = None,
+    ) -> dict[Any, dict[str, dict[str, Any]] | None]:
+        """
+        Различия Битрикс24 и БД для набора сущностей: данные получаются
+        пачками batch и одним запросом к БД. None - сущности нет в БД.
+        Сущности, не найденные в Битрикс24, в результат не попадают
+        """
+        schemas_b24, _ = await self.bitrix_client.get_many(
+            entity_ids, entity_type_id=entity_type_id
+        )
+        entities_db = {
+            entity.external_id: entity
+            for entity in await self.repo.get_many(list(schemas_b24))
+        }
+        result: dict[Any, dict[str, dict[str, Any]] | None] = {}
+        changed_ids: list[Any] = []
+        pairs: list[tuple[Any, Any]] = []
+        for entity_id, schema_b24 in schemas_b24.items():
+            entity_db = entities_db.get(entity_id)
+            if entity_db is None:
+                result[entity_id] = None
+            elif self._check_unchanged(schema_b24, entity_db):
+                result[entity_id] = {}
+            else:
+                changed_ids.append(entity_id)
+                pairs.append((schema_b24, entity_db.to_pydantic()))
+        if pairs:
+            diffs = type(pairs[0][0]).diff_many(pairs, exclude_fields)
+            result.update(zip(changed_ids, diffs))
+        return result
+
+    def is_unchanged(
+        self,
+        schema_b24: Any,
+        entity_db: Any,
+        content_hash: str | None = None,
+    ) -> bool:
+        """
+        Сущность не менялась в Битрикс24 с последней синхронизации: дата
+        изменения и отпечаток содержимого совпадают с сохранёнными в БД
+        """
+        stored_hash: str | None = getattr(entity_db, "content_hash", None)
+        if not stored_hash:
+            return False
+        modified = getattr(schema_b24, "date_modify", None)
+        stored_modified = getattr(entity_db, "date_modify", None)
+        if modified and stored_modified and modified != stored_modified:
+            return False
+        if content_hash is None:
+            content_hash = self.repo.content_hash(schema_b24)
+        return stored_hash == content_hash
+
+    def _mark_synced(self, entity_id: int | str) -> None:
+        """Отмечает сущность актуальной для обновления связанных"""
+        get_related_freshness().mark(
+            self.repo.model, entity_id  # type: ignore[attr-defined]
+        )
+
+    def _check_unchanged(self, schema_b24: Any, entity_db: Any) -> bool:
+        """Проверка по отпечатку с учётом в статистике пропусков"""
+        unchanged = self.is_unchanged(schema_b24, entity_db)
+        get_change_stats().record(self.entity_name, unchanged)
+        return unchanged
+
     async def entity_processing(
         self,
         request: Request,
@@ -299,7 +443,25 @@ class BaseEntityClient(ABC, Generic[T, R, C]):
                         "Entity type ID mismatch",
                         "TypeMismatchError",
                     )
-            await self.import_from_bitrix(entity_id, entity_type_id)
+            event = WebhookEvent(
+                entity=self.entity_name,
+                entity_id=entity_id,
+                entity_type_id=entity_type_id,
+                event=webhook_payload.event,
+                ts=int(webhook_payload.ts),
+            )
+            coalescer = await get_webhook_coalescer()
+            if not await coalescer.admit(event.entity, event.entity_id):
+                return self._success_response(
+                    f"{self.entity_name} {entity_id} is already scheduled",
+                    webhook_payload.event,
+                )
+            if await self.enqueue_webhook_event(event):
+                return self._success_response(
+                    f"{self.entity_name} {entity_id} queued for processing",
+                    webhook_payload.event,
+                )
+            await self.run_webhook_event(event, in_request=True)
             return self._success_response(
                 f"{self.entity_name} {entity_id} processed successfully",
                 webhook_payload.event,
@@ -312,6 +474,67 @@ class BaseEntityClient(ABC, Generic[T, R, C]):
                 "Unexpected error",
             )
 
+    async def enqueue_webhook_event(self, event: WebhookEvent) -> bool:
+        """
+        Передаёт событие фоновым воркерам после "тихого" окна. False -
+        обработка выключена или очередь недоступна, событие нужно
+        обработать в запросе
+        """
+        if not settings.WEBHOOK_ASYNC_PROCESSING:
+            return False
+        return await get_webhook_queue().publish(
+            event, delay=settings.WEBHOOK_DEBOUNCE_SECONDS
+        )
+
+    async def run_webhook_event(
+        self, event: WebhookEvent, *, in_request: bool = False
+    ) -> float:
+        """
+        Обработка события с объединением: события сущности, пришедшие во
+        время обработки, приводят не более чем к одному повторному прогону.
+        Возвращает, на сколько секунд отложить событие, если всплеск ещё
+        не закончился; 0 - событие обработано. В HTTP-запросе (in_request)
+        обработка начинается сразу
+        """
+        coalescer = await get_webhook_coalescer()
+        while True:
+            wait = await coalescer.begin(
+                event.entity, event.entity_id, 0.0 if in_request else None
+            )
+            if wait > 0:
+                return wait
+            try:
+                if await self.is_echo_event(event):
+                    coalescer.echoes_dropped += 1
+                    logger.info(
+                        f"Skipped echo {event.event} for "
+                        f"{self.entity_name} {event.entity_id}"
+                    )
+                else:
+                    await self.process_webhook_event(
+                        event, in_request=in_request
+                    )
+            except Exception:
+                await coalescer.release(event.entity, event.entity_id)
+                raise
+            if not await coalescer.finish(event.entity, event.entity_id):
+                return 0.0
+
+    async def is_echo_event(self, event: WebhookEvent) -> bool:
+        """Событие вызвано нашей собственной записью в Битрикс24"""
+        return False
+
+    async def process_webhook_event(
+        self, event: WebhookEvent, *, in_request: bool = False
+    ) -> None:
+        """Обработка проверенного события вебхука"""
+        # Сущность изменилась в Битрикс24 - кэш get больше не актуален
+        await self.bitrix_client.evict_cached(event.entity_id)
+        get_related_freshness().invalidate(
+            self.repo.model, event.entity_id  # type: ignore[attr-defined]
+        )
+        await self.import_from_bitrix(event.entity_id, event.entity_type_id)
+
     def _success_response(self, message: str, event: str) -> JSONResponse:
         """Успешный ответ"""
         return JSONResponse(
@@ -0,0 +1,38 @@
+from typing import Any
+
+
+class ChangeStats:
+    """
+    Счётчики проверки сущностей по отпечатку содержимого: сколько раз
+    сущность проверялась и сколько раз синхронизация была пропущена
+    """
+
+    def __init__(self) -> None:
+        self.checked: dict[str, int] = {}
+        self.skipped: dict[str, int] = {}
+
+    def record(self, entity: str, skipped: bool) -> None:
+        self.checked[entity] = self.checked.get(entity, 0) + 1
+        if skipped:
+            self.skipped[entity] = self.skipped.get(entity, 0) + 1
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        result: dict[str, dict[str, Any]] = {}
+        for entity, checked in self.checked.items():
+            skipped = self.skipped.get(entity, 0)
+            result[entity] = {
+                "checked": checked,
+                "skipped": skipped,
+                "skip_rate": round(skipped / checked, 3),
+            }
+        return result
+
+
+_change_stats_instance: ChangeStats | None = None
+
+
+def get_change_stats() -> ChangeStats:
+    global _change_stats_instance
+    if _change_stats_instance is None:
+        _change_stats_instance = ChangeStats()
+    return _change_stats_instance
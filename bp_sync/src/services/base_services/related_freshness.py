@@ -0,0 +1,83 @@
+import time
+from collections import OrderedDict
+from typing import Any
+
+from core.settings import settings
+
+
+class RelatedFreshness:
+    """
+    Время последней синхронизации сущностей с Битрикс24 между запросами.
+
+    Связанная сущность, синхронизированная не раньше TTL её типа назад,
+    считается актуальной и не обновляется повторно при сохранении
+    ссылающихся на неё сделок, лидов и счетов. Типы без TTL обновляются
+    всегда. Хранится в памяти процесса с вытеснением LRU.
+    """
+
+    def __init__(
+        self,
+        ttls: dict[str, int] | None = None,
+        max_size: int = settings.RELATED_FRESHNESS_SIZE,
+    ) -> None:
+        self.ttls = ttls if ttls is not None else settings.RELATED_REFRESH_TTL
+        self.max_size = max_size
+        self._synced: OrderedDict[tuple[str, str], float] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def ttl(self, model: Any) -> int:
+        return self.ttls.get(model.__name__.lower(), 0)
+
+    def make_key(self, model: Any, external_id: Any) -> tuple[str, str]:
+        return model.__name__.lower(), str(external_id)
+
+    def is_fresh(self, model: Any, external_id: Any) -> bool:
+        """Сущность синхронизирована в пределах TTL своего типа"""
+        ttl = self.ttl(model)
+        synced_at = (
+            self._synced.get(self.make_key(model, external_id))
+            if ttl > 0
+            else None
+        )
+        if synced_at is not None and time.monotonic() - synced_at < ttl:
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def mark(self, model: Any, external_id: Any) -> None:
+        """Отмечает сущность синхронизированной сейчас"""
+        if self.max_size <= 0 or self.ttl(model) <= 0:
+            return
+        key = self.make_key(model, external_id)
+        self._synced[key] = time.monotonic()
+        self._synced.move_to_end(key)
+        while len(self._synced) > self.max_size:
+            self._synced.popitem(last=False)
+
+    def invalidate(self, model: Any, external_id: Any) -> None:
+        self._synced.pop(self.make_key(model, external_id), None)
+
+    def clear(self) -> None:
+        self._synced.clear()
+
+    def stats(self) -> dict[str, Any]:
+        checks = self.hits + self.misses
+        return {
+            "size": len(self._synced),
+            "max_size": self.max_size,
+            "fresh": self.hits,
+            "stale": self.misses,
+            "fresh_rate": round(self.hits / checks, 4) if checks else 0.0,
+        }
+
+
+_related_freshness_instance: RelatedFreshness | None = None
+
+
+def get_related_freshness() -> RelatedFreshness:
+    global _related_freshness_instance
+    if _related_freshness_instance is None:
+        _related_freshness_instance = RelatedFreshness()
+    return _related_freshness_instance
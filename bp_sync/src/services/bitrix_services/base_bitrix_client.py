@@ -1,33 +1,76 @@
 from typing import Any, cast
 
 import httpx
+import orjson
 from fastapi import status
 
 from core.logger import logger
 
+from ..circuit_breaker import (
+    CircuitBreaker,
+    UpstreamUnavailableError,
+    get_circuit_breaker,
+)
 from ..exceptions import BitrixApiError, BitrixAuthError
+from ..http_client import BITRIX_POOL, get_http_client
+from .rate_limiter import RATE_LIMIT_ERRORS
 
 DEFAULT_TIMEOUT = 10
 JsonResponse = dict[str, Any]
 
 
 class BaseBitrixClient:
-    def __init__(self, timeout: int = DEFAULT_TIMEOUT):
+    http_pool_name: str = BITRIX_POOL
+    upstream: str = BITRIX_POOL
+
+    def __init__(
+        self,
+        timeout: int = DEFAULT_TIMEOUT,
+        http_client: httpx.AsyncClient | None = None,
+    ):
         self.timeout = timeout
+        self._http_client = http_client
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        """Общий клиент с пулом соединений к порталу"""
+        if self._http_client is not None and not self._http_client.is_closed:
+            return self._http_client
+        return get_http_client(self.http_pool_name)
+
+    @property
+    def circuit_breaker(self) -> CircuitBreaker:
+        """Автомат защиты и лимит параллельности апстрима"""
+        return get_circuit_breaker(self.upstream)
+
+    def _upstream_unavailable(
+        self, error: UpstreamUnavailableError
+    ) -> BitrixApiError:
+        logger.warning(str(error))
+        return BitrixApiError(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            error="UPSTREAM_UNAVAILABLE",
+            error_description=str(error),
+        )
 
     async def _get(
         self, url: str, params: dict[str, Any] | None = None
     ) -> JsonResponse:
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.get(url, params=params)
+            async with self.circuit_breaker.guard() as outcome:
+                response = await self.http_client.get(
+                    url, params=params, timeout=self.timeout
+                )
+                outcome.failed = response.status_code >= 500
                 # response.raise_for_status()
-                json_data = response.json()
-                if not isinstance(json_data, dict):
-                    raise ValueError(
-                        f"Expected JSON object, got {type(json_data).__name__}"
-                    )
-                return cast(JsonResponse, json_data)
+                json_data = orjson.loads(response.content)
+            if not isinstance(json_data, dict):
+                raise ValueError(
+                    f"Expected JSON object, got {type(json_data).__name__}"
+                )
+            return cast(JsonResponse, json_data)
+        except UpstreamUnavailableError as e:
+            raise self._upstream_unavailable(e)
         except httpx.HTTPStatusError as e:
             detail = e.response.json().get("error_description", str(e))
             logger.error(f"HTTP error: {e.response.status_code}")
@@ -49,20 +92,28 @@ class BaseBitrixClient:
 
     async def _post(self, url: str, payload: dict[str, Any]) -> JsonResponse:
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
+            async with self.circuit_breaker.guard() as outcome:
+                response = await self.http_client.post(
                     url,
                     json=payload,
                     headers={"Content-Type": "application/json"},
+                    timeout=self.timeout,
                 )
                 # response.raise_for_status()
-                json_data = response.json()
-                if not isinstance(json_data, dict):
-                    raise ValueError(
-                        f"Expected JSON object, got {type(json_data).__name__}"
-                    )
-                json_data["status_code"] = response.status_code
-                return cast(JsonResponse, json_data)
+                json_data = orjson.loads(response.content)
+                # Превышение лимитов приходит с кодом 503, но это не сбой
+                outcome.failed = response.status_code >= 500 and (
+                    not isinstance(json_data, dict)
+                    or json_data.get("error") not in RATE_LIMIT_ERRORS
+                )
+            if not isinstance(json_data, dict):
+                raise ValueError(
+                    f"Expected JSON object, got {type(json_data).__name__}"
+                )
+            json_data["status_code"] = response.status_code
+            return cast(JsonResponse, json_data)
+        except UpstreamUnavailableError as e:
+            raise self._upstream_unavailable(e)
         except httpx.HTTPStatusError as e:
             logger.error(
                 f"API HTTP error {e.response.status_code}: {e.response.text}"
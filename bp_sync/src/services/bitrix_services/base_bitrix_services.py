@@ -1,6 +1,9 @@
-from typing import Any, Generic, Type, TypeVar
+import asyncio
+from datetime import datetime
+from typing import Any, AsyncIterator, Generic, Iterable, Type, TypeVar
 
 from fastapi import status
+from pydantic import ValidationError
 
 from core.logger import logger
 from core.settings import settings
@@ -11,7 +14,9 @@ from schemas.base_schemas import (  # CoreCreateSchema,; CoreUpdateSchema,
 
 from ..decorators import handle_bitrix_errors
 from ..exceptions import BitrixApiError
+from .batch_dispatcher import BATCH_MAX_COMMANDS, build_batch_command
 from .bitrix_api_client import BitrixAPIClient
+from .entity_cache import BitrixEntityCache, get_bitrix_entity_cache
 
 # Дженерик для схем
 # SchemaTypeCreate = TypeVar("SchemaTypeCreate", bound=CoreCreateSchema)
@@ -19,6 +24,16 @@ from .bitrix_api_client import BitrixAPIClient
 SchemaTypeCreate = TypeVar("SchemaTypeCreate", bound=CommonFieldMixin)
 SchemaTypeUpdate = TypeVar("SchemaTypeUpdate", bound=CommonFieldMixin)
 
+LIST_PAGE_SIZE = 50
+# Первый батч выборки по ID небольшой: короткие выборки не тратят
+# команды, размер удваивается после каждого батча полных страниц
+KEYSET_FIRST_BATCH = 2
+# Метод list класса перекрывает встроенный list в аннотациях
+ListPage = list[dict[str, Any]]
+SelectFields = list[str]
+# Интервал серверного времени Битрикс24, в котором выполнен запрос
+WriteWindow = tuple[datetime, datetime]
+
 
 class BaseBitrixEntityClient(Generic[SchemaTypeCreate, SchemaTypeUpdate]):
     """Базовый клиент для работы с сущностями Bitrix"""
@@ -27,8 +42,13 @@ class BaseBitrixEntityClient(Generic[SchemaTypeCreate, SchemaTypeUpdate]):
     create_schema: Type[SchemaTypeCreate]
     update_schema: Type[SchemaTypeUpdate]
 
-    def __init__(self, bitrix_client: BitrixAPIClient):
+    def __init__(
+        self,
+        bitrix_client: BitrixAPIClient,
+        entity_cache: BitrixEntityCache | None = None,
+    ):
         self.bitrix_client = bitrix_client
+        self.entity_cache = entity_cache or get_bitrix_entity_cache()
 
     def _get_method(
         self,
@@ -142,8 +162,18 @@ class BaseBitrixEntityClient(Generic[SchemaTypeCreate, SchemaTypeUpdate]):
         entity_id: int | str,
         entity_type_id: int | None = None,
         crm: bool = True,
+        use_cache: bool = True,
     ) -> SchemaTypeCreate:
-        """Получение сущности по ID"""
+        """Получение сущности по ID
+
+        При use_cache=True данные берутся из кэша сущностей, если для
+        типа сущности задан TTL (BITRIX_ENTITY_CACHE_TTL)
+        """
+        if use_cache and (
+            cached := await self.entity_cache.get(self.entity_name, entity_id)
+        ):
+            return self.create_schema(**cached)
+
         logger.debug(f"Fetching {self.entity_name} ID={entity_id}")
 
         method = self._get_method("get", entity_type_id, crm)
@@ -161,9 +191,146 @@ class BaseBitrixEntityClient(Generic[SchemaTypeCreate, SchemaTypeUpdate]):
             entity_type_id,
             crm,
         )
+        await self.entity_cache.set(self.entity_name, entity_id, result)
         return self.create_schema(**result)
 
     @handle_bitrix_errors()
+    async def get_many(
+        self,
+        entity_ids: Iterable[int | str],
+        entity_type_id: int | None = None,
+        crm: bool = True,
+    ) -> tuple[dict[int | str, SchemaTypeCreate], list[int | str]]:
+        """Получение сущностей по ID пачками до 50 команд get в batch
+
+        Возвращает {ID: схема} и список пропущенных ID: ненайденных в
+        Битрикс24 и не прошедших валидацию.
+        """
+        method = self._get_method("get", entity_type_id, crm)
+        ids = list(entity_ids)
+        entities: dict[int | str, SchemaTypeCreate] = {}
+        skipped: list[int | str] = []
+        for start in range(0, len(ids), BATCH_MAX_COMMANDS):
+            chunk = ids[start : start + BATCH_MAX_COMMANDS]
+            commands = {
+                f"e{entity_id}": build_batch_command(
+                    method,
+                    self._prepare_params(
+                        entity_id=entity_id, entity_type_id=entity_type_id
+                    ),
+                )
+                for entity_id in chunk
+            }
+            response = await self.bitrix_client.call_api(
+                method="batch", params={"halt": 0, "cmd": commands}
+            )
+            results = (response.get("result") or {}).get("result") or {}
+            if not isinstance(results, dict):
+                # Если все команды завершились ошибкой, приходит список
+                results = {}
+            for entity_id in chunk:
+                data = results.get(f"e{entity_id}")
+                if entity_type_id and isinstance(data, dict):
+                    data = data.get("item")
+                elif not crm and isinstance(data, dict):
+                    data = data.get("product")
+                if not data:
+                    logger.warning(
+                        f"{self.entity_name.capitalize()} ID={entity_id} "
+                        "is missing from batch result"
+                    )
+                    skipped.append(entity_id)
+                    continue
+                try:
+                    entities[entity_id] = self.create_schema(**data)
+                except ValidationError as e:
+                    logger.error(
+                        f"Invalid {self.entity_name} ID={entity_id}: {e}"
+                    )
+                    skipped.append(entity_id)
+                    continue
+                await self.entity_cache.set(self.entity_name, entity_id, data)
+        return entities, skipped
+
+    @handle_bitrix_errors()
+    async def get_partial(
+        self,
+        entity_id: int | str,
+        fields: Iterable[str],
+        entity_type_id: int | None = None,
+        crm: bool = True,
+    ) -> SchemaTypeCreate:
+        """Облегчённое получение сущности по ID
+
+        Из Битрикс24 запрашиваются только указанные поля схемы, результат -
+        частичная схема (см. `partial_schema`). Методы get не поддерживают
+        select, поэтому используется list с фильтром по ID.
+
+        Example:
+            ```python
+            deal = await client.get_partial(1, ["category_id"])
+            ```
+        """
+        schema = self.create_schema.partial_schema({"external_id", *fields})
+        id_field = self._id_field(entity_type_id, crm)
+        method = self._get_method("list", entity_type_id, crm)
+        params = self._prepare_params(
+            entity_type_id=entity_type_id,
+            select=self.select_for(fields, entity_type_id, crm),
+            filter={id_field: entity_id},
+            start=-1,
+        )
+        response = await self.bitrix_client.call_api(
+            method=method, params=params
+        )
+        entities = self._extract_list_entities(
+            response.get("result", {}), entity_type_id, crm
+        )
+        if not entities:
+            logger.error(
+                f"Failed to get {self.entity_name} ID={entity_id}: Not found"
+            )
+            raise BitrixApiError(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                error=f"Failed to get {self.entity_name} ID={entity_id}",
+                error_description="Not found",
+            )
+        return schema(**entities[0])
+
+    def select_for(
+        self,
+        fields: Iterable[str] | None = None,
+        entity_type_id: int | None = None,
+        crm: bool = True,
+    ) -> SelectFields:
+        """Параметр select для указанных полей схемы (всегда с ID)"""
+        alias_choice = 2 if entity_type_id or not crm else 1
+        aliases = self.create_schema.bitrix_aliases(fields, alias_choice)
+        id_field = self._id_field(entity_type_id, crm)
+        if id_field not in aliases:
+            aliases.insert(0, id_field)
+        return aliases
+
+    def _id_field(self, entity_type_id: int | None, crm: bool) -> str:
+        return "id" if entity_type_id or not crm else "ID"
+
+    def _write_window(self, response: dict[str, Any]) -> WriteWindow | None:
+        """Интервал выполнения запроса из поля time ответа"""
+        timing = response.get("time")
+        if not isinstance(timing, dict):
+            return None
+        try:
+            started = datetime.fromisoformat(timing["date_start"])
+            finished = datetime.fromisoformat(timing["date_finish"])
+        except (KeyError, TypeError, ValueError):
+            return None
+        # DATE_MODIFY хранится с точностью до секунды
+        return started.replace(microsecond=0), finished
+
+    async def evict_cached(self, entity_id: int | str) -> None:
+        """Удаляет сущность из кэша get"""
+        await self.entity_cache.invalidate(self.entity_name, entity_id)
+
     async def update(
         self,
         data: SchemaTypeUpdate,
@@ -171,6 +338,21 @@ class BaseBitrixEntityClient(Generic[SchemaTypeCreate, SchemaTypeUpdate]):
         crm: bool = True,
     ) -> bool:
         """Обновление сущности"""
+        success, _ = await self.update_timed(data, entity_type_id, crm)
+        return success
+
+    @handle_bitrix_errors()
+    async def update_timed(
+        self,
+        data: SchemaTypeUpdate,
+        entity_type_id: int | None = None,
+        crm: bool = True,
+    ) -> tuple[bool, WriteWindow | None]:
+        """
+        Обновление сущности. Дополнительно возвращает интервал серверного
+        времени выполнения запроса: DATE_MODIFY записанной сущности лежит
+        в нём
+        """
         if not data.external_id:
             logger.error("Update failed: Missing entity ID")
             raise ValueError(
@@ -187,6 +369,7 @@ class BaseBitrixEntityClient(Generic[SchemaTypeCreate, SchemaTypeUpdate]):
         response = await self.bitrix_client.call_api(
             method=method, params=params
         )
+        await self.evict_cached(entity_id)
         # Для универсальных методов возвращается объект, для обычных - булево
         success = bool(
             response.get("result", {}).get("item")
@@ -205,7 +388,7 @@ class BaseBitrixEntityClient(Generic[SchemaTypeCreate, SchemaTypeUpdate]):
                 f"Failed to update {self.entity_name} ID={entity_id}: {error}"
             )
 
-        return success
+        return success, self._write_window(response)
 
     @handle_bitrix_errors()
     async def delete(
@@ -225,6 +408,7 @@ class BaseBitrixEntityClient(Generic[SchemaTypeCreate, SchemaTypeUpdate]):
         response = await self.bitrix_client.call_api(
             method=method, params=params
         )
+        await self.evict_cached(entity_id)
         if entity_type_id:
             # Для универсальных методов (crm.item.delete)
             # Успешный ответ может содержать пустой массив в result
@@ -302,7 +486,8 @@ class BaseBitrixEntityClient(Generic[SchemaTypeCreate, SchemaTypeUpdate]):
 
         Returns:
             ListResponseSchema: Объект с результатами выборки:
-                - result: список сущностей
+                - result: список сущностей (валидируется при обращении)
+                - raw: список сущностей в виде словарей Битрикс24
                 - total: общее количество сущностей
                 - next: смещение для следующей страницы (если есть)
 
@@ -358,24 +543,268 @@ class BaseBitrixEntityClient(Generic[SchemaTypeCreate, SchemaTypeUpdate]):
         response = await self.bitrix_client.call_api(
             method=method, params=params
         )
-        result = response.get("result", {})
-        # Обработка разных форматов ответа
-        if entity_type_id:
-            entities = result.get("items", [])
-        elif not crm:
-            entities = result.get("products", [])
-        else:
-            entities = result
+        entities = self._extract_list_entities(
+            response.get("result", {}), entity_type_id, crm
+        )
         total = response.get("total", 0)
         next_page = response.get("next")
-        parsed_entities = [self.update_schema(**entity) for entity in entities]
+        logger.info(f"Fetched {len(entities)} of {total} {self.entity_name}s")
+        # Строки валидируются схемой только при обращении к result
+        return ListResponseSchema[SchemaTypeUpdate].lazy(
+            entities, self.update_schema, total, next_page
+        )
+
+    def _list_result_key(
+        self, entity_type_id: int | None, crm: bool
+    ) -> str | None:
+        """Ключ, под которым метод list возвращает записи"""
+        if entity_type_id:
+            return "items"
+        if not crm:
+            return "products"
+        return None
+
+    def _extract_list_entities(
+        self, result: Any, entity_type_id: int | None, crm: bool
+    ) -> ListPage:
+        """Извлекает записи из результата метода list"""
+        key = self._list_result_key(entity_type_id, crm)
+        if key is not None:
+            result = result.get(key, []) if isinstance(result, dict) else []
+        return result if isinstance(result, list) else []
+
+    async def iter_list(
+        self,
+        select: SelectFields | None = None,
+        filter_entity: dict[str, Any] | None = None,
+        order: dict[str, str] | None = None,
+        entity_type_id: int | None = None,
+        crm: bool = True,
+        keyset: bool = False,
+        fields: Iterable[str] | None = None,
+    ) -> AsyncIterator[SchemaTypeUpdate]:
+        """Потоковая выборка всех сущностей по фильтру
+
+        Записи отдаются по мере получения страниц. Страницы запрашиваются
+        пачками до 50 штук в одном вызове batch.
+
+        Args:
+            select, filter_entity, order: как в `list`.
+            keyset: постраничная выборка по ID (`>ID` + `start=-1`) без
+                подсчёта total, рекомендуется Битрикс24 для больших
+                выборок. Порядок order при этом игнорируется - записи
+                идут по возрастанию ID.
+            fields: имена полей схемы, из которых строится select, если
+                он не передан явно (см. `select_for`).
+
+        Example:
+            ```python
+            async for deal in client.iter_list(
+                select=["ID"], filter_entity={"CATEGORY_ID": 0}, keyset=True
+            ):
+                ...
+            ```
+        """
+        async for entity in self.iter_list_raw(
+            select, filter_entity, order, entity_type_id, crm, keyset, fields
+        ):
+            yield self.update_schema(**entity)
+
+    async def iter_list_raw(
+        self,
+        select: SelectFields | None = None,
+        filter_entity: dict[str, Any] | None = None,
+        order: dict[str, str] | None = None,
+        entity_type_id: int | None = None,
+        crm: bool = True,
+        keyset: bool = False,
+        fields: Iterable[str] | None = None,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """
+        То же, что `iter_list`, но записи отдаются словарями без валидации
+        схемой (для выборок только ID и т.п.)
+        """
+        if select is None and fields is not None:
+            select = self.select_for(fields, entity_type_id, crm)
+        method = self._get_method("list", entity_type_id, crm)
+        if keyset:
+            pages = self._iter_keyset_pages(
+                method, select, filter_entity, entity_type_id, crm
+            )
+        else:
+            pages = self._iter_offset_pages(
+                method, select, filter_entity, order, entity_type_id, crm
+            )
+        async for entities in pages:
+            for entity in entities:
+                yield entity
+
+    async def _iter_offset_pages(
+        self,
+        method: str,
+        select: SelectFields | None,
+        filter_entity: dict[str, Any] | None,
+        order: dict[str, str] | None,
+        entity_type_id: int | None,
+        crm: bool,
+    ) -> AsyncIterator[ListPage]:
+        """
+        Первая страница даёт total, остальные смещения запрашиваются
+        параллельными батчами
+        """
+
+        def page_params(start: int) -> dict[str, Any]:
+            return self._prepare_params(
+                entity_type_id=entity_type_id,
+                select=select,
+                filter=filter_entity,
+                order=order,
+                start=start,
+            )
+
+        response = await self.bitrix_client.call_api(
+            method=method, params=page_params(0)
+        )
+        entities = self._extract_list_entities(
+            response.get("result", {}), entity_type_id, crm
+        )
+        total = int(response.get("total") or 0)
         logger.info(
-            f"Fetched {len(parsed_entities)} of {total} {self.entity_name}s"
+            f"Streaming {total} {self.entity_name}s "
+            f"(first page: {len(entities)})"
+        )
+        yield entities
+        if not response.get("next") or len(entities) >= total:
+            return
+
+        offsets = list(range(LIST_PAGE_SIZE, total, LIST_PAGE_SIZE))
+        chunks = [
+            offsets[i : i + BATCH_MAX_COMMANDS]
+            for i in range(0, len(offsets), BATCH_MAX_COMMANDS)
+        ]
+        semaphore = asyncio.Semaphore(
+            max(1, settings.BITRIX_LIST_PARALLEL_BATCHES)
+        )
+
+        async def fetch_chunk(chunk: list[int]) -> list[ListPage]:
+            commands = {
+                f"page_{start}": build_batch_command(
+                    method, page_params(start)
+                )
+                for start in chunk
+            }
+            async with semaphore:
+                results = await self._call_list_batch(commands)
+            return [
+                self._extract_list_entities(
+                    results.get(key), entity_type_id, crm
+                )
+                for key in commands
+            ]
+
+        tasks = [asyncio.create_task(fetch_chunk(chunk)) for chunk in chunks]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                for page in await next_done:
+                    yield page
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _iter_keyset_pages(
+        self,
+        method: str,
+        select: SelectFields | None,
+        filter_entity: dict[str, Any] | None,
+        entity_type_id: int | None,
+        crm: bool,
+    ) -> AsyncIterator[ListPage]:
+        """
+        Выборка по возрастанию ID без подсчёта total. Каждая команда батча
+        берёт ID последней записи предыдущей команды через $result
+        """
+        id_field = self._id_field(entity_type_id, crm)
+        if select and "*" not in select and id_field not in select:
+            select = [*select, id_field]
+        result_key = self._list_result_key(entity_type_id, crm)
+        result_path = f"[{result_key}]" if result_key else ""
+        filter_entity = dict(filter_entity or {})
+        last_id: Any = filter_entity.pop(f">{id_field}", 0)
+
+        batch_size = KEYSET_FIRST_BATCH
+        while True:
+            commands: dict[str, str] = {}
+            previous = None
+            for index in range(batch_size):
+                key = f"page_{index}"
+                page_last_id = (
+                    f"$result[{previous}]{result_path}"
+                    f"[{LIST_PAGE_SIZE - 1}][{id_field}]"
+                    if previous
+                    else last_id
+                )
+                params = self._prepare_params(
+                    entity_type_id=entity_type_id,
+                    select=select,
+                    filter={**filter_entity, f">{id_field}": page_last_id},
+                    order={id_field: "ASC"},
+                    start=-1,
+                )
+                commands[key] = build_batch_command(method, params)
+                previous = key
+
+            results, errors = await self._fetch_list_batch(commands)
+            for key in commands:
+                if key in errors:
+                    self._raise_list_error(key, errors[key])
+                entities = self._extract_list_entities(
+                    results.get(key), entity_type_id, crm
+                )
+                if entities:
+                    yield entities
+                if len(entities) < LIST_PAGE_SIZE:
+                    # Ошибки следующих команд не важны: они ссылались
+                    # на несуществующую запись
+                    return
+                last_id = entities[-1][id_field]
+            batch_size = min(batch_size * 2, BATCH_MAX_COMMANDS)
+
+    async def _call_list_batch(
+        self, commands: dict[str, str]
+    ) -> dict[str, Any]:
+        """Выполняет батч страниц списка, возвращает результаты по ключам"""
+        results, errors = await self._fetch_list_batch(commands)
+        if errors:
+            self._raise_list_error(*next(iter(errors.items())))
+        return results
+
+    async def _fetch_list_batch(
+        self, commands: dict[str, str]
+    ) -> tuple[dict[str, Any], dict[str, Any]]:
+        """Выполняет батч страниц списка, возвращает результаты и ошибки"""
+        response = await self.bitrix_client.call_api(
+            method="batch", params={"halt": 0, "cmd": commands}
         )
-        return ListResponseSchema[SchemaTypeUpdate](
-            result=parsed_entities,
-            total=total,
-            next=next_page,
+        batch_result = response.get("result") or {}
+        results = batch_result.get("result") or {}
+        errors = batch_result.get("result_error") or {}
+        return (
+            results if isinstance(results, dict) else {},
+            errors if isinstance(errors, dict) else {},
+        )
+
+    def _raise_list_error(self, key: str, error: Any) -> None:
+        """Ошибка команды батча страниц списка"""
+        if not isinstance(error, dict):
+            error = {"error": str(error)}
+        logger.error(f"Failed to list {self.entity_name} page {key}: {error}")
+        raise BitrixApiError(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            error=error.get("error", "Unknown error"),
+            error_description=error.get(
+                "error_description",
+                f"Failed to list {self.entity_name}",
+            ),
         )
 
     def get_default_create_schema(self, external_id: int | str) -> Any:
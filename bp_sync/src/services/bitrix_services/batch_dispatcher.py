@@ -0,0 +1,215 @@
+import asyncio
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+from urllib.parse import urlencode
+
+from core.logger import logger
+from core.settings import settings
+
+from .rate_limiter import RATE_LIMIT_ERRORS
+
+if TYPE_CHECKING:
+    from .bitrix_api_client import BitrixAPIClient
+
+BATCH_METHOD = "batch"
+BATCH_MAX_COMMANDS = 50
+# Объединяются только чтения: записи внутри batch не повторяются при
+# ошибках лимита и не должны смешиваться с чужими командами
+BATCHABLE_SUFFIXES = (".get", ".list", ".fields")
+
+
+@dataclass
+class PendingCall:
+    """Вызов API, ожидающий отправки в составе батча"""
+
+    client: "BitrixAPIClient"
+    method: str
+    params: dict[str, Any]
+    future: "asyncio.Future[dict[str, Any]]"
+
+
+def _flatten_params(value: Any, prefix: str) -> list[tuple[str, str]]:
+    """
+    Разворачивает вложенные параметры в пары в стиле http_build_query.
+    Пустые списки и словари передаются как 'key=', чтобы очистка поля
+    не терялась
+    """
+    if isinstance(value, (dict, list, tuple, set)) and not value:
+        return [(prefix, "")] if prefix else []
+    if isinstance(value, dict):
+        pairs: list[tuple[str, str]] = []
+        for key, item in value.items():
+            pairs.extend(
+                _flatten_params(item, f"{prefix}[{key}]" if prefix else key)
+            )
+        return pairs
+    if isinstance(value, (list, tuple, set)):
+        pairs = []
+        for index, item in enumerate(value):
+            pairs.extend(_flatten_params(item, f"{prefix}[{index}]"))
+        return pairs
+    if isinstance(value, bool):
+        return [(prefix, "1" if value else "0")]
+    if value is None:
+        return [(prefix, "")]
+    return [(prefix, str(value))]
+
+
+def build_batch_command(method: str, params: dict[str, Any] | None) -> str:
+    """Формирует команду батча вида 'crm.deal.get?id=1'"""
+    if not params:
+        return method
+    return f"{method}?{urlencode(_flatten_params(params, ''))}"
+
+
+class BitrixBatchDispatcher:
+    """
+    Объединяет независимые вызовы API, сделанные в коротком окне времени,
+    в один запрос batch (до 50 команд). Каждый вызывающий получает свой
+    результат или свою ошибку в формате обычного ответа call_api.
+    """
+
+    def __init__(
+        self,
+        window: float = settings.BITRIX_BATCH_WINDOW_MS / 1000,
+        max_commands: int = BATCH_MAX_COMMANDS,
+    ) -> None:
+        self.window = window
+        self.max_commands = max_commands
+        self._pending: list[PendingCall] = []
+        self._flush_task: asyncio.Task[None] | None = None
+
+    def is_batchable(self, method: str) -> bool:
+        return method != BATCH_METHOD and method.endswith(BATCHABLE_SUFFIXES)
+
+    async def submit(
+        self,
+        client: "BitrixAPIClient",
+        method: str,
+        params: dict[str, Any] | None = None,
+    ) -> dict[str, Any]:
+        """Ставит вызов в очередь и ожидает его результат"""
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[dict[str, Any]] = loop.create_future()
+        self._pending.append(PendingCall(client, method, params or {}, future))
+
+        if len(self._pending) >= self.max_commands:
+            chunk = self._pending[: self.max_commands]
+            del self._pending[: self.max_commands]
+            loop.create_task(self._send(chunk))
+        elif self._flush_task is None:
+            self._flush_task = loop.create_task(self._flush_after_window())
+
+        return await future
+
+    async def _flush_after_window(self) -> None:
+        try:
+            await asyncio.sleep(self.window)
+        finally:
+            self._flush_task = None
+        pending, self._pending = self._pending, []
+        chunks = [
+            pending[i : i + self.max_commands]
+            for i in range(0, len(pending), self.max_commands)
+        ]
+        await asyncio.gather(*(self._send(chunk) for chunk in chunks))
+
+    async def _send(self, chunk: list[PendingCall]) -> None:
+        chunk = [call for call in chunk if not call.future.done()]
+        if not chunk:
+            return
+        client = chunk[0].client
+        try:
+            if len(chunk) == 1:
+                # Одиночный вызов отправляем без обёртки batch
+                call = chunk[0]
+                response = await client.call_api_direct(
+                    call.method, call.params
+                )
+                self._set_result(call, response)
+                return
+
+            commands = {
+                f"cmd_{index}": build_batch_command(call.method, call.params)
+                for index, call in enumerate(chunk)
+            }
+            logger.debug(f"Sending coalesced batch of {len(commands)} calls")
+            response = await client.call_api_direct(
+                BATCH_METHOD, {"halt": 0, "cmd": commands}
+            )
+            limited = self._dispatch_results(chunk, response)
+            if limited:
+                # Отдельный вызов повторяется клиентом с учётом лимита
+                await asyncio.gather(*(self._send([call]) for call in limited))
+        except BaseException as e:
+            for call in chunk:
+                if not call.future.done():
+                    call.future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+
+    def _dispatch_results(
+        self, chunk: list[PendingCall], response: dict[str, Any]
+    ) -> list[PendingCall]:
+        """
+        Раздаёт результаты батча вызывающим. Возвращает вызовы, упавшие
+        по лимиту запросов: их нужно повторить
+        """
+        limited: list[PendingCall] = []
+        batch_result = response.get("result") or {}
+        results = batch_result.get("result") or {}
+        errors = batch_result.get("result_error") or {}
+        totals = batch_result.get("result_total") or {}
+        nexts = batch_result.get("result_next") or {}
+        times = batch_result.get("result_time") or {}
+
+        for index, call in enumerate(chunk):
+            key = f"cmd_{index}"
+            if isinstance(errors, dict) and key in errors:
+                error = errors[key]
+                if not isinstance(error, dict):
+                    error = {"error": str(error)}
+                if error.get("error") in RATE_LIMIT_ERRORS:
+                    limited.append(call)
+                    continue
+                self._set_result(
+                    call,
+                    {
+                        "error": error.get("error", "unknown_error"),
+                        "error_description": error.get(
+                            "error_description", "Unknown Bitrix API error"
+                        ),
+                    },
+                )
+                continue
+
+            call_response: dict[str, Any] = {
+                "result": (
+                    results.get(key) if isinstance(results, dict) else None
+                )
+            }
+            if isinstance(totals, dict) and key in totals:
+                call_response["total"] = totals[key]
+            if isinstance(nexts, dict) and key in nexts:
+                call_response["next"] = nexts[key]
+            if isinstance(times, dict) and key in times:
+                call_response["time"] = times[key]
+            self._set_result(call, call_response)
+        return limited
+
+    def _set_result(self, call: PendingCall, response: dict[str, Any]) -> None:
+        if not call.future.done():
+            call.future.set_result(response)
+
+
+_batch_dispatcher_instance: BitrixBatchDispatcher | None = None
+
+
+def get_bitrix_batch_dispatcher() -> BitrixBatchDispatcher | None:
+    """Диспетчер батчей процесса (None, если объединение выключено)"""
+    global _batch_dispatcher_instance
+    if not settings.BITRIX_BATCH_COALESCING:
+        return None
+    if _batch_dispatcher_instance is None:
+        _batch_dispatcher_instance = BitrixBatchDispatcher()
+    return _batch_dispatcher_instance
@@ -1,13 +1,19 @@
+import asyncio
 from typing import Any
 from urllib.parse import urljoin
 
+import httpx
 from fastapi import status
 
 from core.logger import logger
+from core.settings import settings
 
 from ..exceptions import BitrixApiError, BitrixAuthError
 from .base_bitrix_client import DEFAULT_TIMEOUT, BaseBitrixClient
+from .batch_dispatcher import BitrixBatchDispatcher
 from .bitrix_oauth_client import BitrixOAuthClient
+from .rate_limiter import RATE_LIMIT_ERRORS, BitrixRateLimiter
+from .single_flight import BitrixSingleFlight
 
 MAX_RETRIES = 2
 REST_API_BASE = "/rest/"
@@ -21,13 +27,22 @@ class BitrixAPIClient(BaseBitrixClient):
         api_base_url: str = "",
         max_retries: int = MAX_RETRIES,
         timeout: int = DEFAULT_TIMEOUT,
+        http_client: httpx.AsyncClient | None = None,
+        rate_limiter: BitrixRateLimiter | None = None,
+        rate_limit_retries: int = settings.BITRIX_RATE_LIMIT_RETRIES,
+        batch_dispatcher: BitrixBatchDispatcher | None = None,
+        single_flight: BitrixSingleFlight | None = None,
     ):
-        super().__init__(timeout)
+        super().__init__(timeout, http_client)
         self.oauth_client = oauth_client
         self.api_base_url = (
             api_base_url or f"{oauth_client.portal_domain}{REST_API_BASE}"
         )
         self.max_retries = max_retries
+        self.rate_limiter = rate_limiter
+        self.rate_limit_retries = rate_limit_retries
+        self.batch_dispatcher = batch_dispatcher
+        self.single_flight = single_flight
 
     async def call_api(
         self, method: str, params: dict[str, Any] | None = None
@@ -35,10 +50,46 @@ class BitrixAPIClient(BaseBitrixClient):
         """
         Отправка API запроса к Bitrix24
 
+        При включённом объединении запросов вызов может быть отправлен
+        в составе общего batch вместе с другими независимыми вызовами.
+        Одинаковые одновременные запросы на чтение (*.get, *.list,
+        *.fields) выполняются один раз, ответ общий для всех вызывающих.
+
         Args:
             method: API метод (например 'crm.deal.list')
             params: Параметры запроса
         """
+        single_flight = self.single_flight
+        if single_flight is not None and single_flight.is_shareable(method):
+            return await single_flight.run(
+                method, params, lambda: self._dispatch_call(method, params)
+            )
+        return await self._dispatch_call(method, params)
+
+    async def _dispatch_call(
+        self, method: str, params: dict[str, Any] | None = None
+    ) -> dict[str, Any]:
+        dispatcher = self.batch_dispatcher
+        if dispatcher is None or not dispatcher.is_batchable(method):
+            return await self.call_api_direct(method, params)
+
+        response = await dispatcher.submit(self, method, params)
+        if "error" in response:
+            if response["error"] in TOKEN_ERRORS:
+                return await self.call_api_direct(method, params)
+            self._handle_api_error(response, self.max_retries + 1)
+        if response.get("result") is not None:
+            return response
+        logger.error(f"Response has no result. {method}: {params}")
+        raise BitrixApiError(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            error_description="Response has no result.",
+        )
+
+    async def call_api_direct(
+        self, method: str, params: dict[str, Any] | None = None
+    ) -> dict[str, Any]:
+        """Отправка API запроса к Bitrix24 отдельным HTTP-запросом"""
         attempt = 0
         while attempt <= self.max_retries:
             attempt += 1
@@ -48,9 +99,9 @@ class BitrixAPIClient(BaseBitrixClient):
                 payload = {"auth": access_token}
                 if params:
                     payload.update(params)
-                response = await self._post(url, payload)
+                response = await self._post_rate_limited(method, url, payload)
                 if "error" in response:
-                    self._handle_api_error(response, attempt)
+                    self._handle_api_error(response, attempt, access_token)
                 if response.get("result") is not None:
                     return response
                 logger.error(f"Response has no result. {method}: {params}")
@@ -66,8 +117,44 @@ class BitrixAPIClient(BaseBitrixClient):
         logger.error(f"Token refresh failed after retries. {method}: {params}")
         raise BitrixAuthError("Token refresh failed after retries")
 
+    async def _post_rate_limited(
+        self, method: str, url: str, payload: dict[str, Any]
+    ) -> dict[str, Any]:
+        """
+        Отправка запроса через ограничитель скорости с повтором при ошибках
+        лимитов Bitrix24 (QUERY_LIMIT_EXCEEDED, OPERATION_TIME_LIMIT)
+        """
+        limit_attempt = 0
+        while True:
+            if self.rate_limiter:
+                await self.rate_limiter.acquire(method)
+            response = await self._post(url, payload)
+            error_code = response.get("error")
+            if error_code not in RATE_LIMIT_ERRORS:
+                if self.rate_limiter:
+                    await self.rate_limiter.observe(method, response)
+                return response
+            if limit_attempt >= self.rate_limit_retries:
+                return response
+            if self.rate_limiter:
+                delay = await self.rate_limiter.on_limit_exceeded(
+                    method, response, limit_attempt
+                )
+            else:
+                delay = float(2**limit_attempt)
+            limit_attempt += 1
+            logger.warning(
+                f"Bitrix limit [{error_code}] for {method}, retrying in "
+                f"{delay:.1f}s (attempt {limit_attempt}/"
+                f"{self.rate_limit_retries})"
+            )
+            await asyncio.sleep(delay)
+
     def _handle_api_error(
-        self, response: dict[str, Any], attempt: int
+        self,
+        response: dict[str, Any],
+        attempt: int,
+        access_token: str | None = None,
     ) -> None:
         """Обработка ошибок в ответе API"""
         error_code = response.get("error", "unknown_error")
@@ -79,7 +166,7 @@ class BitrixAPIClient(BaseBitrixClient):
                 "Token error detected, retrying "
                 f"(attempt {attempt}/{self.max_retries})"
             )
-            self._invalidate_current_token()
+            self._invalidate_current_token(access_token)
             raise BitrixAuthError("Token invalid or expired")
         logger.error(f"Bitrix API error [{error_code}]: {error_desc}")
         raise BitrixApiError(
@@ -90,12 +177,15 @@ class BitrixAPIClient(BaseBitrixClient):
             error_description=error_desc,
         )
 
-    def _invalidate_current_token(self) -> None:
+    def _invalidate_current_token(
+        self, access_token: str | None = None
+    ) -> None:
         """Инвалидация текущего access token"""
         try:
+            if not self.oauth_client.invalidate_access_token(access_token):
+                # Токен уже обновлён другим вызовом
+                return
             # В фоновом режиме удаляем токен, не блокируя основной поток
-            import asyncio
-
             asyncio.create_task(
                 self.oauth_client.token_storage.delete_token("access_token")
             )
@@ -1,17 +1,31 @@
 from typing import Dict
 from urllib.parse import urlencode
 
+import httpx
+from redis.exceptions import LockError
+
 from core.logger import logger
+from core.settings import settings
 
+from ..circuit_breaker import BITRIX_OAUTH_UPSTREAM
 from ..exceptions import BitrixAuthError
+from ..token_services.token_cache import (
+    AccessTokenCache,
+    get_access_token_cache,
+)
 from ..token_services.token_storage import TokenStorage
 from .base_bitrix_client import DEFAULT_TIMEOUT, BaseBitrixClient
 
 OAUTH_ENDPOINT = "/oauth/authorize/"
 TOKEN_ENDPOINT = "/oauth/token/"
+ACCESS_TOKEN_CACHE_KEY = (
+    f"access_token:{settings.SERVICE_USER}:{settings.PROVIDER_B24}"
+)
 
 
 class BitrixOAuthClient(BaseBitrixClient):
+    upstream = BITRIX_OAUTH_UPSTREAM
+
     def __init__(
         self,
         portal_domain: str,
@@ -20,22 +34,59 @@ class BitrixOAuthClient(BaseBitrixClient):
         redirect_uri: str,
         token_storage: TokenStorage,
         timeout: int = DEFAULT_TIMEOUT,
+        http_client: httpx.AsyncClient | None = None,
+        token_cache: AccessTokenCache | None = None,
     ):
-        super().__init__(timeout)
+        super().__init__(timeout, http_client)
         self.portal_domain = portal_domain
         self.client_id = client_id
         self.client_secret = client_secret
         self.redirect_uri = redirect_uri
         self.token_url = f"{portal_domain}{TOKEN_ENDPOINT}"
         self.token_storage = token_storage
+        self.token_cache = token_cache or get_access_token_cache()
 
     async def get_valid_token(self) -> str:
-        if access_token := await self.token_storage.get_token("access_token"):
+        if access_token := self.token_cache.get(ACCESS_TOKEN_CACHE_KEY):
             return access_token
-        if refresh_token := await self.token_storage.get_token(
-            "refresh_token"
+        # Одно обращение к хранилищу/обновление на процесс,
+        # остальные корутины ждут и берут токен из кэша
+        async with self.token_cache.lock(ACCESS_TOKEN_CACHE_KEY):
+            if access_token := self.token_cache.get(ACCESS_TOKEN_CACHE_KEY):
+                return access_token
+            if access_token := await self._load_access_token():
+                return access_token
+            return await self._refresh_access_token_once()
+
+    async def _load_access_token(self) -> str | None:
+        """Загружает access token из хранилища в кэш процесса"""
+        access_token, ttl = await self.token_storage.get_token_with_ttl(
+            "access_token"
+        )
+        if not access_token or self.token_cache.is_revoked(
+            ACCESS_TOKEN_CACHE_KEY, access_token
         ):
-            return await self._refresh_access_token(refresh_token)
+            # Отклонённый порталом токен ещё может лежать в хранилище
+            return None
+        self.token_cache.set(ACCESS_TOKEN_CACHE_KEY, access_token, ttl)
+        return access_token
+
+    async def _refresh_access_token_once(self) -> str:
+        """Обновление токена одним воркером кластера под блокировкой Redis"""
+        try:
+            async with self.token_storage.refresh_lock():
+                # Токен мог обновить другой воркер, пока ждали блокировку
+                if access_token := await self._load_access_token():
+                    return access_token
+                if refresh_token := await self.token_storage.get_token(
+                    "refresh_token"
+                ):
+                    return await self._refresh_access_token(refresh_token)
+        except LockError as e:
+            logger.warning(f"Token refresh lock failed: {e}")
+            if access_token := await self._load_access_token():
+                return access_token
+            raise BitrixAuthError("Token refresh is in progress, retry later")
         logger.warning(
             "No valid tokens available, re-authentication required."
         )
@@ -44,6 +95,15 @@ class BitrixOAuthClient(BaseBitrixClient):
             detail=f"Re-authorize at: {self.get_auth_url()}",
         )
 
+    def invalidate_access_token(self, access_token: str | None) -> bool:
+        """
+        Инвалидация access token в кэше процесса. Возвращает False, если
+        токен уже обновлён другим вызовом и удалять из хранилища нечего.
+        """
+        return self.token_cache.invalidate(
+            ACCESS_TOKEN_CACHE_KEY, access_token
+        )
+
     async def _refresh_access_token(self, refresh_token: str) -> str:
         """Обновление токена доступа"""
         params = {
@@ -112,6 +172,11 @@ class BitrixOAuthClient(BaseBitrixClient):
                 token_data["refresh_token"],
                 "refresh_token",
             )
+            self.token_cache.set(
+                ACCESS_TOKEN_CACHE_KEY,
+                token_data["access_token"],
+                int(token_data["expires_in"]),
+            )
             logger.debug("Tokens saved to storage")
         except Exception as e:
             logger.error(f"Failed to save tokens: {e}")
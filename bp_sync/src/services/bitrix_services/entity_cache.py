@@ -0,0 +1,172 @@
+import json
+import time
+from collections import OrderedDict
+from copy import deepcopy
+from typing import Any
+
+from redis.exceptions import RedisError
+
+from core.logger import logger
+from core.settings import settings
+from db.redis import get_redis
+
+KEY_PREFIX = "bitrix_entity"
+
+
+class BitrixEntityCache:
+    """
+    Кэш ответов `get` для сущностей Битрикс24.
+
+    Первый уровень - LRU в памяти процесса, второй (опционально) - Redis,
+    общий для воркеров. Время жизни задаётся по типу сущности, типы без
+    TTL не кэшируются. Хранятся исходные данные ответа, а не схемы, чтобы
+    вызывающие не изменяли общий объект.
+    """
+
+    def __init__(
+        self,
+        max_size: int = settings.BITRIX_ENTITY_CACHE_SIZE,
+        ttls: dict[str, int] | None = None,
+        use_redis: bool = settings.BITRIX_ENTITY_CACHE_REDIS,
+    ) -> None:
+        self.max_size = max_size
+        self.ttls = (
+            ttls if ttls is not None else settings.BITRIX_ENTITY_CACHE_TTL
+        )
+        self.use_redis = use_redis
+        self._entries: OrderedDict[str, tuple[float, dict[str, Any]]] = (
+            OrderedDict()
+        )
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def is_cacheable(self, entity_name: str) -> bool:
+        return self.max_size > 0 and self.ttls.get(entity_name, 0) > 0
+
+    def make_key(self, entity_name: str, entity_id: int | str) -> str:
+        return f"{KEY_PREFIX}:{entity_name}:{entity_id}"
+
+    async def get(
+        self,
+        entity_name: str,
+        entity_id: int | str,
+    ) -> dict[str, Any] | None:
+        """Возвращает копию закэшированных данных сущности"""
+        if not self.is_cacheable(entity_name):
+            return None
+        key = self.make_key(entity_name, entity_id)
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, data = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return deepcopy(data)
+            self._entries.pop(key, None)
+
+        if shared := await self._redis_get(key):
+            self.redis_hits += 1
+            self._store_local(key, shared, self.ttls[entity_name])
+            return deepcopy(shared)
+
+        self.misses += 1
+        return None
+
+    async def set(
+        self,
+        entity_name: str,
+        entity_id: int | str,
+        data: dict[str, Any],
+    ) -> None:
+        """Сохраняет данные сущности на время, заданное для её типа"""
+        if not self.is_cacheable(entity_name):
+            return
+        ttl = self.ttls[entity_name]
+        key = self.make_key(entity_name, entity_id)
+        self._store_local(key, deepcopy(data), ttl)
+        redis = await self._get_redis()
+        if redis is None:
+            return
+        try:
+            await redis.set(key, json.dumps(data, default=str), ex=ttl)
+        except RedisError as e:
+            logger.warning(f"Failed to store {key} in Redis: {e}")
+
+    async def invalidate(
+        self,
+        entity_name: str,
+        entity_id: int | str,
+    ) -> None:
+        """Удаляет сущность из всех уровней кэша"""
+        if not self.is_cacheable(entity_name):
+            return
+        key = self.make_key(entity_name, entity_id)
+        self._entries.pop(key, None)
+        redis = await self._get_redis()
+        if redis is None:
+            return
+        try:
+            await redis.delete(key)
+        except RedisError as e:
+            logger.warning(f"Failed to evict {key} from Redis: {e}")
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict[str, Any]:
+        """Статистика попаданий в кэш"""
+        requests = self.hits + self.redis_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (
+                round((self.hits + self.redis_hits) / requests, 4)
+                if requests
+                else 0.0
+            ),
+        }
+
+    def _store_local(self, key: str, data: dict[str, Any], ttl: int) -> None:
+        self._entries[key] = (time.monotonic() + ttl, data)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def _get_redis(self) -> Any:
+        if not self.use_redis:
+            return None
+        return await get_redis()
+
+    async def _redis_get(self, key: str) -> dict[str, Any] | None:
+        redis = await self._get_redis()
+        if redis is None:
+            return None
+        try:
+            raw = await redis.get(key)
+        except RedisError as e:
+            logger.warning(f"Failed to read {key} from Redis: {e}")
+            return None
+        if not raw:
+            return None
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+
+
+_entity_cache_instance: BitrixEntityCache | None = None
+
+
+def get_bitrix_entity_cache() -> BitrixEntityCache:
+    global _entity_cache_instance
+    if _entity_cache_instance is None:
+        _entity_cache_instance = BitrixEntityCache()
+    return _entity_cache_instance
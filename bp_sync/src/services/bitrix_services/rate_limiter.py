@@ -0,0 +1,235 @@
+import asyncio
+import random
+import time
+from typing import Any
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from core.logger import logger
+from core.settings import settings
+from db.redis import get_redis
+
+QUERY_LIMIT_EXCEEDED = "QUERY_LIMIT_EXCEEDED"
+OPERATION_TIME_LIMIT = "OPERATION_TIME_LIMIT"
+RATE_LIMIT_ERRORS = {QUERY_LIMIT_EXCEEDED, OPERATION_TIME_LIMIT}
+KEY_PREFIX = "bitrix_rate"
+PENALTY_FACTOR = 0.5
+PENALTY_TTL = 10  # секунд пониженной скорости после QUERY_LIMIT_EXCEEDED
+BASE_DELAY = 1.0
+MAX_DELAY = 30.0
+
+# Токен-бакет с резервированием: запрос всегда забирает токен (баланс может
+# уйти в минус), а ответом служит время ожидания до его "оплаты".
+# Если метод заблокирован по time.operating - токен не резервируется,
+# возвращается время до разблокировки.
+# Результат: {зарезервирован (0/1), ожидание в секундах}
+ACQUIRE_SCRIPT = """
+local bucket_key = KEYS[1]
+local penalty_key = KEYS[2]
+local method_key = KEYS[3]
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local penalty_factor = tonumber(ARGV[3])
+
+local method_ttl = redis.call('PTTL', method_key)
+if method_ttl > 0 then
+    return {'0', tostring(method_ttl / 1000)}
+end
+
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+if redis.call('EXISTS', penalty_key) == 1 then
+    rate = rate * penalty_factor
+end
+
+local data = redis.call('HMGET', bucket_key, 'tokens', 'ts')
+local tokens = tonumber(data[1])
+local ts = tonumber(data[2])
+if tokens == nil or ts == nil then
+    tokens = capacity
+    ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate) - 1
+redis.call('HSET', bucket_key, 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', bucket_key, math.ceil(capacity / rate) + 60)
+
+if tokens >= 0 then
+    return {'1', '0'}
+end
+return {'1', tostring(-tokens / rate)}
+"""
+
+
+class BitrixRateLimiter:
+    """
+    Клиентский ограничитель запросов к REST API Битрикс24.
+
+    Повторяет серверный leaky bucket портала (скорость пополнения и размер
+    "ведра"), общий для всех корутин и воркеров через Redis. При
+    QUERY_LIMIT_EXCEEDED скорость временно снижается, при приближении
+    time.operating метода к лимиту метод приостанавливается до
+    operating_reset_at. Без Redis работает как локальный бакет процесса.
+    """
+
+    def __init__(
+        self,
+        redis: Redis | None = None,
+        portal: str = settings.BITRIX_PORTAL,
+        rate: float = settings.BITRIX_RATE_LIMIT,
+        capacity: int = settings.BITRIX_RATE_BURST,
+        operating_limit: float = settings.BITRIX_OPERATING_LIMIT,
+    ) -> None:
+        self.redis = redis
+        self.rate = rate
+        self.capacity = capacity
+        self.operating_limit = operating_limit
+        portal_key = portal.replace("https://", "").replace("http://", "")
+        self._prefix = f"{KEY_PREFIX}:{portal_key}"
+        self._script: Any = None
+        # Локальное состояние на случай недоступности Redis
+        self._lock = asyncio.Lock()
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._penalty_until = 0.0
+        self._method_blocked_until: dict[str, float] = {}
+
+    @property
+    def bucket_key(self) -> str:
+        return f"{self._prefix}:bucket"
+
+    @property
+    def penalty_key(self) -> str:
+        return f"{self._prefix}:penalty"
+
+    def method_key(self, method: str) -> str:
+        return f"{self._prefix}:method:{method}"
+
+    async def acquire(self, method: str) -> None:
+        """Ожидает свободный слот для запроса к методу API"""
+        while True:
+            reserved, wait = await self._reserve(method)
+            if wait > 0:
+                logger.debug(
+                    f"Bitrix rate limit: waiting {wait:.2f}s ({method})"
+                )
+                await asyncio.sleep(wait)
+            if reserved:
+                return
+
+    async def _reserve(self, method: str) -> tuple[bool, float]:
+        if self.redis is not None:
+            try:
+                if self._script is None:
+                    self._script = self.redis.register_script(ACQUIRE_SCRIPT)
+                reserved, wait = await self._script(
+                    keys=[
+                        self.bucket_key,
+                        self.penalty_key,
+                        self.method_key(method),
+                    ],
+                    args=[self.rate, self.capacity, PENALTY_FACTOR],
+                )
+                return reserved == "1", float(wait)
+            except RedisError as e:
+                logger.warning(f"Rate limiter falls back to local bucket: {e}")
+        return await self._reserve_local(method)
+
+    async def _reserve_local(self, method: str) -> tuple[bool, float]:
+        async with self._lock:
+            now = time.monotonic()
+            blocked_until = self._method_blocked_until.get(method, 0.0)
+            if blocked_until > now:
+                return False, blocked_until - now
+            rate = self.rate
+            if self._penalty_until > now:
+                rate *= PENALTY_FACTOR
+            elapsed = max(0.0, now - self._updated_at)
+            self._tokens = min(
+                float(self.capacity), self._tokens + elapsed * rate
+            )
+            self._tokens -= 1
+            self._updated_at = now
+            return True, max(0.0, -self._tokens / rate)
+
+    async def observe(self, method: str, response: dict[str, Any]) -> None:
+        """
+        Учитывает поле time.operating ответа: если метод близок к лимиту
+        времени выполнения, приостанавливает его до operating_reset_at
+        """
+        timing = response.get("time")
+        if not isinstance(timing, dict):
+            return
+        try:
+            operating = float(timing.get("operating") or 0)
+            reset_at = float(timing.get("operating_reset_at") or 0)
+        except (TypeError, ValueError):
+            return
+        if operating < self.operating_limit * 0.9 or not reset_at:
+            return
+        pause = reset_at - time.time()
+        if pause > 0:
+            logger.warning(
+                f"Bitrix method {method} used {operating:.1f}s of "
+                f"{self.operating_limit:.0f}s, pausing for {pause:.1f}s"
+            )
+            await self._block_method(method, pause)
+
+    async def on_limit_exceeded(
+        self, method: str, response: dict[str, Any], attempt: int
+    ) -> float:
+        """
+        Реакция на ошибку лимита: снижает скорость, опустошает бакет и
+        возвращает задержку перед повтором
+        """
+        error_code = response.get("error")
+        delay = self._calculate_retry_delay(attempt)
+        if error_code == OPERATION_TIME_LIMIT:
+            timing = response.get("time") or {}
+            reset_at = float(timing.get("operating_reset_at") or 0)
+            pause = reset_at - time.time() if reset_at else MAX_DELAY
+            delay = max(delay, pause)
+            await self._block_method(method, delay)
+            return delay
+
+        now = time.monotonic()
+        self._penalty_until = now + PENALTY_TTL
+        self._tokens = min(self._tokens, 0.0)
+        self._updated_at = now
+        if self.redis is not None:
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.set(self.penalty_key, 1, ex=PENALTY_TTL)
+                    pipe.hset(self.bucket_key, "tokens", 0)
+                    await pipe.execute()
+            except RedisError as e:
+                logger.warning(f"Failed to store rate limit penalty: {e}")
+        return delay
+
+    async def _block_method(self, method: str, seconds: float) -> None:
+        self._method_blocked_until[method] = time.monotonic() + seconds
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(
+                self.method_key(method), 1, px=max(1, int(seconds * 1000))
+            )
+        except RedisError as e:
+            logger.warning(f"Failed to store method block for {method}: {e}")
+
+    def _calculate_retry_delay(self, attempt: int) -> float:
+        """Exponential backoff with jitter"""
+        delay = min(BASE_DELAY * (2**attempt), MAX_DELAY)
+        return float(random.uniform(0.5 * delay, 1.5 * delay))
+
+
+_rate_limiter_instance: BitrixRateLimiter | None = None
+
+
+async def get_bitrix_rate_limiter() -> BitrixRateLimiter:
+    global _rate_limiter_instance
+    if _rate_limiter_instance is None:
+        _rate_limiter_instance = BitrixRateLimiter(await get_redis())
+    elif _rate_limiter_instance.redis is None:
+        _rate_limiter_instance.redis = await get_redis()
+    return _rate_limiter_instance
@@ -0,0 +1,91 @@
+import asyncio
+import copy
+import json
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+from core.logger import logger
+from core.settings import settings
+
+READ_METHOD_SUFFIXES = (".get", ".list", ".fields")
+
+
+@dataclass
+class Flight:
+    """Выполняющийся запрос и число ожидающих его вызывающих"""
+
+    task: "asyncio.Task[dict[str, Any]]"
+    waiters: int = 0
+
+
+class BitrixSingleFlight:
+    """
+    Объединение одинаковых одновременных запросов на чтение.
+
+    Пока запрос с тем же методом и параметрами выполняется, повторные
+    вызовы не отправляют новый HTTP-запрос, а ждут результат первого.
+    Если запрос разделили несколько вызывающих, каждый получает свою
+    копию ответа и может её изменять.
+    """
+
+    def __init__(self) -> None:
+        self._inflight: dict[str, Flight] = {}
+        self.shared_calls = 0
+
+    def is_shareable(self, method: str) -> bool:
+        return method.endswith(READ_METHOD_SUFFIXES)
+
+    def make_key(self, method: str, params: dict[str, Any] | None) -> str:
+        """Ключ запроса: метод и параметры в каноническом виде"""
+        return f"{method}:" + json.dumps(
+            params or {}, sort_keys=True, separators=(",", ":"), default=str
+        )
+
+    async def run(
+        self,
+        method: str,
+        params: dict[str, Any] | None,
+        call: Callable[[], Awaitable[dict[str, Any]]],
+    ) -> dict[str, Any]:
+        key = self.make_key(method, params)
+        flight = self._inflight.get(key)
+        if flight is None:
+            # Запрос выполняется отдельной задачей, чтобы отмена первого
+            # вызывающего не отменяла его для остальных
+            flight = Flight(asyncio.ensure_future(self._call(key, call)))
+            flight.task.add_done_callback(self._consume_exception)
+            self._inflight[key] = flight
+        else:
+            self.shared_calls += 1
+            logger.debug(f"Sharing in-flight Bitrix call {method}")
+        flight.waiters += 1
+        response = await asyncio.shield(flight.task)
+        return copy.deepcopy(response) if flight.waiters > 1 else response
+
+    async def _call(
+        self, key: str, call: Callable[[], Awaitable[dict[str, Any]]]
+    ) -> dict[str, Any]:
+        try:
+            return await call()
+        finally:
+            # Запрос убирается до публикации результата: после этого к нему
+            # никто не присоединится и число ожидающих окончательно
+            self._inflight.pop(key, None)
+
+    def _consume_exception(self, task: asyncio.Task[dict[str, Any]]) -> None:
+        if not task.cancelled():
+            # Ошибку получат ожидающие, здесь только помечаем её обработанной
+            task.exception()
+
+
+_single_flight_instance: BitrixSingleFlight | None = None
+
+
+def get_bitrix_single_flight() -> BitrixSingleFlight | None:
+    """Объединение запросов процесса (None, если выключено)"""
+    global _single_flight_instance
+    if not settings.BITRIX_SINGLE_FLIGHT:
+        return None
+    if _single_flight_instance is None:
+        _single_flight_instance = BitrixSingleFlight()
+    return _single_flight_instance
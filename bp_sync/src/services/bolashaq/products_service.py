@@ -13,11 +13,15 @@ from core.settings import settings
 
 from ..bitrix_services.base_bitrix_client import BaseBitrixClient
 from ..bitrix_services.webhook_service import WebhookService
+from ..http_client import BOLASHAQ_POOL
 
 
 class ProductHandler(BaseBitrixClient):
     """Обработчик товаров для вебхуков Битрикс24"""
 
+    http_pool_name = BOLASHAQ_POOL
+    upstream = BOLASHAQ_POOL
+
     def __init__(self) -> None:
         super().__init__()
         self.portal: str = settings.BOLASHAQ_BITRIX_PORTAL
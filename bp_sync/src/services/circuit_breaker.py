@@ -0,0 +1,216 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, AsyncIterator
+
+from core.logger import logger
+from core.settings import settings
+
+from .http_client import BITRIX_POOL, BOLASHAQ_POOL, PHP_ENDPOINT_POOL
+
+BITRIX_OAUTH_UPSTREAM = "bitrix_oauth"
+UPSTREAMS = (
+    BITRIX_POOL,
+    BITRIX_OAUTH_UPSTREAM,
+    PHP_ENDPOINT_POOL,
+    BOLASHAQ_POOL,
+)
+DEFAULT_BULKHEAD_LIMIT = 10
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class UpstreamUnavailableError(Exception):
+    """Апстрим недоступен: цепь разомкнута или исчерпан лимит параллельности"""
+
+    def __init__(self, upstream: str, reason: str, retry_after: float = 0):
+        self.upstream = upstream
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"Upstream {upstream} unavailable: {reason}")
+
+
+@dataclass
+class CallOutcome:
+    """
+    Результат вызова внутри guard. Вызывающий может пометить его ошибкой,
+    например при ответе 5xx без исключения
+    """
+
+    failed: bool = False
+
+
+class CircuitBreaker:
+    """
+    Автомат защиты и ограничитель параллельности (bulkhead) для апстрима.
+
+    После failure_threshold ошибок подряд цепь размыкается и вызовы сразу
+    отклоняются. Через recovery_timeout пропускается пробный вызов
+    (half-open): успех замыкает цепь, ошибка снова размыкает. Число
+    одновременных вызовов ограничено, ожидание слота - acquire_timeout.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = settings.CIRCUIT_FAILURE_THRESHOLD,
+        recovery_timeout: float = settings.CIRCUIT_RECOVERY_TIMEOUT,
+        max_concurrency: int = DEFAULT_BULKHEAD_LIMIT,
+        acquire_timeout: float = settings.BULKHEAD_ACQUIRE_TIMEOUT,
+        half_open_max_calls: int = 1,
+    ) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.max_concurrency = max_concurrency
+        self.acquire_timeout = acquire_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._state = CircuitState.CLOSED
+        self._opened_at = 0.0
+        self._consecutive_failures = 0
+        self._half_open_calls = 0
+        self.in_flight = 0
+        self.total_calls = 0
+        self.total_failures = 0
+        self.rejected_open = 0
+        self.rejected_bulkhead = 0
+        self.times_opened = 0
+
+    @property
+    def state(self) -> CircuitState:
+        if (
+            self._state == CircuitState.OPEN
+            and time.monotonic() - self._opened_at >= self.recovery_timeout
+        ):
+            self._state = CircuitState.HALF_OPEN
+            self._half_open_calls = 0
+            logger.info(f"Circuit {self.name} is half-open, probing")
+        return self._state
+
+    @asynccontextmanager
+    async def guard(self) -> AsyncIterator[CallOutcome]:
+        """Выполнение вызова апстрима под защитой автомата"""
+        probe = self._admit()
+        try:
+            await asyncio.wait_for(
+                self._semaphore.acquire(), self.acquire_timeout
+            )
+        except asyncio.TimeoutError:
+            if probe:
+                self._half_open_calls -= 1
+            self.rejected_bulkhead += 1
+            raise UpstreamUnavailableError(
+                self.name, "too many concurrent requests"
+            )
+
+        outcome = CallOutcome()
+        self.in_flight += 1
+        self.total_calls += 1
+        try:
+            yield outcome
+        except Exception:
+            self._on_failure(probe)
+            raise
+        except BaseException:
+            # Отмена вызова ничего не говорит о состоянии апстрима
+            if probe:
+                self._half_open_calls -= 1
+            raise
+        else:
+            if outcome.failed:
+                self._on_failure(probe)
+            else:
+                self._on_success(probe)
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def _admit(self) -> bool:
+        """Проверяет, можно ли выполнить вызов. True - пробный вызов"""
+        state = self.state
+        if state == CircuitState.CLOSED:
+            return False
+        if (
+            state == CircuitState.HALF_OPEN
+            and self._half_open_calls < self.half_open_max_calls
+        ):
+            self._half_open_calls += 1
+            return True
+        self.rejected_open += 1
+        retry_after = max(
+            0.0, self.recovery_timeout - (time.monotonic() - self._opened_at)
+        )
+        raise UpstreamUnavailableError(self.name, "circuit open", retry_after)
+
+    def _on_success(self, probe: bool) -> None:
+        self._consecutive_failures = 0
+        if probe:
+            self._half_open_calls -= 1
+        if self._state == CircuitState.HALF_OPEN:
+            self._state = CircuitState.CLOSED
+            logger.info(f"Circuit {self.name} closed")
+
+    def _on_failure(self, probe: bool) -> None:
+        self.total_failures += 1
+        self._consecutive_failures += 1
+        if probe:
+            self._half_open_calls -= 1
+        if self._state == CircuitState.HALF_OPEN or (
+            self._state == CircuitState.CLOSED
+            and self._consecutive_failures >= self.failure_threshold
+        ):
+            self._open()
+
+    def _open(self) -> None:
+        self._state = CircuitState.OPEN
+        self._opened_at = time.monotonic()
+        self.times_opened += 1
+        logger.warning(
+            f"Circuit {self.name} opened after "
+            f"{self._consecutive_failures} failures, retry in "
+            f"{self.recovery_timeout:.0f}s"
+        )
+
+    def snapshot(self) -> dict[str, Any]:
+        """Метрики автомата"""
+        return {
+            "state": self.state.value,
+            "consecutive_failures": self._consecutive_failures,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "total_calls": self.total_calls,
+            "total_failures": self.total_failures,
+            "rejected_open": self.rejected_open,
+            "rejected_bulkhead": self.rejected_bulkhead,
+            "times_opened": self.times_opened,
+        }
+
+
+_circuit_breakers: dict[str, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(upstream: str) -> CircuitBreaker:
+    breaker = _circuit_breakers.get(upstream)
+    if breaker is None:
+        breaker = CircuitBreaker(
+            upstream,
+            max_concurrency=settings.BULKHEAD_LIMITS.get(
+                upstream, DEFAULT_BULKHEAD_LIMIT
+            ),
+        )
+        _circuit_breakers[upstream] = breaker
+    return breaker
+
+
+def get_circuit_breakers_metrics() -> dict[str, dict[str, Any]]:
+    return {
+        upstream: get_circuit_breaker(upstream).snapshot()
+        for upstream in sorted({*UPSTREAMS, *_circuit_breakers})
+    }
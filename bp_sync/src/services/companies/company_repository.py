@@ -1,5 +1,5 @@
 from datetime import date, datetime
-from typing import TYPE_CHECKING, Any, Callable, Coroutine, Type
+from typing import TYPE_CHECKING, Any, Callable, Coroutine, Sequence, Type
 from uuid import UUID
 
 from sqlalchemy import select
@@ -31,6 +31,7 @@ from ..base_repositories.base_communication_repo import (
     EntityWithCommunicationsRepository,
 )
 from ..deals.deal_contract_handler import DealContractHandler
+from ..entities.reference_cache import get_reference_cache
 from ..exceptions import CyclicCallException
 from ..users.user_services import UserClient
 
@@ -90,6 +91,23 @@ class CompanyRepository(
             post_commit_hook=self._handel_contracts_post_commit_hook,
         )
 
+    async def upsert_entities(
+        self, items: Sequence[CompanyCreate]
+    ) -> list[CompanyDB]:
+        """Создаёт или обновляет набор компаний с обработкой контрактов"""
+        for data in items:
+            await self._check_related_objects(data)
+            await self._create_or_update_related(data)
+        return await self.upsert_many(
+            items, post_upsert_hook=self._handle_contracts_post_upsert_hook
+        )
+
+    async def _handle_contracts_post_upsert_hook(
+        self, objs: list[CompanyDB], items: list[CompanyCreate]
+    ) -> None:
+        for obj, data in zip(objs, items):
+            await self._handel_contracts_post_commit_hook(obj, data)
+
     async def _get_related_checks(self) -> list[tuple[str, Type[Base], str]]:
         """Возвращает специфичные для Deal проверки"""
         return [
@@ -131,12 +149,9 @@ class CompanyRepository(
             external_id компании или None, если не найдена
         """
         try:
-            stmt = select(ShippingCompany.external_id).where(
-                ShippingCompany.name == name
-            )
-            result = await self.session.execute(stmt)
-            external_id = result.scalar_one_or_none()
-            return external_id  # type: ignore[no-any-return]
+            references = await get_reference_cache().get(self.session)
+            company = references.shipping_companies.find(name)
+            return company.external_id if company else None
         except SQLAlchemyError as e:
             logger.error(
                 f"Ошибка при поиске компании по названию '{name}': {e}"
@@ -156,12 +171,9 @@ class CompanyRepository(
             id компании или None, если не найдена
         """
         try:
-            stmt = select(ShippingCompany.id).where(
-                ShippingCompany.name == name
-            )
-            result = await self.session.execute(stmt)
-            id = result.scalar_one_or_none()
-            return id  # type: ignore[no-any-return]
+            references = await get_reference_cache().get(self.session)
+            company = references.shipping_companies.find(name)
+            return company.id if company else None
         except SQLAlchemyError as e:
             logger.error(
                 f"Ошибка при поиске компании по названию '{name}': {e}"
@@ -183,12 +195,9 @@ class CompanyRepository(
             external_id компании или None, если не найдена
         """
         try:
-            stmt = select(ShippingCompany.external_id).where(
-                ShippingCompany.ext_alt_id == ext_alt_id
-            )
-            result = await self.session.execute(stmt)
-            external_id = result.scalar_one_or_none()
-            return external_id  # type: ignore[no-any-return]
+            references = await get_reference_cache().get(self.session)
+            company = references.shipping_company_by_ext_alt_id(ext_alt_id)
+            return company.external_id if company else None
         except SQLAlchemyError as e:
             logger.error(
                 f"Ошибка при поиске компании по ext_alt_id '{ext_alt_id}': {e}"
@@ -210,12 +219,9 @@ class CompanyRepository(
             ext_alt_id компании или None, если не найдена
         """
         try:
-            stmt = select(ShippingCompany.ext_alt_id).where(
-                ShippingCompany.external_id == external_id
-            )
-            result = await self.session.execute(stmt)
-            ext_alt_id = result.scalar_one_or_none()
-            return ext_alt_id  # type: ignore[no-any-return]
+            references = await get_reference_cache().get(self.session)
+            company = references.shipping_companies.get(external_id)
+            return company.ext_alt_id if company else None
         except SQLAlchemyError as e:
             logger.error(
                 "Ошибка при поиске компании по ext_alt_id "
@@ -1,4 +1,3 @@
-from sqlalchemy import select
 from sqlalchemy.exc import SQLAlchemyError
 
 from core.logger import logger
@@ -9,6 +8,7 @@ from schemas.company_schemas import (
 )
 
 from ..base_repositories.base_repository import BaseRepository
+from ..entities.reference_cache import get_reference_cache
 
 
 class ShippingCompanyRepository(
@@ -30,12 +30,9 @@ class ShippingCompanyRepository(
             external_id компании или None, если не найдена
         """
         try:
-            stmt = select(ShippingCompanyDB.external_id).where(
-                ShippingCompanyDB.name == name
-            )
-            result = await self.session.execute(stmt)
-            external_id = result.scalar_one_or_none()
-            return external_id  # type: ignore[no-any-return]
+            references = await get_reference_cache().get(self.session)
+            company = references.shipping_companies.find(name)
+            return company.external_id if company else None
         except SQLAlchemyError as e:
             logger.error(
                 f"Ошибка при поиске компании по названию '{name}': {e}"
@@ -57,12 +54,9 @@ class ShippingCompanyRepository(
             external_id компании или None, если не найдена
         """
         try:
-            stmt = select(ShippingCompanyDB.external_id).where(
-                ShippingCompanyDB.ext_alt_id == ext_alt_id
-            )
-            result = await self.session.execute(stmt)
-            external_id = result.scalar_one_or_none()
-            return external_id  # type: ignore[no-any-return]
+            references = await get_reference_cache().get(self.session)
+            company = references.shipping_company_by_ext_alt_id(ext_alt_id)
+            return company.external_id if company else None
         except SQLAlchemyError as e:
             logger.error(
                 f"Ошибка при поиске компании по ext_alt_id '{ext_alt_id}': {e}"
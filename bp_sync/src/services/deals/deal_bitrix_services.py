@@ -1,10 +1,48 @@
-import asyncio
+from dataclasses import dataclass, field
 from datetime import date, timedelta
 from typing import Any
 
+from fastapi import status
+from pydantic import ValidationError
+
+from core.logger import logger
+from schemas.company_schemas import CompanyCreate
+from schemas.contact_schemas import ContactCreate
 from schemas.deal_schemas import DealCreate, DealUpdate
+from schemas.invoice_schemas import InvoiceCreate
+from schemas.lead_schemas import LeadCreate
+from schemas.product_schemas import EntityTypeAbbr, ListProductEntity
+from schemas.timeline_comment_schemas import TimelineCommentUpdate
 
 from ..bitrix_services.base_bitrix_services import BaseBitrixEntityClient
+from ..bitrix_services.batch_dispatcher import (
+    BATCH_MAX_COMMANDS,
+    build_batch_command,
+)
+from ..exceptions import BitrixApiError
+from ..invoices.invoice_bitrix_services import (
+    ENTITY_TYPE_ID as INVOICE_ENTITY_TYPE_ID,
+)
+
+COMMENT_SELECT = ["ID", "COMMENT", "CREATED", "AUTHOR_ID"]
+IDS_PER_COMMAND = 50  # размер страницы crm.deal.list
+
+
+@dataclass
+class DealBundle:
+    """Сделка со связанными данными, полученная одним запросом batch"""
+
+    deal: DealCreate
+    company: CompanyCreate | None = None
+    contact: ContactCreate | None = None
+    lead: LeadCreate | None = None
+    invoice: InvoiceCreate | None = None
+    products: ListProductEntity | None = None
+    comments: list[TimelineCommentUpdate] = field(default_factory=list)
+    # Исходные ответы связанных сущностей по имени для кэша get
+    raw: dict[str, dict[str, Any]] = field(default_factory=dict)
+    # Связанные данные, команды которых выполнились без ошибок
+    loaded: set[str] = field(default_factory=set)
 
 
 class DealBitrixClient(BaseBitrixEntityClient[DealCreate, DealUpdate]):
@@ -12,9 +50,6 @@ class DealBitrixClient(BaseBitrixEntityClient[DealCreate, DealUpdate]):
     create_schema = DealCreate
     update_schema = DealUpdate
 
-    DEALS_BATCH_SIZE = 50
-    DEALS_SLEEP_INTERVAL = 2
-
     async def get_deal_ids_for_period(
         self, start_date: date, end_date: date
     ) -> list[int]:
@@ -30,29 +65,170 @@ class DealBitrixClient(BaseBitrixEntityClient[DealCreate, DealUpdate]):
         }
 
         deal_ids: list[int] = []
-        select = ["ID"]
-        start = 0
+        async for deal in self.iter_list_raw(
+            select=["ID"], filter_entity=filter_entity, keyset=True
+        ):
+            if str(deal.get("ID", "")).isdigit():
+                deal_ids.append(int(deal["ID"]))
 
-        while True:
-            result = await self.list(
-                select=select, filter_entity=filter_entity, start=start
-            )
+        return deal_ids
 
-            if not result:
-                break
+    async def get_categories(self, deal_ids: list[int]) -> dict[int, int]:
+        """
+        Воронки существующих сделок: {ID: CATEGORY_ID}. Сделки, которых
+        нет в Битрикс24, в результат не попадают. Запрашивается по
+        IDS_PER_COMMAND ID в команде и до BATCH_MAX_COMMANDS команд в batch
+        """
+        categories: dict[int, int] = {}
+        chunks = [
+            deal_ids[i : i + IDS_PER_COMMAND]
+            for i in range(0, len(deal_ids), IDS_PER_COMMAND)
+        ]
+        for start in range(0, len(chunks), BATCH_MAX_COMMANDS):
+            commands = {
+                f"ids{start + index}": build_batch_command(
+                    "crm.deal.list",
+                    {
+                        "filter": {"@ID": chunk},
+                        "select": ["ID", "CATEGORY_ID"],
+                        "start": -1,
+                    },
+                )
+                for index, chunk in enumerate(
+                    chunks[start : start + BATCH_MAX_COMMANDS]
+                )
+            }
+            results = await self._call_list_batch(commands)
+            for key in commands:
+                for deal in results.get(key) or []:
+                    try:
+                        categories[int(deal["ID"])] = int(
+                            deal.get("CATEGORY_ID") or 0
+                        )
+                    except (KeyError, TypeError, ValueError):
+                        logger.warning(f"Invalid deal in list result: {deal}")
+        return categories
 
-            deals_batch = result.result
-            deal_ids.extend(
-                int(deal.external_id)
-                for deal in deals_batch
-                if deal.external_id is not None
-                and str(deal.external_id).isdigit()
-            )
+    async def get_bundle(self, deal_id: int) -> DealBundle:
+        """
+        Получает сделку, её компанию, контакт, лид, счёт, товары и
+        комментарии одним запросом batch. Связанные сущности запрашиваются
+        по ссылкам на результат сделки ($result[deal][COMPANY_ID]).
+        Отсутствующие связанные сущности возвращаются как None.
+        """
+        commands = {
+            "deal": build_batch_command("crm.deal.get", {"id": deal_id}),
+            "company": "crm.company.get?id=$result[deal][COMPANY_ID]",
+            "contact": "crm.contact.get?id=$result[deal][CONTACT_ID]",
+            "lead": "crm.lead.get?id=$result[deal][LEAD_ID]",
+            "invoice_ids": build_batch_command(
+                "crm.item.list",
+                {
+                    "entityTypeId": INVOICE_ENTITY_TYPE_ID,
+                    "filter": {"parentId2": deal_id},
+                    "select": ["id"],
+                },
+            ),
+            "invoice": (
+                "crm.item.get?"
+                f"entityTypeId={INVOICE_ENTITY_TYPE_ID}"
+                "&id=$result[invoice_ids][items][0][id]"
+            ),
+            "products": build_batch_command(
+                "crm.item.productrow.list",
+                {
+                    "filter": {
+                        "=ownerType": EntityTypeAbbr.DEAL.value,
+                        "=ownerId": deal_id,
+                    }
+                },
+            ),
+            "comments": build_batch_command(
+                "crm.timeline.comment.list",
+                {
+                    "filter": {"ENTITY_TYPE": "deal", "ENTITY_ID": deal_id},
+                    "select": COMMENT_SELECT,
+                },
+            ),
+        }
+        response = await self.bitrix_client.call_api(
+            method="batch", params={"halt": 0, "cmd": commands}
+        )
+        batch_result = response.get("result") or {}
+        results: dict[str, Any] = batch_result.get("result") or {}
+        if not isinstance(results, dict):
+            results = {}
 
-            if not result.next or len(deals_batch) < self.DEALS_BATCH_SIZE:
-                break
+        errors: dict[str, Any] = batch_result.get("result_error") or {}
+        if not isinstance(errors, dict):
+            errors = {}
 
-            start = result.next
-            await asyncio.sleep(self.DEALS_SLEEP_INTERVAL)
+        deal_data = results.get("deal")
+        if error := errors.get("deal"):
+            # Ошибка команды передаётся как есть, как при отдельном запросе
+            if not isinstance(error, dict):
+                error = {"error_description": str(error)}
+            logger.error(f"Failed to get deal bundle ID={deal_id}: {error}")
+            raise BitrixApiError(
+                status_code=error.get(
+                    "status_code", status.HTTP_400_BAD_REQUEST
+                ),
+                error=error.get("error") or "Unknown error",
+                error_description=error.get(
+                    "error_description", "Unknown Bitrix API error"
+                ),
+            )
+        if not deal_data:
+            logger.error(f"Failed to get deal bundle ID={deal_id}: no result")
+            raise BitrixApiError(
+                status_code=status.HTTP_404_NOT_FOUND,
+                error=f"Failed to get deal ID={deal_id}",
+                error_description="Not found",
+            )
 
-        return deal_ids
+        bundle = DealBundle(deal=self.create_schema(**deal_data))
+        related: dict[str, Any] = {
+            "company": results.get("company"),
+            "contact": results.get("contact"),
+            "lead": results.get("lead"),
+            "invoice": (results.get("invoice") or {}).get("item"),
+        }
+        invoice_ids = results.get("invoice_ids") or {}
+        if "invoice_ids" not in errors and not invoice_ids.get("items"):
+            # Счёта у сделки нет: зависимая команда ничего не вернёт
+            errors.pop("invoice", None)
+            bundle.loaded.add("invoice")
+        for name, schema in (
+            ("company", CompanyCreate),
+            ("contact", ContactCreate),
+            ("lead", LeadCreate),
+            ("invoice", InvoiceCreate),
+        ):
+            if name in errors:
+                # Сущность будет получена обычным запросом, если она есть
+                logger.debug(
+                    f"Failed to get {name} of deal {deal_id}: {errors[name]}"
+                )
+                continue
+            if not (data := related[name]):
+                continue
+            try:
+                setattr(bundle, name, schema(**data))
+            except ValidationError as e:
+                # Как и при отдельном запросе, связанная сущность пропускается
+                logger.error(f"Invalid {name} of deal {deal_id}: {e}")
+                continue
+            bundle.raw[name] = data
+            bundle.loaded.add(name)
+        if "products" not in errors:
+            products = results.get("products") or {}
+            bundle.products = ListProductEntity(
+                result=products.get("productRows") or []
+            )
+        if "comments" not in errors:
+            bundle.comments = [
+                TimelineCommentUpdate(**comment)
+                for comment in results.get("comments") or []
+            ]
+            bundle.loaded.add("comments")
+        return bundle
@@ -0,0 +1,131 @@
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Sequence
+
+import orjson
+from redis.exceptions import RedisError
+
+from core.logger import logger
+from db.redis import get_redis
+
+if TYPE_CHECKING:
+    from models.deal_models import Deal as DealDB
+
+    from .deal_services import DealClient
+
+CHECKPOINT_KEY = "deal_check:checkpoint"
+PAGE_SIZE = 1000
+
+
+class DealCheckingService:
+    """
+    Сверка сделок БД с Битрикс24: удаление и смена воронки.
+
+    Сделки проверяются страницами get_deals_batch: по каждой странице
+    воронки запрашиваются через crm.deal.list в batch, отсутствующие в
+    Битрикс24 сделки помечаются удалёнными, изменённые воронки
+    обновляются - всё пачками. После каждой страницы прогресс
+    сохраняется в Redis, прерванная проверка продолжается с него.
+    """
+
+    def __init__(self, deal_client: "DealClient"):
+        self.deal_client = deal_client
+
+    async def run(
+        self, resume: bool = True, page_size: int = PAGE_SIZE
+    ) -> dict[str, Any]:
+        """Проверка всех сделок. Возвращает итоговый прогресс"""
+        progress = await self.get_progress() if resume else None
+        if progress:
+            logger.info(
+                "Проверка сделок продолжена с ID > %s", progress["last_id"]
+            )
+        else:
+            progress = {
+                "last_id": 0,
+                "pages": 0,
+                "checked": 0,
+                "deleted": 0,
+                "categories_updated": 0,
+                "started_at": datetime.now(timezone.utc).isoformat(),
+            }
+            logger.info("Начата проверка всех сделок.")
+
+        repo = self.deal_client.repo
+        while True:
+            deals = await repo.get_deals_batch(
+                batch_size=page_size, last_id=progress["last_id"]
+            )
+            if not deals:
+                break
+            await self._check_page(deals, progress)
+            progress["last_id"] = deals[-1].external_id
+            progress["pages"] += 1
+            await self._save_progress(progress)
+            logger.info(
+                "Проверено сделок: %d (до ID %s), удалены в Б24: %d, "
+                "сменили воронку: %d",
+                progress["checked"],
+                progress["last_id"],
+                progress["deleted"],
+                progress["categories_updated"],
+            )
+
+        await self._clear_progress()
+        progress["finished_at"] = datetime.now(timezone.utc).isoformat()
+        logger.info("Проверка сделок завершена успешно.")
+        return progress
+
+    async def _check_page(
+        self, deals: Sequence["DealDB"], progress: dict[str, Any]
+    ) -> None:
+        """Сверка одной страницы сделок"""
+        ids = [deal.external_id for deal in deals]
+        categories = await self.deal_client.bitrix_client.get_categories(ids)
+
+        missing = [deal_id for deal_id in ids if deal_id not in categories]
+        changed = {
+            deal.external_id: categories[deal.external_id]
+            for deal in deals
+            if deal.external_id in categories
+            and categories[deal.external_id] != deal.category_id
+        }
+        repo = self.deal_client.repo
+        progress["deleted"] += await repo.set_deleted_in_bitrix_many(missing)
+        progress["categories_updated"] += await repo.update_categories(changed)
+        progress["checked"] += len(ids)
+
+    async def get_progress(self) -> dict[str, Any] | None:
+        """Сохранённый прогресс незавершённой проверки"""
+        redis = await get_redis()
+        if redis is None:
+            return None
+        try:
+            raw = await redis.get(CHECKPOINT_KEY)
+        except RedisError as e:
+            logger.warning(f"Failed to read deal check checkpoint: {e}")
+            return None
+        if not raw:
+            return None
+        try:
+            data = orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            return None
+        return data if isinstance(data, dict) and "last_id" in data else None
+
+    async def _save_progress(self, progress: dict[str, Any]) -> None:
+        redis = await get_redis()
+        if redis is None:
+            return
+        try:
+            await redis.set(CHECKPOINT_KEY, orjson.dumps(progress).decode())
+        except RedisError as e:
+            logger.warning(f"Failed to save deal check checkpoint: {e}")
+
+    async def _clear_progress(self) -> None:
+        redis = await get_redis()
+        if redis is None:
+            return
+        try:
+            await redis.delete(CHECKPOINT_KEY)
+        except RedisError as e:
+            logger.warning(f"Failed to clear deal check checkpoint: {e}")
@@ -1,12 +1,16 @@
-from typing import TYPE_CHECKING
+import asyncio
+from typing import TYPE_CHECKING, Any, Awaitable
 
+from core.logger import logger
 from schemas.company_schemas import CompanyCreate
 from schemas.contact_schemas import ContactCreate
 from schemas.deal_schemas import DealCreate
 from schemas.invoice_schemas import InvoiceCreate
-from schemas.product_schemas import ListProductEntity
+from schemas.lead_schemas import LeadCreate
+from schemas.product_schemas import EntityTypeAbbr, ListProductEntity
 
 if TYPE_CHECKING:
+    from .deal_bitrix_services import DealBundle
     from .deal_services import DealClient
 
 
@@ -19,12 +23,99 @@ class DealDataProvider:
         self._cached_contact: ContactCreate | None = None
         self._cached_products: ListProductEntity | None = None
         self._cached_invoice: InvoiceCreate | None = None
+        self._cached_lead: LeadCreate | None = None
+        self._cached_comments: str | None = None
+        # Загруженные предвыборкой данные (в том числе отсутствующие)
+        self._prefetched: set[str] = set()
+
+    async def prefetch(
+        self, deal_b24: DealCreate, deal_db: DealCreate | None
+    ) -> None:
+        """
+        Одновременно загружает связанные со сделкой данные, которые
+        понадобятся обработчикам: счёт, компанию, контакт, а также лид и
+        комментарии, если будет определяться источник. Уже полученные
+        данные (например, из batch сделки) повторно не запрашиваются
+        """
+        loaders: dict[str, Awaitable[Any]] = {}
+        if deal_b24.external_id is not None:
+            loaders["invoice"] = self.deal_client.get_invoice(
+                int(deal_b24.external_id)
+            )
+        if not (deal_db and deal_db.is_frozen):
+            if deal_b24.company_id:
+                loaders["company"] = self.deal_client.get_company(
+                    deal_b24.company_id
+                )
+            if deal_b24.contact_id:
+                loaders["contact"] = self.deal_client.get_contact(
+                    deal_b24.contact_id
+                )
+            identify_source = not (deal_db and deal_db.is_setting_source)
+            if identify_source and deal_b24.lead_id:
+                loaders["lead"] = self.deal_client.get_lead(deal_b24.lead_id)
+                if deal_b24.external_id is not None:
+                    loaders["comments"] = self.deal_client.get_comments(
+                        int(deal_b24.external_id)
+                    )
+        for name in self._prefetched:
+            loaders.pop(name, None)
+        if not loaders:
+            return
+
+        results = await asyncio.gather(*loaders.values())
+        for name, value in zip(loaders, results):
+            setattr(self, f"_cached_{name}", value)
+            self._prefetched.add(name)
+        logger.debug(
+            f"Prefetched {', '.join(loaders)} for deal {deal_b24.external_id}"
+        )
+
+    async def load_bundle(self, bundle: "DealBundle") -> None:
+        """Заполняет провайдер данными, полученными вместе со сделкой"""
+        deal_id = bundle.deal.external_id
+        self._cached_company = bundle.company
+        self._cached_contact = bundle.contact
+        self._cached_lead = bundle.lead
+        self._cached_invoice = bundle.invoice
+        if "comments" in bundle.loaded:
+            self._cached_comments = "; ".join(
+                comment.comment_entity
+                for comment in bundle.comments
+                if comment.comment_entity
+            )
+        # Данные с ошибкой в batch будут запрошены обычным путём
+        self._prefetched.update(bundle.loaded)
+        if bundle.products is not None and deal_id is not None:
+            self.deal_client.product_bitrix_client.prime_entity_products(
+                int(deal_id), EntityTypeAbbr.DEAL, bundle.products
+            )
+
+        entity_cache = self.deal_client.bitrix_client.entity_cache
+        for name, data in bundle.raw.items():
+            if entity_id := data.get("ID") or data.get("id"):
+                await entity_cache.set(name, entity_id, data)
+
+    @property
+    def cached_lead(self) -> LeadCreate | None:
+        """Лид сделки, если загружен"""
+        return self._cached_lead
+
+    @property
+    def cached_comments(self) -> str | None:
+        """Комментарии сделки, если загружены"""
+        return self._cached_comments
+
+    @property
+    def cached_company(self) -> CompanyCreate | None:
+        """Компания сделки, если загружена"""
+        return self._cached_company
 
     async def get_company_data(
         self, deal_b24: DealCreate
     ) -> CompanyCreate | None:
         """Получает данные компании"""
-        if self._cached_company:
+        if self._cached_company or "company" in self._prefetched:
             return self._cached_company
 
         if deal_b24.company_id:
@@ -39,7 +130,7 @@ class DealDataProvider:
         self, deal_b24: DealCreate
     ) -> ContactCreate | None:
         """Получает данные контакта"""
-        if self._cached_contact:
+        if self._cached_contact or "contact" in self._prefetched:
             return self._cached_contact
 
         if deal_b24.contact_id:
@@ -53,8 +144,8 @@ class DealDataProvider:
     async def get_invoice_data(
         self, deal_b24: DealCreate
     ) -> InvoiceCreate | None:
-        """Получает данные контакта"""
-        if self._cached_invoice:
+        """Получает данные счёта"""
+        if self._cached_invoice or "invoice" in self._prefetched:
             return self._cached_invoice
         if deal_b24.external_id is None:
             return None
@@ -87,3 +178,7 @@ class DealDataProvider:
         self._cached_contact = None
         self._cached_products = None
         self._cached_invoice = None
+        self._cached_lead = None
+        self._cached_comments = None
+        self._prefetched.clear()
+        self.deal_client.product_bitrix_client.clear_primed_products()
@@ -1,20 +1,31 @@
 from typing import Any
 
 import httpx
+import orjson
 from fastapi import HTTPException
 
 from core.logger import logger
 from core.settings import settings
 
+from ..circuit_breaker import UpstreamUnavailableError, get_circuit_breaker
+from ..http_client import PHP_ENDPOINT_POOL, get_http_client
+
 TIMEOUT = 30.0
 
 
 class DealProcessingClient:
-    def __init__(self) -> None:
+    def __init__(self, http_client: httpx.AsyncClient | None = None) -> None:
         self.php_endpoint_url = (
             f"{settings.WEB_HOOK_PORTAL}/{settings.ENDPOINT_SEND_DEAL_STATUS}"
         )
         self.timeout = TIMEOUT
+        self._http_client = http_client
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        if self._http_client is not None and not self._http_client.is_closed:
+            return self._http_client
+        return get_http_client(PHP_ENDPOINT_POOL)
 
     async def send_deal_processing_request(
         self, deal_id: int, timestamp: int
@@ -36,25 +47,31 @@ class DealProcessingClient:
         }
 
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
+            async with get_circuit_breaker(PHP_ENDPOINT_POOL).guard() as call:
+                response = await self.http_client.post(
                     self.php_endpoint_url,
                     json=payload,
                     headers={"Content-Type": "application/json"},
+                    timeout=self.timeout,
                 )
+                call.failed = response.status_code >= 500
 
-                if response.status_code == 200:
-                    return response.json()  # type: ignore[no-any-return]
-                else:
-                    logger.error(
-                        f"PHP endpoint error: {response.status_code} - "
-                        f"{response.text}"
-                    )
-                    raise HTTPException(
-                        status_code=response.status_code,
-                        detail=f"PHP endpoint error: {response.text}",
-                    )
+            if response.status_code == 200:
+                data: dict[str, Any] = orjson.loads(response.content)
+                return data
+            else:
+                logger.error(
+                    f"PHP endpoint error: {response.status_code} - "
+                    f"{response.text}"
+                )
+                raise HTTPException(
+                    status_code=response.status_code,
+                    detail=f"PHP endpoint error: {response.text}",
+                )
 
+        except UpstreamUnavailableError as e:
+            logger.warning(str(e))
+            raise HTTPException(status_code=503, detail=str(e))
         except httpx.TimeoutException:
             logger.error(
                 f"Timeout while calling PHP endpoint for deal {deal_id}"
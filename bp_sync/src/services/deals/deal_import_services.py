@@ -1,4 +1,3 @@
-import asyncio
 import json
 from typing import Any
 
@@ -7,7 +6,6 @@ from models.bases import EntityType
 from schemas.timeline_comment_schemas import TimelineCommentCreate
 from services.deals.deal_services import DealClient
 from services.dependencies import reset_cache
-from services.exceptions import ConflictException
 from services.invoices.invoice_bitrix_services import InvoiceBitrixClient
 from services.invoices.invoice_services import InvoiceClient
 from services.rabbitmq_client import RabbitMQClient
@@ -18,8 +16,6 @@ from services.timeline_comments.timeline_comment_repository import (
     TimelineCommentRepository,
 )
 
-DEALS_SLEEP_INTERVAL = 2
-
 
 class DealProcessor:
     """Класс для обработки выгрузки сделок в БД"""
@@ -51,7 +47,6 @@ class DealProcessor:
                 deal_id
             )
 
-            await asyncio.sleep(DEALS_SLEEP_INTERVAL)
             logger.info(f"Deal id: {deal_id}. Need refresh: {needs_refresh}")
 
             if needs_refresh:
@@ -78,8 +73,9 @@ class DealProcessor:
             select=select, filter_entity=filter_entity, start=0
         )
 
-        if invoice_result.result:
-            invoice_id = invoice_result.result[0].external_id
+        # Нужен только ID - строки ответа не валидируются схемой
+        if invoice_result.raw:
+            invoice_id = invoice_result.raw[0].get("id")
             if invoice_id:
                 await self._send_invoice_to_queue(int(invoice_id))
 
@@ -110,20 +106,20 @@ class DealProcessor:
         )
 
         if comments_result.result:
-            for comment in comments_result.result:
-                await self._save_timeline_comment(comment, deal_id)
+            await self.timeline_repo.upsert_entities(
+                [
+                    self._build_timeline_comment(comment, deal_id)
+                    for comment in comments_result.result
+                ]
+            )
 
-    async def _save_timeline_comment(
+    def _build_timeline_comment(
         self, comment_data: Any, deal_id: int
-    ) -> None:
-        """Сохранить комментарий временной линии"""
+    ) -> TimelineCommentCreate:
+        """Схема комментария временной линии сделки"""
         comment_data.entity_id = deal_id
         comment_data.entity_type = EntityType.DEAL
 
-        timeline_create = TimelineCommentCreate(
+        return TimelineCommentCreate(
             **comment_data.model_dump(by_alias=True, exclude_unset=True)
         )
-        try:
-            await self.timeline_repo.create_entity(timeline_create)
-        except ConflictException:
-            await self.timeline_repo.update_entity(timeline_create)
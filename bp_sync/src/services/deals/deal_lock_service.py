@@ -1,150 +1,171 @@
-import asyncio
-import random
+import time
+import uuid
 from contextlib import asynccontextmanager
-from typing import AsyncIterator
+from typing import Any, AsyncIterator
 
 from redis.asyncio import Redis
-from redis.exceptions import LockError
+from redis.exceptions import RedisError
 
 from core.logger import logger
 
-from ..exceptions import LockAcquisitionError, MaxRetriesExceededError
+from ..exceptions import LockAcquisitionError, LockWaitTimeoutError
 
 TIMEOUT = 300
-MAX_RETRIES = 4
-BASE_DELAY = 1.0
-MAX_DELAY = 30.0
+WAIT_TIMEOUT = 300
+MIN_BLOCK = 0.1  # секунд минимального ожидания пробуждения
+
+# Захват блокировки. Результат: 0 - захвачена, иначе PTTL текущей
+ACQUIRE_SCRIPT = """
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    return 0
+end
+local ttl = redis.call('PTTL', KEYS[1])
+if ttl < 0 then
+    return 1
+end
+return ttl
+"""
+
+# Освобождение своей блокировки и пробуждение одного ожидающего
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+redis.call('DEL', KEYS[2])
+redis.call('RPUSH', KEYS[2], '1')
+redis.call('PEXPIRE', KEYS[2], ARGV[2])
+return 1
+"""
+
+
+class LockStats:
+    """Метрики конкуренции за блокировки сделок в процессе"""
+
+    def __init__(self) -> None:
+        self.acquired = 0
+        self.contended = 0
+        self.timeouts = 0
+        self.waiting = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float, contended: bool) -> None:
+        self.acquired += 1
+        if contended:
+            self.contended += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "acquired": self.acquired,
+            "contended": self.contended,
+            "timeouts": self.timeouts,
+            "waiting": self.waiting,
+            "avg_wait": (
+                round(self.total_wait / self.contended, 3)
+                if self.contended
+                else 0.0
+            ),
+            "max_wait": round(self.max_wait, 3),
+        }
+
+
+_lock_stats = LockStats()
+
+
+def get_deal_lock_metrics() -> dict[str, Any]:
+    return _lock_stats.snapshot()
 
 
 class LockService:
     """
-    Сервис для управления распределенными блокировками с повторными попытками
+    Сервис для последовательной обработки сделок через блокировки Redis.
+
+    Ожидающие не опрашивают блокировку, а ждут пробуждения через BLPOP:
+    владелец при освобождении кладёт отметку в список пробуждения сделки.
+    Если владелец завершился без освобождения, ожидание длится до
+    истечения TTL его блокировки.
     """
 
     def __init__(self, redis: Redis):
         self.redis_client: Redis = redis
         self._lock_prefix = "deal_lock:"
+        self._wake_prefix = "deal_lock_wake:"
+        self._scripts: dict[str, Any] = {}
 
     @asynccontextmanager
-    async def acquire_deal_lock_with_retry(
+    async def acquire_deal_lock(
         self,
         deal_id: int,
         timeout: int = TIMEOUT,
-        max_retries: int = MAX_RETRIES,
-        base_delay: float = BASE_DELAY,
-        max_delay: float = MAX_DELAY,
-        jitter: bool = True,
+        wait_timeout: float = WAIT_TIMEOUT,
     ) -> AsyncIterator[None]:
         """
-        Контекстный менеджер для получения блокировки сделки с повторными
-        попытками
+        Контекстный менеджер для получения блокировки сделки
 
         Args:
             deal_id: ID сделки
             timeout: время жизни блокировки в секундах
-            max_retries: максимальное количество попыток
-            base_delay: базовая задержка между попытками (в секундах)
-            max_delay: максимальная задержка между попытками
-            jitter: добавлять случайность к задержкам
+            wait_timeout: максимальное время ожидания блокировки
         """
         if not self.redis_client:
             raise RuntimeError("Redis client is not connected")
 
         lock_key = f"{self._lock_prefix}{deal_id}"
+        wake_key = f"{self._wake_prefix}{deal_id}"
+        token = uuid.uuid4().hex
+        timeout_ms = timeout * 1000
 
-        for attempt in range(max_retries + 1):
-            try:
-                lock = self.redis_client.lock(
-                    name=lock_key,
-                    timeout=timeout,
-                    blocking_timeout=0,  # Не блокируем, используем свои ретраи
-                    thread_local=False,
+        started = time.monotonic()
+        contended = False
+        _lock_stats.waiting += 1
+        try:
+            while True:
+                lock_ttl = await self._script(
+                    ACQUIRE_SCRIPT, [lock_key], [token, timeout_ms]
                 )
-
-                acquired = await lock.acquire()
-
-                if acquired:
-                    logger.info(
-                        f"Acquired lock for deal {deal_id} "
-                        f"(attempt {attempt + 1}/{max_retries + 1})"
-                    )
-                    try:
-                        yield
-                        return  # Успешно выполнили
-                    finally:
-                        try:
-                            await lock.release()
-                            logger.info(f"Released lock for deal {deal_id}")
-                        except Exception as e:
-                            logger.warning(
-                                f"Error releasing lock for deal {deal_id}: {e}"
-                            )
-
-                # Если не удалось получить блокировку
-                if attempt < max_retries:
-                    delay = self._calculate_retry_delay(
-                        attempt, base_delay, max_delay, jitter
-                    )
-
-                    remaining_time = await self.get_remaining_lock_time(
-                        deal_id
-                    )
-                    if remaining_time:
-                        logger.warning(
-                            f"Deal {deal_id} is locked, "
-                            f"remaining: {remaining_time:.1f}s, "
-                            f"retrying in {delay:.1f}s "
-                            f"(attempt {attempt + 1}/{max_retries})"
-                        )
-                    else:
-                        logger.warning(
-                            f"Failed to acquire lock for deal {deal_id}, "
-                            f"retrying in {delay:.1f}s "
-                            f"(attempt {attempt + 1}/{max_retries})"
-                        )
-
-                    await asyncio.sleep(delay)
-                else:
-                    # Последняя попытка тоже не удалась
-                    raise MaxRetriesExceededError(
-                        f"Failed to acquire lock for deal {deal_id} "
-                        f"after {max_retries + 1} attempts"
-                    )
-
-            except LockError as e:
-                if attempt < max_retries:
-                    delay = self._calculate_retry_delay(
-                        attempt, base_delay, max_delay, jitter
+                if not lock_ttl:
+                    break
+                if not contended:
+                    contended = True
+                    logger.info(f"Deal {deal_id} is locked, waiting")
+                remaining = wait_timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    _lock_stats.timeouts += 1
+                    raise LockWaitTimeoutError(
+                        f"Deal {deal_id} is still locked after "
+                        f"{wait_timeout:.1f}s"
                     )
-                    logger.warning(
-                        f"Lock error for deal {deal_id}: {e}, "
-                        f"retrying in {delay:.1f}s "
-                        f"(attempt {attempt + 1}/{max_retries})"
-                    )
-                    await asyncio.sleep(delay)
-                else:
-                    logger.error(
-                        f"Lock error for deal {deal_id} after all retries: {e}"
-                    )
-                    raise LockAcquisitionError(
-                        f"Lock error for deal {deal_id}: {e}"
-                    )
-
-    def _calculate_retry_delay(
-        self, attempt: int, base_delay: float, max_delay: float, jitter: bool
-    ) -> float:
-        """
-        Вычисляет задержку для повторной попытки
-        (exponential backoff with jitter)
-        """
-        # Exponential backoff
-        delay = min(base_delay * (2**attempt), max_delay)
-
-        # Добавляем jitter для предотвращения stampede effect
-        if jitter:
-            delay = random.uniform(0.5 * delay, 1.5 * delay)
-
-        return float(delay)
+                block = max(MIN_BLOCK, min(remaining, int(lock_ttl) / 1000))
+                await self.redis_client.blpop([wake_key], timeout=block)
+        except RedisError as e:
+            logger.error(f"Lock error for deal {deal_id}: {e}")
+            raise LockAcquisitionError(f"Lock error for deal {deal_id}: {e}")
+        finally:
+            _lock_stats.waiting -= 1
+
+        wait = time.monotonic() - started
+        _lock_stats.record(wait, contended)
+        logger.info(f"Acquired lock for deal {deal_id} (waited {wait:.2f}s)")
+        try:
+            yield
+        finally:
+            try:
+                await self._script(
+                    RELEASE_SCRIPT, [lock_key, wake_key], [token, timeout_ms]
+                )
+                logger.info(f"Released lock for deal {deal_id}")
+            except RedisError as e:
+                logger.warning(f"Error releasing lock for deal {deal_id}: {e}")
+
+    async def _script(
+        self, script: str, keys: list[str], args: list[Any]
+    ) -> Any:
+        if script not in self._scripts:
+            self._scripts[script] = self.redis_client.register_script(script)
+        return await self._scripts[script](keys=keys, args=args)
 
     async def is_deal_locked(self, deal_id: int) -> bool:
         """Проверяет, заблокирована ли сделка в данный момент"""
@@ -1,7 +1,7 @@
 from datetime import datetime, timedelta
 from typing import Any, Callable, Coroutine, Sequence, Type
 
-from sqlalchemy import and_, select
+from sqlalchemy import and_, case, select, update
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload, load_only, selectinload
@@ -43,11 +43,13 @@ from schemas.main_activity_schemas import MainActivityCreate
 from ..base_repositories.base_repository import BaseRepository
 from ..companies.company_services import CompanyClient
 from ..contacts.contact_services import ContactClient
+from ..entities.reference_cache import get_reference_cache
 from ..entities.source_services import SourceClient
 from ..exceptions import ConflictException
 from ..invoices.invoice_services import InvoiceClient
 from ..leads.lead_services import LeadClient
 from ..users.user_services import UserClient
+from .enums import EXCLUDE_FIELDS_FOR_COMPARE
 
 
 class DealRepository(BaseRepository[DealDB, DealCreate, DealUpdate, int]):
@@ -55,6 +57,8 @@ class DealRepository(BaseRepository[DealDB, DealCreate, DealUpdate, int]):
 
     model = DealDB
     entity_type = EntityType.DEAL
+    content_hash_exclude = frozenset(EXCLUDE_FIELDS_FOR_COMPARE)
+    local_fields = frozenset({"is_frozen", "is_setting_source", "moved_date"})
 
     def __init__(
         self,
@@ -403,11 +407,9 @@ class DealRepository(BaseRepository[DealDB, DealCreate, DealUpdate, int]):
     ) -> str | None:
         """Получить external_id стадии сделки по порядковому номеру"""
         try:
-            stmt = select(DealStage.external_id).where(
-                DealStage.sort_order == sort_order
-            )
-            result = await self.session.execute(stmt)
-            return result.scalar_one_or_none()  # type: ignore[no-any-return]
+            references = await get_reference_cache().get(self.session)
+            stage = references.stage_by_sort_order(sort_order)
+            return stage.external_id if stage else None
         except Exception as e:
             # Логирование ошибки
             logger.error(
@@ -421,11 +423,9 @@ class DealRepository(BaseRepository[DealDB, DealCreate, DealUpdate, int]):
     ) -> int | None:
         """Получить порядковый номер стадии сделки по external_id"""
         try:
-            stmt = select(DealStage.sort_order).where(
-                DealStage.external_id == external_id
-            )
-            result = await self.session.execute(stmt)
-            return result.scalar_one_or_none()  # type: ignore[no-any-return]
+            references = await get_reference_cache().get(self.session)
+            stage = references.stages.get(external_id)
+            return stage.sort_order if stage else None
         except Exception as e:
             # Логирование ошибки
             logger.error(
@@ -505,11 +505,8 @@ class DealRepository(BaseRepository[DealDB, DealCreate, DealUpdate, int]):
     async def get_first_four_stages(self) -> list[str]:
         """Получает ID первых четырех стадий сделок"""
         try:
-            stage_ids: list[str] = []
-            for i in range(1, 5):
-                external_id = await self.get_external_id_by_sort_order_stage(i)
-                if external_id:
-                    stage_ids.append(external_id)
+            references = await get_reference_cache().get(self.session)
+            stage_ids = references.first_stages(4)
 
             logger.debug(f"Found first four stages: {stage_ids}")
             return stage_ids
@@ -554,6 +551,53 @@ class DealRepository(BaseRepository[DealDB, DealCreate, DealUpdate, int]):
         result = await self.session.execute(stmt)
         return result.scalars().all()  # type: ignore[no-any-return]
 
+    async def update_categories(self, categories: dict[int, int]) -> int:
+        """
+        Обновляет воронки сделок одним запросом.
+        categories: {external_id сделки: category_id}
+        """
+        if not categories:
+            return 0
+        try:
+            # Воронки нет в справочнике - такие сделки пропускаются, чтобы
+            # внешний ключ не сорвал обновление всей страницы
+            known = set(
+                (
+                    await self.session.scalars(
+                        select(Category.external_id).where(
+                            Category.external_id.in_(set(categories.values()))
+                        )
+                    )
+                ).all()
+            )
+            unknown = {
+                deal_id: category_id
+                for deal_id, category_id in categories.items()
+                if category_id not in known
+            }
+            if unknown:
+                logger.warning(f"Unknown categories, deals skipped: {unknown}")
+                categories = {
+                    deal_id: category_id
+                    for deal_id, category_id in categories.items()
+                    if category_id in known
+                }
+                if not categories:
+                    return 0
+            stmt = (
+                update(DealDB)
+                .where(DealDB.external_id.in_(list(categories)))
+                .values(category_id=case(categories, value=DealDB.external_id))
+                .execution_options(synchronize_session=False)
+            )
+            result = await self.session.execute(stmt)
+            await self.session.commit()
+            return int(result.rowcount)
+        except SQLAlchemyError as e:
+            await self.session.rollback()
+            logger.error(f"Error updating deal categories: {e}")
+            raise
+
     async def get_overdue_deals(self) -> list[DealDB]:
         """
         Получает сделки с просроченным статусом обработки
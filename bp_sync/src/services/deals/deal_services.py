@@ -1,4 +1,3 @@
-import asyncio
 import time
 from datetime import datetime, timezone
 from typing import Any
@@ -12,7 +11,7 @@ from models.deal_models import Deal as DealDB
 from models.enums import ProcessingStatusEnum, StageSemanticEnum
 from schemas.company_schemas import CompanyCreate
 from schemas.contact_schemas import ContactCreate
-from schemas.deal_schemas import DealCreate, DealUpdate
+from schemas.deal_schemas import DealCreate, DealUpdate, WebhookEvent
 from schemas.invoice_schemas import InvoiceCreate, InvoiceUpdate
 from schemas.lead_schemas import LeadCreate
 from schemas.product_schemas import EntityTypeAbbr
@@ -20,7 +19,8 @@ from schemas.product_schemas import EntityTypeAbbr
 # from services.bitrix_services.webhook_service import WebhookService
 from services.products.product_bitrix_services import ProductUpdateResult
 
-from ..base_services.base_service import BaseEntityClient
+from ..base_services.base_service import BaseEntityClient, ExternalIdType
+from ..bitrix_services.base_bitrix_services import WriteWindow
 from ..exceptions import (
     BitrixApiError,
     DealProcessingError,
@@ -33,7 +33,9 @@ from ..products.product_bitrix_services import ProductBitrixClient
 from ..timeline_comments.timeline_comment_bitrix_services import (
     TimeLineCommentBitrixClient,
 )
+from ..webhook_coalescer import get_webhook_coalescer
 from .deal_bitrix_services import DealBitrixClient
+from .deal_checking_service import DealCheckingService
 from .deal_data_provider import DealDataProvider
 from .deal_extend_processing import DealProcessingClient
 from .deal_lock_service import LockService
@@ -110,13 +112,15 @@ class DealClient(BaseEntityClient[DealDB, DealRepository, DealBitrixClient]):
         self.deal_source_handler = DealSourceHandler(self)
         self.deal_ext_service = DealProcessingClient()
         self.deal_processing_status_service = DealProcessingStatusService(self)
+        self.deal_checking_service = DealCheckingService(self)
 
         self.retry_config: dict[str, Any] = {
-            "max_retries": getattr(settings, "lock_max_retries", 3),
-            "base_delay": getattr(settings, "lock_base_delay", 1.0),
-            "max_delay": getattr(settings, "lock_max_delay", 30.0),
-            "jitter": getattr(settings, "lock_jitter", True),
             "lock_timeout": getattr(settings, "default_lock_timeout", 300),
+            "wait_timeout": getattr(settings, "lock_wait_timeout", 300),
+            # Ожидание в HTTP-запросе, если событие обрабатывается без очереди
+            "request_wait_timeout": getattr(
+                settings, "lock_request_wait_timeout", 15
+            ),
         }
 
     @property
@@ -214,6 +218,20 @@ class DealClient(BaseEntityClient[DealDB, DealRepository, DealBitrixClient]):
                 logger.warning(error_msg)
                 return None
 
+            # Отпечаток до обработки: обработчики могут менять deal_b24
+            content_hash = self.repo.content_hash(deal_b24)
+            if (
+                deal_db
+                and not changes
+                and self.is_unchanged(deal_b24, deal_db, content_hash)
+            ):
+                logger.info(
+                    f"Deal {external_id} is unchanged in Bitrix, "
+                    "processing skipped"
+                )
+                return None
+
+            await self.data_provider.prefetch(deal_b24, deal_db)
             result = await self._handle_deal(deal_b24, deal_db, changes)
             if not result:
                 logger.warning(f"Deal {external_id} processing returned False")
@@ -230,7 +248,19 @@ class DealClient(BaseEntityClient[DealDB, DealRepository, DealBitrixClient]):
                     f"Deal {external_id} synchronization "
                     f"{'succeeded' if sync_result else 'failed'}"
                 )
+                # Сделка не менялась в Битрикс24 при обработке - данные в
+                # БД совпадают с полученными, запоминаем их отпечаток
+                if (
+                    sync_result
+                    and deal_db
+                    and not self.update_tracker.has_changes()
+                ):
+                    await self.repo.save_content_hash(
+                        external_id, content_hash
+                    )
                 return sync_result
+            if deal_db.content_hash != content_hash:
+                await self.repo.save_content_hash(external_id, content_hash)
             logger.info(
                 f"Deal {external_id} processed successfully with no changes"
             )
@@ -243,6 +273,19 @@ class DealClient(BaseEntityClient[DealDB, DealRepository, DealBitrixClient]):
             self.update_tracker.reset()
             logger.info(f"Finished processing deal {external_id}")
 
+    async def fetch_for_compare(
+        self, entity_id: ExternalIdType, entity_type_id: int | None = None
+    ) -> DealCreate:
+        """
+        Получает сделку вместе со связанными данными одним запросом batch и
+        передаёт их в провайдер данных
+        """
+        if not settings.BITRIX_DEAL_BUNDLE:
+            return await self.bitrix_client.get(entity_id, entity_type_id)
+        bundle = await self.bitrix_client.get_bundle(int(entity_id))
+        await self.data_provider.load_bundle(bundle)
+        return bundle.deal
+
     async def _handle_deal(
         self,
         deal_b24: DealCreate,
@@ -544,7 +587,8 @@ class DealClient(BaseEntityClient[DealDB, DealRepository, DealBitrixClient]):
         try:
             deal_update = self.update_tracker.get_deal_update()
             # Обновляем данные в Bitrix24
-            await self.bitrix_client.update(deal_update)
+            _, window = await self.bitrix_client.update_timed(deal_update)
+            await self._remember_own_write(deal_update, window)
 
             # Обновляем или создаем запись в базе данных
             # Добавляем изменённые атрибуты.
@@ -595,11 +639,19 @@ class DealClient(BaseEntityClient[DealDB, DealRepository, DealBitrixClient]):
                 type_corr = DealTypeEnum.from_value(deal_db.type_id)
                 source_corr = DealSourceEnum.from_value(deal_db.source_id)
             else:
+                data_provider = self.data_provider
                 result = await identify_source(
                     deal_b24,
                     self.get_lead,
                     self.get_company,
                     self.get_comments,
+                    lead=data_provider.cached_lead,
+                    company=(
+                        data_provider.cached_company
+                        if deal_b24.company_id
+                        else None
+                    ),
+                    comments_=data_provider.cached_comments,
                     context=context,
                 )
                 if "company" in context:
@@ -825,6 +877,97 @@ class DealClient(BaseEntityClient[DealDB, DealRepository, DealBitrixClient]):
             )
             return False
 
+    async def _remember_own_write(
+        self, deal_update: DealUpdate, window: WriteWindow | None
+    ) -> None:
+        """
+        Запоминает записанные в Битрикс24 поля и интервал серверного
+        времени записи, чтобы распознать вызванный ею вебхук
+        ONCRMDEALUPDATE
+        """
+        external_id = deal_update.external_id
+        written = deal_update.model_dump(
+            mode="json", exclude_unset=True, exclude={"external_id"}
+        )
+        if not external_id or not written or window is None:
+            return
+        coalescer = await get_webhook_coalescer()
+        await coalescer.remember_write(
+            self.entity_name,
+            external_id,
+            {
+                "written_from": window[0].isoformat(),
+                "written_to": window[1].isoformat(),
+                "fields": written,
+            },
+        )
+
+    async def is_echo_event(self, event: WebhookEvent) -> bool:
+        """
+        Обновление сделки - эхо нашей записи, если DATE_MODIFY сделки лежит
+        в интервале выполнения записи и записанные поля с тех пор не
+        изменились
+        """
+        if event.event != "ONCRMDEALUPDATE":
+            return False
+        coalescer = await get_webhook_coalescer()
+        own_write = await coalescer.get_write(
+            self.entity_name, event.entity_id
+        )
+        if not own_write:
+            return False
+        fields: dict[str, Any] = own_write.get("fields") or {}
+        try:
+            written_from = datetime.fromisoformat(own_write["written_from"])
+            written_to = datetime.fromisoformat(own_write["written_to"])
+            current = await self.bitrix_client.get_partial(
+                event.entity_id, ["date_modify", *fields]
+            )
+            if not written_from <= current.date_modify <= written_to:
+                return False
+        except Exception as e:
+            logger.warning(f"Can't check echo for deal {event.entity_id}: {e}")
+            return False
+        current_data = current.model_dump(mode="json")
+        return all(
+            current_data.get(field) == value for field, value in fields.items()
+        )
+
+    async def process_webhook_event(
+        self, event: WebhookEvent, *, in_request: bool = False
+    ) -> None:
+        """
+        Обработка события сделки под блокировкой сделки с уведомлением
+        внешнего сервиса. Долгое ожидание блокировки допустимо только в
+        воркере очереди
+        """
+        deal_id = event.entity_id
+        async with self.lock_service.acquire_deal_lock(
+            deal_id,
+            timeout=self.retry_config["lock_timeout"],
+            wait_timeout=self.retry_config[
+                "request_wait_timeout" if in_request else "wait_timeout"
+            ],
+        ):
+            # None - обрабатывать нечего (нет изменений, не основная
+            # воронка), ошибка только False
+            success = await self.handle_deal(deal_id)
+            if success is False:
+                raise DealProcessingError(f"Failed to process deal {deal_id}")
+            if not success:
+                return
+
+            try:
+                ext_service = self.deal_ext_service
+                await ext_service.send_deal_processing_request(
+                    deal_id, event.ts
+                )
+            except HTTPException as e:
+                logger.error(
+                    f"Failed to send deal processing request for "
+                    f"deal {deal_id}-{event.ts}: {str(e)}"
+                )
+
     async def deal_processing(
         self,
         request: Request,
@@ -860,47 +1003,37 @@ class DealClient(BaseEntityClient[DealDB, DealRepository, DealBitrixClient]):
             #    ADMIN_ID,
             #    f"START NEW PROCESS DEAL ID: {deal_id} {webhook_payload.ts}",
             # )
+            event = WebhookEvent(
+                entity=self.entity_name,
+                entity_id=deal_id,
+                event=webhook_payload.event,
+                ts=int(webhook_payload.ts),
+            )
+            coalescer = await get_webhook_coalescer()
+            if not await coalescer.admit(event.entity, deal_id):
+                return self._success_response(
+                    f"Deal {deal_id} is already scheduled",
+                    webhook_payload.event,
+                )
+            if await self.enqueue_webhook_event(event):
+                return self._success_response(
+                    f"Deal {deal_id} queued for processing",
+                    webhook_payload.event,
+                )
             try:
-                async with self.lock_service.acquire_deal_lock_with_retry(
-                    deal_id,
-                    timeout=self.retry_config["lock_timeout"],
-                    max_retries=self.retry_config["max_retries"],
-                    base_delay=self.retry_config["base_delay"],
-                    max_delay=self.retry_config["max_delay"],
-                    jitter=self.retry_config["jitter"],
-                ):
-
-                    success = await self.handle_deal(deal_id)
-
-                    if success:
-                        try:
-                            ext_service = self.deal_ext_service
-                            await ext_service.send_deal_processing_request(
-                                deal_id, int(webhook_payload.ts)
-                            )
-                        except HTTPException as e:
-                            logger.error(
-                                f"Failed to send deal processing request for "
-                                f"deal {deal_id}-{webhook_payload.ts}: "
-                                f"{str(e)}"
-                            )
-                        return self._success_response(
-                            f"Deal {deal_id} processed successfully",
-                            webhook_payload.event,
-                        )
-                    else:
-                        raise DealProcessingError(
-                            f"Failed to process deal {deal_id}"
-                        )
-
+                await self.run_webhook_event(event, in_request=True)
+                return self._success_response(
+                    f"Deal {deal_id} processed successfully",
+                    webhook_payload.event,
+                )
             except MaxRetriesExceededError:
-                # Все попытки исчерпаны
+                # Время ожидания блокировки истекло
                 remain_time = await self.lock_service.get_remaining_lock_time(
                     deal_id
                 )
                 error_msg = (
                     f"Deal {deal_id} is still locked after "
-                    f"{self.retry_config['max_retries']} retries"
+                    f"{self.retry_config['request_wait_timeout']}s"
                 )
                 if remain_time:
                     error_msg += f", lock expires in {remain_time:.1f}s"
@@ -997,46 +1130,13 @@ class DealClient(BaseEntityClient[DealDB, DealRepository, DealBitrixClient]):
                 detail=f"Failed to update single processing status: {str(e)}",
             )
 
-    async def checking_deals(self) -> None:
+    async def checking_deals(self, resume: bool = True) -> dict[str, Any]:
         """
-        Функция обработки проверки всех сделок на удаление и воронку
+        Проверка всех сделок на удаление и воронку пачками с сохранением
+        прогресса. resume=False начинает проверку заново
         """
-        last_id = 0
-        batch_number = 0
-
-        logger.info("Начата проверка всех сделок.")
         try:
-            while True:
-                try:
-                    deals = await self.repo.get_deals_batch(last_id=last_id)
-                except Exception as e:
-                    logger.error(
-                        "Ошибка при получении пачки сделок (last_id=%s): %s",
-                        last_id,
-                        e,
-                        exc_info=True,
-                    )
-                    raise
-
-                if not deals:
-                    logger.info("Все сделки обработаны.")
-                    break
-
-                logger.info(
-                    "Обрабатывается пачка #%d, количество сделок: %d",
-                    batch_number,
-                    len(deals),
-                )
-
-                for deal in deals:
-                    await self._process_deal_data(deal)
-
-                last_id = deals[-1].external_id
-                batch_number += 1
-
-                await asyncio.sleep(0.1)
-            logger.info("Проверка сделок завершена успешно.")
-
+            return await self.deal_checking_service.run(resume=resume)
         except Exception as e:
             logger.critical(
                 "Критическая ошибка в процессе проверки сделок: %s",
@@ -1045,76 +1145,6 @@ class DealClient(BaseEntityClient[DealDB, DealRepository, DealBitrixClient]):
             )
             raise
 
-    async def _process_deal_data(self, deal: DealDB) -> None:
-        """Обрабатывает данные одной сделки из БД."""
-        external_id = deal.external_id
-        logger.debug("Обработка сделки с external_id=%s", external_id)
-
-        try:
-            deal_b24 = await self.bitrix_client.get(external_id)
-            await asyncio.sleep(1)  # соблюдение рейт-лимитов API
-
-            if deal_b24.category_id != 0:
-                logger.info(
-                    "Обновление категории для сделки %s: новая категория %s",
-                    external_id,
-                    deal_b24.category_id,
-                )
-                await self._update_category_deal(
-                    external_id, deal_b24.category_id
-                )
-            else:
-                logger.debug(
-                    "Сделка %s имеет категорию 0 — пропуск.", external_id
-                )
-
-        except BitrixApiError as e:
-            if e.is_not_found_error():
-                logger.info(
-                    "Сделка %s не найдена в Б24 — помечена как удалённая.",
-                    external_id,
-                )
-                await self.repo.set_deleted_in_bitrix(external_id)
-            else:
-                logger.error(
-                    "Ошибка API Битрикс24 при обработке сделки %s: %s",
-                    external_id,
-                    e,
-                    exc_info=True,
-                )
-                raise
-        except Exception as e:
-            logger.error(
-                "Неожиданная ошибка при обработке сделки %s: %s",
-                external_id,
-                e,
-                exc_info=True,
-            )
-            raise
-
-    async def _update_category_deal(
-        self, external_id: int, category_id: int
-    ) -> None:
-        """Обновляет категорию сделки в локальной БД."""
-        try:
-            data: dict[str, Any] = {
-                "external_id": external_id,
-                "category_id": category_id,
-            }
-            deal_update = DealUpdate(**data)
-            await self.repo.update(deal_update)
-            logger.debug(
-                "Категория для сделки %s успешно обновлена в БД.", external_id
-            )
-        except Exception as e:
-            logger.error(
-                "Ошибка при обновлении категории сделки %s в БД: %s",
-                external_id,
-                e,
-                exc_info=True,
-            )
-            raise
-
     async def send_notifications_overdue_deals(
         self,
         notification_scope: int = NotificationScopeEnum.SUPERVISOR,
@@ -0,0 +1,433 @@
+import asyncio
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from redis.exceptions import RedisError
+
+from core.logger import logger
+from core.settings import settings
+from db.redis import get_redis
+
+from ..base_services.related_freshness import get_related_freshness
+from ..invoices.invoice_bitrix_services import (
+    ENTITY_TYPE_ID as INVOICE_ENTITY_TYPE_ID,
+)
+from .sync_watermark_repository import SyncWatermarkRepository
+
+LOCK_KEY = "delta_sync:lock"
+FAILED_KEY = "delta_sync:failed:{entity}"  # ID -> число неудачных запусков
+FAILED_TTL = 7 * 24 * 3600
+
+
+@dataclass(frozen=True)
+class DeltaSource:
+    """Тип сущности для инкрементальной синхронизации"""
+
+    entity: str  # имя сервиса <entity>_client и ключ водяного знака
+    modified_field: str | None  # поле даты изменения для фильтра list
+    entity_type_id: int | None = None
+
+    @property
+    def id_field(self) -> str:
+        return "id" if self.entity_type_id else "ID"
+
+
+# Порядок важен: сначала сущности, на которые ссылаются остальные.
+# user.get не фильтруется по дате изменения - пользователи
+# синхронизируются целиком, их немного
+DELTA_SOURCES = (
+    DeltaSource("user", None),
+    DeltaSource("company", "DATE_MODIFY"),
+    DeltaSource("contact", "DATE_MODIFY"),
+    DeltaSource("lead", "DATE_MODIFY"),
+    DeltaSource("deal", "DATE_MODIFY"),
+    DeltaSource("invoice", "updatedTime", INVOICE_ENTITY_TYPE_ID),
+)
+
+
+def _parse_modified(value: Any) -> datetime | None:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+class DeltaSyncService:
+    """
+    Инкрементальная синхронизация зеркала с Битрикс24 по расписанию.
+
+    Для каждого типа сущности хранится водяной знак - дата изменения, до
+    которой записи уже синхронизированы. Запуск выбирает только записи с
+    датой изменения не раньше водяного знака (с запасом overlap секунд на
+    расхождение часов), получает их пачками batch и сохраняет через
+    репозитории. Стоимость догоняющей синхронизации пропорциональна числу
+    изменений, а не размеру таблиц. Запуски разных процессов разделены
+    блокировкой в Redis.
+
+    Несохранённые записи удерживают водяной знак, пока число неудачных
+    запусков для них (счётчики в Redis) меньше max_attempts; после этого
+    запись считается сбойной постоянно, и водяной знак идёт дальше.
+    """
+
+    def __init__(
+        self,
+        interval: int = settings.DELTA_SYNC_INTERVAL,
+        overlap: int = settings.DELTA_SYNC_OVERLAP,
+        chunk_size: int = settings.DELTA_SYNC_CHUNK,
+        max_attempts: int = settings.DELTA_SYNC_MAX_ATTEMPTS,
+    ) -> None:
+        self.interval = interval
+        self.overlap = overlap
+        self.chunk_size = max(1, chunk_size)
+        self.max_attempts = max(1, max_attempts)
+        self._task: asyncio.Task[None] | None = None
+        self._manual_task: asyncio.Task[Any] | None = None
+        self._running = False
+        self.runs = 0
+        self.last_results: dict[str, dict[str, Any]] = {}
+
+    @property
+    def is_running(self) -> bool:
+        return self._running
+
+    def start(self) -> None:
+        """Запуск синхронизации по расписанию"""
+        if self._task is None:
+            self._task = asyncio.create_task(
+                self._schedule(), name="delta-sync"
+            )
+            logger.info(f"Delta sync scheduled every {self.interval}s")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def trigger(self) -> bool:
+        """Внеочередной запуск в фоне. False - синхронизация уже идёт"""
+        if self._running or (
+            self._manual_task is not None and not self._manual_task.done()
+        ):
+            return False
+        self._manual_task = asyncio.create_task(
+            self.sync_all(), name="delta-sync-manual"
+        )
+        return True
+
+    async def _schedule(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sync_all()
+            except Exception as e:
+                logger.error(f"Delta sync failed: {e}")
+
+    async def sync_all(self) -> dict[str, dict[str, Any]]:
+        """Синхронизация всех типов сущностей. {} - уже выполняется"""
+        if self._running:
+            return {}
+        self._running = True
+        token = uuid.uuid4().hex
+        try:
+            if not await self._acquire(token):
+                logger.info("Delta sync is running in another process")
+                return {}
+            results: dict[str, dict[str, Any]] = {}
+            try:
+                for source in DELTA_SOURCES:
+                    try:
+                        results[source.entity] = await self.sync_entity(source)
+                    except Exception as e:
+                        logger.error(
+                            f"Delta sync of {source.entity} failed: {e}"
+                        )
+                        results[source.entity] = {"error": str(e)}
+            finally:
+                await self._release(token)
+            self.runs += 1
+            self.last_results = results
+            return results
+        finally:
+            self._running = False
+
+    async def sync_entity(self, source: DeltaSource) -> dict[str, Any]:
+        """Синхронизация изменений одного типа сущности"""
+        from ..dependencies import (
+            get_service,
+            get_session_context,
+            worker_context,
+        )
+
+        started = datetime.now(timezone.utc)
+        async with worker_context():
+            watermarks = SyncWatermarkRepository(get_session_context())
+            state = await watermarks.get(source.entity)
+            client = await get_service(f"{source.entity}_client")
+            if state is not None:
+                watermark = state.watermark
+            else:
+                # Первый запуск: зеркало актуально на момент последнего
+                # изменения в БД, пустая таблица загружается целиком
+                watermark = await client.repo.get_last_modified()
+
+            if source.modified_field is None:
+                synced, failed = await self._sync_all_users(client, source)
+                new_watermark: datetime | None = started
+            else:
+                synced, failed, new_watermark = await self._sync_modified(
+                    client, source, watermark
+                )
+            await watermarks.save(
+                source.entity, new_watermark, started, synced, failed
+            )
+
+        result = {
+            "synced": synced,
+            "failed": failed,
+            "watermark": new_watermark.isoformat() if new_watermark else None,
+            "seconds": round(
+                (datetime.now(timezone.utc) - started).total_seconds(), 1
+            ),
+        }
+        logger.info(f"Delta sync of {source.entity}: {result}")
+        return result
+
+    async def _sync_modified(
+        self, client: Any, source: DeltaSource, watermark: datetime | None
+    ) -> tuple[int, int, datetime | None]:
+        filter_entity: dict[str, Any] = {}
+        if watermark is not None:
+            since = watermark - timedelta(seconds=self.overlap)
+            filter_entity[f">={source.modified_field}"] = since.isoformat()
+
+        synced = failed = 0
+        latest = watermark
+        earliest_failed: datetime | None = None
+        # Сбойная запись без даты изменения удерживает водяной знак целиком
+        hold_all = False
+        chunk: dict[int, datetime | None] = {}
+
+        async def flush() -> None:
+            nonlocal synced, failed, earliest_failed, hold_all
+            saved, failed_ids = await self._sync_chunk(source, list(chunk))
+            synced += saved
+            failed += len(failed_ids)
+            retry_ids = await self._track_failures(
+                source.entity, list(chunk), failed_ids
+            )
+            for entity_id in retry_ids:
+                modified = chunk.get(entity_id)
+                if modified is None:
+                    hold_all = True
+                elif earliest_failed is None or modified < earliest_failed:
+                    earliest_failed = modified
+            chunk.clear()
+
+        async for row in client.bitrix_client.iter_list_raw(
+            select=[source.id_field, source.modified_field],
+            filter_entity=filter_entity,
+            entity_type_id=source.entity_type_id,
+            keyset=True,
+        ):
+            modified = _parse_modified(row.get(source.modified_field))
+            if modified and (latest is None or modified > latest):
+                latest = modified
+            chunk[int(row[source.id_field])] = modified
+            if len(chunk) >= self.chunk_size:
+                await flush()
+        if chunk:
+            await flush()
+
+        # Неудачные записи будут выбраны повторно при следующем запуске
+        if hold_all:
+            return synced, failed, watermark
+        return synced, failed, earliest_failed or latest
+
+    async def _track_failures(
+        self, entity: str, entity_ids: list[int], failed_ids: list[int]
+    ) -> list[int]:
+        """
+        Обновляет счётчики неудачных запусков пачки. Возвращает несохранённые
+        ID, которые ещё удерживают водяной знак
+        """
+        redis = await get_redis()
+        if redis is None:
+            return failed_ids
+        key = FAILED_KEY.format(entity=entity)
+        failed_set = set(failed_ids)
+        saved_ids = [i for i in entity_ids if i not in failed_set]
+        try:
+            async with redis.pipeline(transaction=False) as pipe:
+                if saved_ids:
+                    pipe.hdel(key, *saved_ids)
+                for entity_id in failed_ids:
+                    pipe.hincrby(key, str(entity_id), 1)
+                if failed_ids:
+                    pipe.expire(key, FAILED_TTL)
+                replies = await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Failed to track delta sync failures: {e}")
+            return failed_ids
+        attempts = replies[1 if saved_ids else 0 :][: len(failed_ids)]
+        retry_ids: list[int] = []
+        for entity_id, count in zip(failed_ids, attempts):
+            if int(count) < self.max_attempts:
+                retry_ids.append(entity_id)
+            elif int(count) == self.max_attempts:
+                logger.error(
+                    f"Delta sync of {entity} {entity_id} failed "
+                    f"{count} times, watermark no longer waits for it"
+                )
+        return retry_ids
+
+    async def _sync_all_users(
+        self, client: Any, source: DeltaSource
+    ) -> tuple[int, int]:
+        users = await client.bitrix_client.list_all()
+        synced = failed = 0
+        for start in range(0, len(users), self.chunk_size):
+            entities = {
+                user.external_id: user
+                for user in users[start : start + self.chunk_size]
+            }
+            saved, failed_ids = await self._sync_chunk(
+                source, list(entities), entities
+            )
+            synced += saved
+            failed += len(failed_ids)
+        return synced, failed
+
+    async def _sync_chunk(
+        self,
+        source: DeltaSource,
+        entity_ids: list[int],
+        entities: dict[int, Any] | None = None,
+    ) -> tuple[int, list[int]]:
+        """
+        Сохраняет пачку сущностей в отдельной сессии одним upsert.
+        Возвращает число сохранённых и ID, которые не удалось сохранить
+        """
+        from ..dependencies import get_service, worker_context
+
+        skipped: list[int] = []
+        async with worker_context():
+            client = await get_service(f"{source.entity}_client")
+            if entities is None:
+                # Не полученные из Битрикс24 ID считаются несохранёнными
+                entities, skipped = await client.bitrix_client.get_many(
+                    entity_ids, entity_type_id=source.entity_type_id
+                )
+            if not entities:
+                return 0, skipped
+            try:
+                await client.repo.upsert_entities(list(entities.values()))
+                freshness = get_related_freshness()
+                for entity_id in entities:
+                    freshness.mark(client.repo.model, entity_id)
+                return len(entities), skipped
+            except Exception as e:
+                logger.warning(
+                    f"Bulk delta sync of {source.entity} failed, saving "
+                    f"one by one: {e}"
+                )
+        saved, failed = await self._sync_one_by_one(source, entities)
+        return saved, skipped + failed
+
+    async def _sync_one_by_one(
+        self, source: DeltaSource, entities: dict[int, Any]
+    ) -> tuple[int, list[int]]:
+        """Посущностное сохранение пачки для поиска сбойных записей"""
+        from ..dependencies import get_service, worker_context
+
+        failed: list[int] = []
+        async with worker_context():
+            client = await get_service(f"{source.entity}_client")
+            existing = await client.repo.get_existing_ids(list(entities))
+            for entity_id, data in entities.items():
+                try:
+                    if entity_id in existing:
+                        await client.repo.update_entity(data)
+                    else:
+                        await client.repo.create_entity(data)
+                    get_related_freshness().mark(client.repo.model, entity_id)
+                except Exception as e:
+                    logger.error(
+                        f"Delta sync of {source.entity} {entity_id} "
+                        f"failed: {e}"
+                    )
+                    failed.append(entity_id)
+        return len(entities) - len(failed), failed
+
+    async def get_watermarks(self) -> list[dict[str, Any]]:
+        """Сохранённые водяные знаки по типам сущностей"""
+        from ..dependencies import get_session_context, worker_context
+
+        async with worker_context():
+            watermarks = SyncWatermarkRepository(get_session_context())
+            return [
+                {
+                    "entity_type": state.entity_type,
+                    "watermark": (
+                        state.watermark.isoformat()
+                        if state.watermark
+                        else None
+                    ),
+                    "last_run_at": (
+                        state.last_run_at.isoformat()
+                        if state.last_run_at
+                        else None
+                    ),
+                    "last_synced": state.last_synced,
+                    "last_failed": state.last_failed,
+                }
+                for state in await watermarks.get_all()
+            ]
+
+    def stats(self) -> dict[str, Any]:
+        """Метрики синхронизации"""
+        return {
+            "scheduled": self._task is not None,
+            "interval": self.interval,
+            "running": self._running,
+            "runs": self.runs,
+            "last_results": self.last_results,
+        }
+
+    async def _acquire(self, token: str) -> bool:
+        redis = await get_redis()
+        if redis is None:
+            return True
+        try:
+            return bool(
+                await redis.set(
+                    LOCK_KEY, token, nx=True, ex=settings.DELTA_SYNC_LOCK_TTL
+                )
+            )
+        except RedisError as e:
+            logger.warning(f"Delta sync lock is unavailable: {e}")
+            return True
+
+    async def _release(self, token: str) -> None:
+        redis = await get_redis()
+        if redis is None:
+            return
+        try:
+            if await redis.get(LOCK_KEY) == token:
+                await redis.delete(LOCK_KEY)
+        except RedisError as e:
+            logger.warning(f"Failed to release delta sync lock: {e}")
+
+
+_delta_sync_instance: DeltaSyncService | None = None
+
+
+def get_delta_sync() -> DeltaSyncService:
+    global _delta_sync_instance
+    if _delta_sync_instance is None:
+        _delta_sync_instance = DeltaSyncService()
+    return _delta_sync_instance
@@ -0,0 +1,59 @@
+from datetime import datetime
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.logger import logger
+from models.sync_models import SyncWatermark
+
+
+class SyncWatermarkRepository:
+    """Водяные знаки инкрементальной синхронизации по типам сущностей"""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def get(self, entity_type: str) -> SyncWatermark | None:
+        stmt = select(SyncWatermark).where(
+            SyncWatermark.entity_type == entity_type
+        )
+        result = await self.session.execute(stmt)
+        return result.scalar_one_or_none()  # type: ignore[no-any-return]
+
+    async def get_all(self) -> list[SyncWatermark]:
+        stmt = select(SyncWatermark).order_by(SyncWatermark.entity_type)
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
+
+    async def save(
+        self,
+        entity_type: str,
+        watermark: datetime | None,
+        last_run_at: datetime,
+        synced: int,
+        failed: int,
+    ) -> None:
+        """Сохраняет водяной знак одним INSERT ... ON CONFLICT"""
+        values = {
+            "watermark": watermark,
+            "last_run_at": last_run_at,
+            "last_synced": synced,
+            "last_failed": failed,
+        }
+        stmt = (
+            insert(SyncWatermark)
+            .values(entity_type=entity_type, **values)
+            .on_conflict_do_update(
+                index_elements=[SyncWatermark.entity_type],
+                set_={**values, "updated_at": func.now()},
+            )
+        )
+        try:
+            await self.session.execute(stmt)
+            await self.session.commit()
+        except SQLAlchemyError as e:
+            await self.session.rollback()
+            logger.error(f"Failed to save {entity_type} watermark: {e}")
+            raise
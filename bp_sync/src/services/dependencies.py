@@ -1,10 +1,13 @@
 import inspect
+from contextlib import asynccontextmanager, contextmanager
 from contextvars import ContextVar
 from typing import (
     Any,
     AsyncGenerator,
+    AsyncIterator,
     Callable,
     Coroutine,
+    Iterator,
     Type,
     TypeVar,
     cast,
@@ -17,12 +20,15 @@ from sqlalchemy.orm import DeclarativeBase
 
 from core.logger import logger
 from core.settings import settings
-from db.postgres import get_session
+from db.postgres import async_session, get_session
 from db.redis import get_redis
 
 from .billings.billing_repository import BillingRepository
+from .bitrix_services.batch_dispatcher import get_bitrix_batch_dispatcher
 from .bitrix_services.bitrix_api_client import BitrixAPIClient
 from .bitrix_services.bitrix_oauth_client import BitrixOAuthClient
+from .bitrix_services.rate_limiter import get_bitrix_rate_limiter
+from .bitrix_services.single_flight import get_bitrix_single_flight
 from .companies.company_bitrix_services import CompanyBitrixClient
 from .companies.company_repository import CompanyRepository
 from .companies.company_services import CompanyClient
@@ -37,6 +43,7 @@ from .delivery_notes.delivery_note_repository import DeliveryNoteRepository
 from .entities.department_services import DepartmentClient
 from .entities.measure_repository import MeasureRepository
 from .entities.source_services import SourceClient
+from .http_client import get_http_client
 from .invoices.invoice_bitrix_services import InvoiceBitrixClient
 from .invoices.invoice_repository import InvoiceRepository
 from .invoices.invoice_services import InvoiceClient
@@ -116,12 +123,19 @@ async def create_oauth_client() -> BitrixOAuthClient:
         client_secret=settings.BITRIX_CLIENT_SECRET,
         redirect_uri=settings.BITRIX_REDIRECT_URI,
         token_storage=await create_token_storage(),
+        http_client=get_http_client(),
     )
 
 
 async def create_bitrix_client() -> BitrixAPIClient:
     oauth_client = await create_oauth_client()
-    return BitrixAPIClient(oauth_client)
+    return BitrixAPIClient(
+        oauth_client,
+        http_client=get_http_client(),
+        rate_limiter=await get_bitrix_rate_limiter(),
+        batch_dispatcher=get_bitrix_batch_dispatcher(),
+        single_flight=get_bitrix_single_flight(),
+    )
 
 
 async def create_user_bitrix_client() -> UserBitrixClient:
@@ -345,11 +359,9 @@ async def get_service(service_name: str) -> Any:
     return instance
 
 
-# Dependency для установки контекста запроса
-async def request_context(
-    session: AsyncSession = Depends(get_session),
-) -> AsyncGenerator[None, None]:
-    """Устанавливает контекст для текущего запроса"""
+@contextmanager
+def _bind_context(session: AsyncSession) -> Iterator[None]:
+    """Устанавливает сессию и кеши контекста на время обработки"""
     # Устанавливаем сессию и кеш сервисов
     session_token = _session_ctx.set(session)
     cache_token = _services_cache_ctx.set({})
@@ -379,6 +391,29 @@ async def request_context(
         _session_ctx.reset(session_token)
 
 
+# Dependency для установки контекста запроса
+async def request_context(
+    session: AsyncSession = Depends(get_session),
+) -> AsyncGenerator[None, None]:
+    """Устанавливает контекст для текущего запроса"""
+    with _bind_context(session):
+        yield
+
+
+@asynccontextmanager
+async def worker_context() -> AsyncIterator[None]:
+    """Контекст обработки вне HTTP-запроса (фоновые воркеры)"""
+    async with async_session() as session:
+        try:
+            with _bind_context(session):
+                yield
+        except Exception:
+            await session.rollback()
+            raise
+        else:
+            await session.commit()
+
+
 # FastAPI Dependency для получения сервисов
 async def get_service_dependency(
     service_name: str,
@@ -22,6 +22,12 @@ class DepartmentClient(BaseRepository[DepartDB, Department, Department, int]):
     async def import_from_bitrix(self) -> list[DepartDB]:
         """Импортирует все подразделения из Bitrix"""
         departments = await self._fetch_bitrix_departments()
+        try:
+            return await self.upsert_many(departments)
+        except Exception as e:
+            logger.warning(
+                f"Bulk import of departments failed, saving one by one: {e}"
+            )
         results: list[DepartDB] = []
 
         for dept in departments:
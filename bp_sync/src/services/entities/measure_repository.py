@@ -2,6 +2,7 @@ from models.references import Measure as MeasureDB
 from schemas.measure_schemas import MeasureCreate, MeasureUpdate
 
 from ..base_repositories.base_repository import BaseRepository
+from .reference_cache import get_reference_cache
 
 
 class MeasureRepository(
@@ -11,7 +12,8 @@ class MeasureRepository(
     model = MeasureDB
 
     async def get_entity(self, external_id: int) -> MeasureCreate | None:
-        measure_db = await self.get(external_id)
+        references = await get_reference_cache().get(self.session)
+        measure_db = references.measures.get(external_id)
         if measure_db:
             return MeasureCreate(
                 internal_id=measure_db.id,
@@ -0,0 +1,251 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Generic, Iterable, Type, TypeVar
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.logger import logger
+from core.settings import settings
+from db.postgres import Base
+from models.references import DealStage, Measure, ShippingCompany
+
+
+@dataclass(frozen=True, slots=True)
+class ReferenceRecord:
+    """Запись справочника"""
+
+    id: UUID
+    external_id: Any
+    name: str
+
+
+@dataclass(frozen=True, slots=True)
+class StageRecord(ReferenceRecord):
+    sort_order: int | None
+
+
+@dataclass(frozen=True, slots=True)
+class ShippingCompanyRecord(ReferenceRecord):
+    ext_alt_id: int | None
+
+
+@dataclass(frozen=True, slots=True)
+class MeasureRecord(ReferenceRecord):
+    measure_code: int
+    created_at: datetime
+    updated_at: datetime
+    is_deleted_in_bitrix: bool | None
+
+
+R = TypeVar("R", bound=ReferenceRecord)
+
+
+def build_index(
+    records: Iterable[R], key: Callable[[R], Any], label: str
+) -> dict[Any, R]:
+    """
+    Индекс записей по ключу. При повторе ключа остаётся первая запись,
+    повтор логируется: в БД ожидается уникальное значение
+    """
+    index: dict[Any, R] = {}
+    for record in records:
+        value = key(record)
+        if value is None:
+            continue
+        if value in index:
+            logger.warning(
+                f"Duplicate {label} {value!r} in reference data: "
+                f"{record.id} ignored, {index[value].id} used"
+            )
+            continue
+        index[value] = record
+    return index
+
+
+class ReferenceTable(Generic[R]):
+    """Записи справочника с поиском по external_id и названию"""
+
+    def __init__(self, name: str, records: Iterable[R]) -> None:
+        self.records = tuple(records)
+        self._by_external_id = build_index(
+            self.records,
+            lambda record: str(record.external_id),
+            f"{name}.external_id",
+        )
+        self._by_name = build_index(
+            self.records, lambda record: record.name, f"{name}.name"
+        )
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def get(self, external_id: Any) -> R | None:
+        return self._by_external_id.get(str(external_id))
+
+    def find(self, name: str) -> R | None:
+        return self._by_name.get(name)
+
+
+class ReferenceData:
+    """Снимок справочников на момент загрузки"""
+
+    def __init__(
+        self,
+        stages: list[StageRecord],
+        shipping_companies: list[ShippingCompanyRecord],
+        measures: list[MeasureRecord],
+    ) -> None:
+        self.stages = ReferenceTable("deal_stages", stages)
+        self.shipping_companies = ReferenceTable(
+            "shipping_companies", shipping_companies
+        )
+        self.measures = ReferenceTable("measures", measures)
+        self._stages_by_sort_order = build_index(
+            stages, lambda stage: stage.sort_order, "deal_stages.sort_order"
+        )
+        self._shipping_by_ext_alt_id = build_index(
+            shipping_companies,
+            lambda company: company.ext_alt_id,
+            "shipping_companies.ext_alt_id",
+        )
+
+    def stage_by_sort_order(self, sort_order: int) -> StageRecord | None:
+        return self._stages_by_sort_order.get(sort_order)
+
+    def first_stages(self, count: int) -> list[str]:
+        """external_id стадий сделок с порядковыми номерами 1..count"""
+        return [
+            stage.external_id
+            for sort_order in range(1, count + 1)
+            if (stage := self.stage_by_sort_order(sort_order))
+        ]
+
+    def shipping_company_by_ext_alt_id(
+        self, ext_alt_id: int
+    ) -> ShippingCompanyRecord | None:
+        return self._shipping_by_ext_alt_id.get(ext_alt_id)
+
+    def sizes(self) -> dict[str, int]:
+        return {
+            "stages": len(self.stages),
+            "shipping_companies": len(self.shipping_companies),
+            "measures": len(self.measures),
+        }
+
+
+# Модели, правка которых сбрасывает кэш
+CACHED_MODELS: tuple[Type[Base], ...] = (DealStage, ShippingCompany, Measure)
+
+
+class ReferenceCache:
+    """
+    Справочники, загруженные в память процесса: стадии сделок, фирмы
+    отгрузки и единицы измерения.
+
+    Загружаются одним набором запросов при первом обращении и
+    перезагружаются по истечении ttl либо после правки справочника через
+    репозиторий или админку.
+    """
+
+    def __init__(self, ttl: int = settings.REFERENCE_CACHE_TTL) -> None:
+        self.ttl = ttl
+        self._data: ReferenceData | None = None
+        self._loaded_at = 0.0
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.loads = 0
+
+    def is_fresh(self) -> bool:
+        return (
+            self._data is not None
+            and time.monotonic() - self._loaded_at < self.ttl
+        )
+
+    async def get(self, session: AsyncSession) -> ReferenceData:
+        """Справочники из кэша, при необходимости загружает их сессией"""
+        if self.is_fresh():
+            self.hits += 1
+            return self._data  # type: ignore[return-value]
+        async with self._lock:
+            if self.is_fresh():
+                return self._data  # type: ignore[return-value]
+            generation = self._generation
+            data = await self.load(session)
+            self.loads += 1
+            # Справочник изменили во время загрузки - снимок не сохраняется
+            if generation == self._generation:
+                self._data = data
+                self._loaded_at = time.monotonic()
+            return data
+
+    async def load(self, session: AsyncSession) -> ReferenceData:
+        data = ReferenceData(
+            stages=await self._records(
+                session,
+                StageRecord,
+                DealStage.id,
+                DealStage.external_id,
+                DealStage.name,
+                DealStage.sort_order,
+            ),
+            shipping_companies=await self._records(
+                session,
+                ShippingCompanyRecord,
+                ShippingCompany.id,
+                ShippingCompany.external_id,
+                ShippingCompany.name,
+                ShippingCompany.ext_alt_id,
+            ),
+            measures=await self._records(
+                session,
+                MeasureRecord,
+                Measure.id,
+                Measure.external_id,
+                Measure.name,
+                Measure.measure_code,
+                Measure.created_at,
+                Measure.updated_at,
+                Measure.is_deleted_in_bitrix,
+            ),
+        )
+        logger.info(f"Reference data loaded: {data.sizes()}")
+        return data
+
+    def invalidate(self) -> None:
+        self._data = None
+        self._generation += 1
+
+    def invalidate_for(self, model: Any) -> None:
+        """Сбрасывает кэш после изменения записей модели"""
+        if model in CACHED_MODELS:
+            self.invalidate()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "loaded": self._data is not None,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "loads": self.loads,
+            "sizes": self._data.sizes() if self._data is not None else {},
+        }
+
+    async def _records(
+        self, session: AsyncSession, record_cls: Type[R], *columns: Any
+    ) -> list[R]:
+        result = await session.execute(select(*columns))
+        return [record_cls(*row) for row in result.all()]
+
+
+_reference_cache_instance: ReferenceCache | None = None
+
+
+def get_reference_cache() -> ReferenceCache:
+    global _reference_cache_instance
+    if _reference_cache_instance is None:
+        _reference_cache_instance = ReferenceCache()
+    return _reference_cache_instance
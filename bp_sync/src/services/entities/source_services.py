@@ -6,6 +6,8 @@ from core.logger import logger
 from models.references import Source as SourceDB
 from schemas.source_schemas import Source
 
+from ..base_repositories.existence_index import get_existence_index
+
 
 class SourceClient:
 
@@ -36,6 +38,7 @@ class SourceClient:
             await self.session.flush()
             await self.session.commit()
             await self.session.refresh(obj)
+            await get_existence_index().add_entities([obj])
             logger.info(f"{self.model.__name__} created: ID={entity_id}")
             return obj
         except IntegrityError as e:
@@ -62,6 +65,10 @@ class SourceClient:
             ) from e
 
     async def refresh_from_bitrix(
-        self, entity_id: str, entity_type_id: int | None = None
+        self,
+        entity_id: str,
+        entity_type_id: int | None = None,
+        *,
+        entity_data: Source | None = None,
     ) -> None:
         pass
@@ -82,3 +82,9 @@ class MaxRetriesExceededError(LockAcquisitionError):
     """Достигнуто максимальное количество попыток"""
 
     pass
+
+
+class LockWaitTimeoutError(MaxRetriesExceededError):
+    """Блокировка не освободилась за время ожидания"""
+
+    pass
@@ -0,0 +1,84 @@
+import httpx
+
+from core.logger import logger
+from core.settings import settings
+
+BITRIX_POOL = "bitrix"
+BOLASHAQ_POOL = "bolashaq"
+PHP_ENDPOINT_POOL = "php_endpoint"
+DEFAULT_TIMEOUT = 10.0
+
+
+class HTTPClientPool:
+    """
+    Долгоживущие httpx-клиенты с пулом keep-alive соединений.
+
+    Один клиент на апстрим (портал Битрикс24, портал Bolashaq, PHP endpoint),
+    чтобы TCP+TLS соединения переиспользовались между запросами.
+    """
+
+    def __init__(self) -> None:
+        self._clients: dict[str, httpx.AsyncClient] = {}
+
+    async def startup(self) -> None:
+        """Создание клиентов для всех известных апстримов"""
+        for pool_name in (BITRIX_POOL, BOLASHAQ_POOL, PHP_ENDPOINT_POOL):
+            self.get_client(pool_name)
+        logger.info(
+            "HTTP client pool started: "
+            f"max_connections={settings.HTTP_MAX_CONNECTIONS}, "
+            f"max_keepalive={settings.HTTP_MAX_KEEPALIVE_CONNECTIONS}, "
+            f"http2={settings.HTTP2_ENABLED}"
+        )
+
+    async def shutdown(self) -> None:
+        """Корректное закрытие всех соединений"""
+        clients = list(self._clients.items())
+        self._clients.clear()
+        for pool_name, client in clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"Error closing HTTP client {pool_name}: {e}")
+
+    def get_client(self, pool_name: str = BITRIX_POOL) -> httpx.AsyncClient:
+        """
+        Возвращает клиент для апстрима, создавая его при первом обращении
+        (например, при вызове вне lifespan приложения)
+        """
+        client = self._clients.get(pool_name)
+        if client is None or client.is_closed:
+            client = self._create_client()
+            self._clients[pool_name] = client
+        return client
+
+    def _create_client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+        )
+        try:
+            return httpx.AsyncClient(
+                timeout=DEFAULT_TIMEOUT,
+                limits=limits,
+                http2=settings.HTTP2_ENABLED,
+            )
+        except ImportError:
+            # Для HTTP/2 нужен пакет h2 (httpx[http2])
+            logger.warning("HTTP/2 is not available, falling back to HTTP/1.1")
+            return httpx.AsyncClient(timeout=DEFAULT_TIMEOUT, limits=limits)
+
+
+_http_pool_instance: HTTPClientPool | None = None
+
+
+def get_http_pool() -> HTTPClientPool:
+    global _http_pool_instance
+    if _http_pool_instance is None:
+        _http_pool_instance = HTTPClientPool()
+    return _http_pool_instance
+
+
+def get_http_client(pool_name: str = BITRIX_POOL) -> httpx.AsyncClient:
+    return get_http_pool().get_client(pool_name)
@@ -28,8 +28,11 @@ class InvoiceBitrixClient(
         entity_id: int | str,
         entity_type_id: int | None = None,
         crm: bool = True,
+        use_cache: bool = True,
     ) -> InvoiceCreate:
-        return await super().get(entity_id, ENTITY_TYPE_ID)
+        return await super().get(
+            entity_id, ENTITY_TYPE_ID, use_cache=use_cache
+        )
 
     async def update(
         self,
@@ -0,0 +1,138 @@
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Sequence
+
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.logger import logger
+from models.enums import JobStatusEnum
+from models.sync_models import SyncJob
+
+ACTIVE_STATUSES = (JobStatusEnum.PENDING, JobStatusEnum.RUNNING)
+
+
+class JobRepository:
+    """Хранение фоновых заданий"""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def create(self, kind: str, params: dict[str, Any]) -> SyncJob:
+        job = SyncJob(
+            kind=kind,
+            status=JobStatusEnum.PENDING,
+            params=params,
+            results={},
+            total=0,
+            processed=0,
+            succeeded=0,
+            failed=0,
+        )
+        self.session.add(job)
+        await self._commit()
+        await self.session.refresh(job)
+        return job
+
+    async def get(self, job_id: uuid.UUID) -> SyncJob | None:
+        return await self.session.get(  # type: ignore[no-any-return]
+            SyncJob, job_id, populate_existing=True
+        )
+
+    async def list_recent(
+        self, kind: str | None = None, limit: int = 20
+    ) -> Sequence[SyncJob]:
+        stmt = select(SyncJob).order_by(SyncJob.created_at.desc())
+        if kind:
+            stmt = stmt.where(SyncJob.kind == kind)
+        result = await self.session.execute(stmt.limit(limit))
+        return result.scalars().all()  # type: ignore[no-any-return]
+
+    async def list_claimable(self, stale_before: datetime) -> list[uuid.UUID]:
+        """Ожидающие задания и задания, чей исполнитель перестал работать"""
+        stmt = select(SyncJob.id).where(self._claimable(stale_before))
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
+
+    async def claim(
+        self, job_id: uuid.UUID, stale_before: datetime
+    ) -> SyncJob | None:
+        """
+        Захватывает задание для выполнения одним UPDATE. None - задание
+        уже выполняется другим процессом или завершено
+        """
+        now = datetime.now(timezone.utc)
+        stmt = (
+            update(SyncJob)
+            .where(SyncJob.id == job_id, self._claimable(stale_before))
+            .values(
+                status=JobStatusEnum.RUNNING,
+                heartbeat_at=now,
+                started_at=func.coalesce(SyncJob.started_at, now),
+            )
+            .returning(SyncJob)
+            .execution_options(populate_existing=True)
+        )
+        result = await self.session.execute(stmt)
+        job = result.scalar_one_or_none()
+        await self._commit()
+        return job  # type: ignore[no-any-return]
+
+    async def save(self, job_id: uuid.UUID, **values: Any) -> bool:
+        """Обновляет поля задания. Возвращает признак запрошенной отмены"""
+        stmt = (
+            update(SyncJob)
+            .where(SyncJob.id == job_id)
+            .values(**values)
+            .returning(SyncJob.cancel_requested)
+        )
+        result = await self.session.execute(stmt)
+        cancel_requested = bool(result.scalar())
+        await self._commit()
+        return cancel_requested
+
+    async def request_cancel(self, job_id: uuid.UUID) -> SyncJob | None:
+        """
+        Отмена задания. Ожидающее задание отменяется сразу, выполняемое -
+        исполнителем при следующем сохранении прогресса
+        """
+        job = await self.get(job_id)
+        if job is None or job.status not in ACTIVE_STATUSES:
+            return job
+        job.cancel_requested = True
+        if job.status == JobStatusEnum.PENDING:
+            job.status = JobStatusEnum.CANCELLED
+            job.finished_at = datetime.now(timezone.utc)
+        await self._commit()
+        return job
+
+    async def reopen(self, job_id: uuid.UUID) -> SyncJob | None:
+        """Возвращает прерванное задание в очередь на дообработку"""
+        job = await self.get(job_id)
+        if job is None or job.status not in (
+            JobStatusEnum.FAILED,
+            JobStatusEnum.CANCELLED,
+        ):
+            return job
+        job.status = JobStatusEnum.PENDING
+        job.cancel_requested = False
+        job.error = None
+        job.finished_at = None
+        await self._commit()
+        return job
+
+    def _claimable(self, stale_before: datetime) -> Any:
+        return or_(
+            SyncJob.status == JobStatusEnum.PENDING,
+            (SyncJob.status == JobStatusEnum.RUNNING)
+            & (SyncJob.heartbeat_at < stale_before),
+        )
+
+    async def _commit(self) -> None:
+        try:
+            await self.session.commit()
+        except SQLAlchemyError as e:
+            await self.session.rollback()
+            logger.error(f"Failed to save job: {e}")
+            raise
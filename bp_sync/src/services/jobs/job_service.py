@@ -0,0 +1,299 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Sequence
+
+from core.logger import logger
+from core.settings import settings
+from db.postgres import async_session
+from models.enums import JobStatusEnum
+from models.sync_models import SyncJob
+from schemas.job_schemas import LoadDealsParams
+
+from ..rabbitmq_client import get_rabbitmq
+from .job_repository import JobRepository
+
+LOAD_DEALS = "load_deals"
+
+
+class JobProgress:
+    """Прогресс выполняемого задания в памяти исполнителя"""
+
+    def __init__(self, job: SyncJob) -> None:
+        results = job.results or {}
+        self.job_id = job.id
+        self.success: dict[str, str] = dict(results.get("deal_success") or {})
+        self.fail: dict[str, str] = dict(results.get("deal_fail") or {})
+        self.cancelled = False
+
+    def is_done(self, entity_id: int) -> bool:
+        key = str(entity_id)
+        return key in self.success or key in self.fail
+
+    def record(self, entity_id: int, is_success: bool, message: str) -> None:
+        key = str(entity_id)
+        if is_success:
+            self.fail.pop(key, None)
+            self.success[key] = message
+        else:
+            self.fail[key] = message
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "results": {
+                "deal_success": dict(self.success),
+                "deal_fail": dict(self.fail),
+            },
+            "processed": len(self.success) + len(self.fail),
+            "succeeded": len(self.success),
+            "failed": len(self.fail),
+            "heartbeat_at": datetime.now(timezone.utc),
+        }
+
+
+class JobService:
+    """
+    Фоновые задания с состоянием в Postgres.
+
+    Задание создаётся в таблице sync_jobs и сразу запускается в текущем
+    процессе. Исполнитель периодически сохраняет прогресс и частичные
+    результаты, обновляя heartbeat_at, и проверяет запрос отмены.
+    Задания, чей исполнитель перестал обновлять heartbeat (перезапуск
+    сервиса), подхватываются заново и продолжаются с необработанных
+    сущностей.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = settings.JOB_CONCURRENCY,
+        heartbeat_timeout: int = settings.JOB_HEARTBEAT_TIMEOUT,
+        progress_interval: float = settings.JOB_PROGRESS_INTERVAL,
+    ) -> None:
+        self.concurrency = max(1, concurrency)
+        self.heartbeat_timeout = heartbeat_timeout
+        self.progress_interval = progress_interval
+        self._handlers: dict[
+            str, Callable[[SyncJob], Awaitable[JobStatusEnum]]
+        ] = {LOAD_DEALS: self._run_load_deals}
+        self._tasks: dict[uuid.UUID, asyncio.Task[None]] = {}
+        self._watcher: asyncio.Task[None] | None = None
+
+    async def startup(self) -> None:
+        """Запуск подхвата ожидающих и брошенных заданий"""
+        if self._watcher is None:
+            self._watcher = asyncio.create_task(
+                self._watch(), name="job-watcher"
+            )
+
+    async def shutdown(self) -> None:
+        """
+        Остановка исполнителей. Задания остаются в статусе running и
+        будут продолжены после истечения heartbeat_timeout
+        """
+        tasks = list(self._tasks.values())
+        if self._watcher is not None:
+            tasks.append(self._watcher)
+            self._watcher = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def submit(self, kind: str, params: dict[str, Any]) -> SyncJob:
+        """Создаёт задание и запускает его выполнение"""
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        async with async_session() as session:
+            job = await JobRepository(session).create(kind, params)
+        logger.info(f"Job {job.id} ({kind}) submitted")
+        self._start(job.id)
+        return job
+
+    async def get(self, job_id: uuid.UUID) -> SyncJob | None:
+        async with async_session() as session:
+            return await JobRepository(session).get(job_id)
+
+    async def list_jobs(
+        self, kind: str | None = None, limit: int = 20
+    ) -> Sequence[SyncJob]:
+        async with async_session() as session:
+            return await JobRepository(session).list_recent(kind, limit)
+
+    async def cancel(self, job_id: uuid.UUID) -> SyncJob | None:
+        async with async_session() as session:
+            return await JobRepository(session).request_cancel(job_id)
+
+    async def resume(self, job_id: uuid.UUID) -> SyncJob | None:
+        """Продолжает отменённое или упавшее задание"""
+        async with async_session() as session:
+            job = await JobRepository(session).reopen(job_id)
+        if job is not None and job.status == JobStatusEnum.PENDING:
+            self._start(job.id)
+        return job
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "running": len(self._tasks),
+        }
+
+    def _start(self, job_id: uuid.UUID) -> None:
+        if job_id in self._tasks:
+            return
+        task = asyncio.create_task(self._execute(job_id), name=f"job-{job_id}")
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    async def _watch(self) -> None:
+        while True:
+            try:
+                async with async_session() as session:
+                    job_ids = await JobRepository(session).list_claimable(
+                        self._stale_before()
+                    )
+                for job_id in job_ids:
+                    self._start(job_id)
+            except Exception as e:
+                logger.error(f"Failed to pick up jobs: {e}")
+            await asyncio.sleep(self.heartbeat_timeout)
+
+    async def _execute(self, job_id: uuid.UUID) -> None:
+        async with async_session() as session:
+            job = await JobRepository(session).claim(
+                job_id, self._stale_before()
+            )
+        if job is None:
+            return
+        logger.info(f"Job {job.id} ({job.kind}) started")
+        try:
+            status = await self._handlers[job.kind](job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            await self._save(
+                job_id,
+                status=JobStatusEnum.FAILED,
+                error=str(e),
+                finished_at=datetime.now(timezone.utc),
+            )
+            return
+        await self._save(
+            job_id, status=status, finished_at=datetime.now(timezone.utc)
+        )
+        logger.info(f"Job {job_id} finished: {status}")
+
+    async def _save(self, job_id: uuid.UUID, **values: Any) -> bool:
+        """Сохраняет поля задания. True - запрошена отмена"""
+        async with async_session() as session:
+            return await JobRepository(session).save(job_id, **values)
+
+    async def _report(self, progress: JobProgress) -> None:
+        """Периодическое сохранение прогресса и проверка отмены"""
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            try:
+                if await self._save(progress.job_id, **progress.snapshot()):
+                    progress.cancelled = True
+            except Exception as e:
+                logger.warning(f"Failed to save job progress: {e}")
+
+    def _stale_before(self) -> datetime:
+        return datetime.now(timezone.utc) - timedelta(
+            seconds=self.heartbeat_timeout
+        )
+
+    async def _run_load_deals(self, job: SyncJob) -> JobStatusEnum:
+        """Загрузка сделок за период в N параллельных задач"""
+        params = LoadDealsParams.model_validate(job.params)
+        progress = JobProgress(job)
+        reporter = asyncio.create_task(self._report(progress))
+        try:
+            deal_ids = job.items
+            if deal_ids is None:
+                deal_ids = await self._list_deal_ids(params)
+                await self._save(job.id, items=deal_ids, total=len(deal_ids))
+            logger.info(f"Job {job.id}: loading deals total {len(deal_ids)}")
+
+            pending: asyncio.Queue[int] = asyncio.Queue()
+            for deal_id in deal_ids:
+                if deal_id and not progress.is_done(deal_id):
+                    pending.put_nowait(int(deal_id))
+            workers = [
+                asyncio.create_task(self._load_deals_worker(pending, progress))
+                for _ in range(min(self.concurrency, pending.qsize()))
+            ]
+            try:
+                await asyncio.gather(*workers)
+            finally:
+                for worker in workers:
+                    worker.cancel()
+        finally:
+            reporter.cancel()
+            await asyncio.gather(reporter, return_exceptions=True)
+
+        if await self._save(job.id, **progress.snapshot()):
+            progress.cancelled = True
+        if progress.cancelled and not pending.empty():
+            return JobStatusEnum.CANCELLED
+        return JobStatusEnum.COMPLETED
+
+    async def _list_deal_ids(self, params: LoadDealsParams) -> list[int]:
+        from ..dependencies import get_service, worker_context
+
+        if params.deal_id:
+            return [params.deal_id]
+        async with worker_context():
+            deal_bitrix_client = await get_service("deal_bitrix_client")
+            deal_ids: list[int] = (
+                await deal_bitrix_client.get_deal_ids_for_period(
+                    params.start_date, params.end_date
+                )
+            )
+        return deal_ids
+
+    async def _load_deals_worker(
+        self, pending: asyncio.Queue[int], progress: JobProgress
+    ) -> None:
+        while not progress.cancelled:
+            try:
+                deal_id = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            is_success, message = await self._load_deal(deal_id)
+            progress.record(deal_id, is_success, message)
+
+    async def _load_deal(self, deal_id: int) -> tuple[bool, str]:
+        """Загрузка одной сделки в собственном контексте сервисов"""
+        from ..deals.deal_import_services import DealProcessor
+        from ..dependencies import get_service, worker_context
+
+        logger.info(f"Start loading deal id: {deal_id}")
+        try:
+            async with worker_context():
+                processor = DealProcessor(
+                    deal_client=await get_service("deal_client"),
+                    invoice_bitrix_client=await get_service(
+                        "invoice_bitrix_client"
+                    ),
+                    invoice_client=await get_service("invoice_client"),
+                    timeline_client=await get_service(
+                        "timeline_comment_bitrix_client"
+                    ),
+                    timeline_repo=await get_service(
+                        "timeline_comment_repository"
+                    ),
+                    rabbitmq_client=get_rabbitmq(),
+                )
+                return await processor.process_single_deal(deal_id)
+        except Exception as e:
+            return False, str(e)
+
+
+_job_service_instance: JobService | None = None
+
+
+def get_job_service() -> JobService:
+    global _job_service_instance
+    if _job_service_instance is None:
+        _job_service_instance = JobService()
+    return _job_service_instance
@@ -1,7 +1,7 @@
 from copy import deepcopy
 from dataclasses import dataclass
 from enum import IntEnum
-from typing import Any, Awaitable, Callable, cast
+from typing import Any, Awaitable, Callable
 
 from fastapi import status
 
@@ -65,6 +65,22 @@ class ProductBitrixClient(
         super().__init__(bitrix_client)
         self.code_service = code_service
         self.measure_repository = measure_repository
+        # Товары, уже полученные вместе с сущностью-владельцем
+        self._primed_products: dict[
+            tuple[EntityTypeAbbr, int], ListProductEntity
+        ] = {}
+
+    def prime_entity_products(
+        self,
+        owner_id: int,
+        owner_type: EntityTypeAbbr,
+        products: ListProductEntity,
+    ) -> None:
+        """Передаёт товары сущности для следующего чтения без запроса"""
+        self._primed_products[(owner_type, owner_id)] = products
+
+    def clear_primed_products(self) -> None:
+        self._primed_products.clear()
 
     @handle_bitrix_errors()
     async def _get_entity_products(
@@ -73,6 +89,9 @@ class ProductBitrixClient(
         owner_type: EntityTypeAbbr,
     ) -> ListProductEntity:
         """Получение товаров в сущности по ID"""
+        primed = self._primed_products.pop((owner_type, owner_id), None)
+        if primed is not None:
+            return primed
         logger.debug(
             f"Fetching products of owner type:{owner_type} ID={owner_id}"
         )
@@ -415,11 +434,7 @@ class ProductBitrixClient(
             select=["id", "iblockId", "measure", "name", "xmlId"],
             crm=False,
         )
-        return (
-            cast(ProductUpdate, products.result[0])
-            if products.result
-            else None
-        )
+        return products.result[0] if products.result else None
 
     async def _convert_to_base_product(
         self, variant_code: str
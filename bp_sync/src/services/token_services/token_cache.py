@@ -0,0 +1,85 @@
+import asyncio
+import time
+from dataclasses import dataclass
+
+EXPIRY_MARGIN = 30  # секунд до истечения, когда токен считаем устаревшим
+
+
+@dataclass
+class CachedToken:
+    value: str
+    expires_at: float
+
+
+class AccessTokenCache:
+    """
+    Кэш расшифрованного access token в памяти процесса.
+
+    Горячие вызовы API берут токен отсюда без обращения к Redis и без
+    расшифровки. Блокировка используется для того, чтобы обновление токена
+    выполнялось один раз на процесс, а остальные корутины ждали результат.
+    """
+
+    def __init__(self, expiry_margin: int = EXPIRY_MARGIN) -> None:
+        self.expiry_margin = expiry_margin
+        self._tokens: dict[str, CachedToken] = {}
+        self._revoked: dict[str, str] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    def get(self, key: str) -> str | None:
+        """Возвращает токен, если он ещё действителен"""
+        cached = self._tokens.get(key)
+        if cached is None:
+            return None
+        if cached.expires_at <= time.monotonic():
+            self._tokens.pop(key, None)
+            return None
+        return cached.value
+
+    def set(self, key: str, token: str, ttl: float) -> None:
+        """Сохраняет токен с учётом запаса до истечения срока"""
+        margin = min(self.expiry_margin, ttl / 2)
+        if ttl - margin <= 0:
+            return
+        if self._revoked.get(key) != token:
+            self._revoked.pop(key, None)
+        self._tokens[key] = CachedToken(
+            value=token, expires_at=time.monotonic() + ttl - margin
+        )
+
+    def invalidate(self, key: str, token: str | None = None) -> bool:
+        """
+        Удаляет токен из кэша и запоминает его как отклонённый. Если передан
+        token - удаляет только его, не затрагивая уже обновлённый другим
+        вызовом токен.
+        """
+        cached = self._tokens.get(key)
+        if cached is not None:
+            if token is not None and cached.value != token:
+                return False
+            self._tokens.pop(key, None)
+            token = token or cached.value
+        if token is not None:
+            self._revoked[key] = token
+        return True
+
+    def is_revoked(self, key: str, token: str) -> bool:
+        """Проверяет, был ли токен отклонён порталом"""
+        return self._revoked.get(key) == token
+
+    def lock(self, key: str) -> asyncio.Lock:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[key] = lock
+        return lock
+
+
+_token_cache_instance: AccessTokenCache | None = None
+
+
+def get_access_token_cache() -> AccessTokenCache:
+    global _token_cache_instance
+    if _token_cache_instance is None:
+        _token_cache_instance = AccessTokenCache()
+    return _token_cache_instance
@@ -3,6 +3,7 @@ from typing import Literal
 
 from fastapi import Depends
 from redis.asyncio import Redis
+from redis.asyncio.lock import Lock
 from redis.exceptions import RedisError
 
 from core.logger import logger
@@ -13,6 +14,7 @@ from .token_cipher import TokenCipher, get_token_cipher
 
 TokenType = Literal["refresh_token", "access_token"]
 DEFAULT_REFRESH_TTL = 15_552_000  # 180 дней в секундах
+REFRESH_LOCK_TIMEOUT = 30
 
 
 class TokenStorage:
@@ -64,6 +66,51 @@ class TokenStorage:
             logger.error(f"Unexpected get error for {key}: {e}")
             return None
 
+    async def get_token_with_ttl(
+        self,
+        token_type: TokenType,
+        user_id: str = str(settings.SERVICE_USER),
+        provider: str = settings.PROVIDER_B24,
+    ) -> tuple[str | None, int]:
+        """
+        Получает и расшифровывает токен вместе с оставшимся временем жизни
+        (в секундах) за один запрос к Redis
+        """
+        key = f"{token_type}:{user_id}:{provider}"
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.get(key)
+                pipe.ttl(key)
+                encrypted_token, ttl = await pipe.execute()
+            if not encrypted_token:
+                logger.debug(f"Token not found for {key}")
+                return None, 0
+            token = await self.token_cipher.decrypt(encrypted_token)
+            return token, int(ttl) if ttl and ttl > 0 else 0
+        except RedisError as e:
+            logger.error(f"Redis get error for {key}: {e}")
+            raise ConnectionError("Token retrieval failed") from e
+        except Exception as e:
+            logger.error(f"Unexpected get error for {key}: {e}")
+            return None, 0
+
+    def refresh_lock(
+        self,
+        user_id: str = str(settings.SERVICE_USER),
+        provider: str = settings.PROVIDER_B24,
+        timeout: int = REFRESH_LOCK_TIMEOUT,
+    ) -> Lock:
+        """
+        Распределённая блокировка обновления токена: обновление выполняется
+        одним воркером кластера, остальные ждут его результат
+        """
+        return self.redis.lock(
+            name=f"token_refresh_lock:{user_id}:{provider}",
+            timeout=timeout,
+            blocking_timeout=timeout,
+            thread_local=False,
+        )
+
     async def delete_token(
         self,
         token_type: TokenType,
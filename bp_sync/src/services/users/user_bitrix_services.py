@@ -1,23 +1,42 @@
+from typing import Any
+
 from fastapi import HTTPException, status
+from pydantic import ValidationError
 
 from core.logger import logger
 from schemas.user_schemas import UserCreate
 
 from ..bitrix_services.bitrix_api_client import BitrixAPIClient
+from ..bitrix_services.entity_cache import (
+    BitrixEntityCache,
+    get_bitrix_entity_cache,
+)
 from ..decorators import handle_bitrix_errors
 
 
 class UserBitrixClient:
     entity_name = "user"
 
-    def __init__(self, bitrix_client: BitrixAPIClient):
+    def __init__(
+        self,
+        bitrix_client: BitrixAPIClient,
+        entity_cache: BitrixEntityCache | None = None,
+    ):
         self.bitrix_client = bitrix_client
+        self.entity_cache = entity_cache or get_bitrix_entity_cache()
 
     @handle_bitrix_errors()
     async def get(
-        self, entity_id: int, entity_type_id: int | None = None
+        self,
+        entity_id: int,
+        entity_type_id: int | None = None,
+        use_cache: bool = True,
     ) -> UserCreate:
         """Получение сущности по ID"""
+        if use_cache and (
+            cached := await self.entity_cache.get(self.entity_name, entity_id)
+        ):
+            return UserCreate(**cached)
         logger.debug(f"Fetching {self.entity_name} ID={entity_id}")
         response = await self.bitrix_client.call_api(
             f"{self.entity_name}.get", {"id": entity_id}
@@ -30,4 +49,33 @@ class UserBitrixClient:
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"{self.entity_name.capitalize()} not found",
             )
+        await self.entity_cache.set(
+            self.entity_name, entity_id, entity_data[0]
+        )
         return UserCreate(**entity_data[0])
+
+    async def evict_cached(self, entity_id: int | str) -> None:
+        """Удаляет сущность из кэша get"""
+        await self.entity_cache.invalidate(self.entity_name, entity_id)
+
+    @handle_bitrix_errors()
+    async def list_all(
+        self, filter_entity: dict[str, Any] | None = None
+    ) -> list[UserCreate]:
+        """Все пользователи по фильтру (user.get постранично по 50)"""
+        users: list[UserCreate] = []
+        start: int | None = 0
+        while start is not None:
+            params: dict[str, Any] = {"start": start}
+            if filter_entity:
+                params["FILTER"] = filter_entity
+            response = await self.bitrix_client.call_api(
+                f"{self.entity_name}.get", params
+            )
+            for entity_data in response.get("result") or []:
+                try:
+                    users.append(UserCreate(**entity_data))
+                except ValidationError as e:
+                    logger.error(f"Invalid user {entity_data.get('ID')}: {e}")
+            start = response.get("next")
+        return users
@@ -0,0 +1,246 @@
+from typing import Any
+
+import orjson
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from core.logger import logger
+from core.settings import settings
+from db.redis import get_redis
+
+KEY_PREFIX = "webhook"
+
+# Приём события. Если обработка уже запланирована - событие поглощается,
+# если идёт - помечается повторный прогон. Результат: 1 - запланировать.
+# Запланированное состояние живёт недолго (ttl): если событие так и не
+# попало в очередь, новые вебхуки снова принимаются
+ADMIT_SCRIPT = """
+local key = KEYS[1]
+local ttl = tonumber(ARGV[1])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+redis.call('HSET', key, 'last_seen', tostring(now))
+local state = redis.call('HGET', key, 'state')
+if state == 'running' then
+    redis.call('HSET', key, 'dirty', '1')
+end
+if state == 'queued' then
+    redis.call('EXPIRE', key, ttl)
+end
+if state then
+    return 0
+end
+redis.call('HSET', key, 'state', 'queued')
+redis.call('EXPIRE', key, ttl)
+return 1
+"""
+
+# Начало обработки после "тихого" окна. Результат - сколько секунд окна
+# осталось, '0' - обработка начата
+BEGIN_SCRIPT = """
+local key = KEYS[1]
+local window = tonumber(ARGV[1])
+local ttl = tonumber(ARGV[2])
+local queued_ttl = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local last_seen = tonumber(redis.call('HGET', key, 'last_seen') or '0')
+local wait = last_seen + window - now
+if wait > 0 then
+    if redis.call('HGET', key, 'state') == 'queued' then
+        redis.call('EXPIRE', key, queued_ttl)
+    end
+    return tostring(wait)
+end
+redis.call('HSET', key, 'state', 'running')
+redis.call('HDEL', key, 'dirty')
+redis.call('EXPIRE', key, ttl)
+return '0'
+"""
+
+# Завершение обработки. Результат: 1 - во время обработки были события,
+# нужен ещё один прогон
+FINISH_SCRIPT = """
+local key = KEYS[1]
+local queued_ttl = tonumber(ARGV[1])
+if redis.call('HGET', key, 'dirty') == '1' then
+    redis.call('HSET', key, 'state', 'queued')
+    redis.call('HDEL', key, 'dirty')
+    redis.call('EXPIRE', key, queued_ttl)
+    return 1
+end
+redis.call('DEL', key)
+return 0
+"""
+
+
+class WebhookCoalescer:
+    """
+    Объединение всплесков вебхуков по ключу (сущность, ID).
+
+    Пока обработка сущности запланирована, новые события поглощаются: она
+    всё равно получит актуальные данные из Битрикс24. События, пришедшие во
+    время обработки, схлопываются в один повторный прогон. Обработка
+    начинается после quiet_window секунд без новых событий: сам
+    коалесцер не ждёт, а сообщает остаток окна, и очередь откладывает
+    событие на это время. Состояние
+    хранится в Redis и общее для воркеров; без Redis объединение
+    отключается и обрабатывается каждое событие.
+
+    Запланированное состояние хранится queued_ttl секунд и продлевается
+    новыми событиями и отсрочками: если событие потеряно до публикации,
+    сущность не остаётся "запланированной" на весь state_ttl.
+
+    Также хранит отметки о собственных записях в Битрикс24, по которым
+    сервисы распознают "эхо" - вебхуки, вызванные нашими изменениями.
+    """
+
+    def __init__(
+        self,
+        redis: Redis | None = None,
+        quiet_window: float = settings.WEBHOOK_DEBOUNCE_SECONDS,
+        state_ttl: int = settings.WEBHOOK_COALESCE_TTL,
+        queued_ttl: int = settings.WEBHOOK_QUEUED_TTL,
+        echo_ttl: int = settings.WEBHOOK_ECHO_TTL,
+    ) -> None:
+        self.redis = redis
+        self.quiet_window = quiet_window
+        self.state_ttl = state_ttl
+        # Окно должно успеть пройти, пока событие запланировано
+        self.queued_ttl = max(queued_ttl, int(quiet_window) + 1)
+        self.echo_ttl = echo_ttl
+        self._scripts: dict[str, Any] = {}
+        self.admitted = 0
+        self.coalesced = 0
+        self.follow_ups = 0
+        self.deferred = 0
+        self.echoes_dropped = 0
+
+    def state_key(self, entity: str, entity_id: int | str) -> str:
+        return f"{KEY_PREFIX}:state:{entity}:{entity_id}"
+
+    def echo_key(self, entity: str, entity_id: int | str) -> str:
+        return f"{KEY_PREFIX}:echo:{entity}:{entity_id}"
+
+    async def admit(self, entity: str, entity_id: int | str) -> bool:
+        """Регистрирует событие. False - событие поглощено"""
+        result = await self._run(
+            ADMIT_SCRIPT, self.state_key(entity, entity_id), self.queued_ttl
+        )
+        if result is None or int(result):
+            self.admitted += 1
+            return True
+        self.coalesced += 1
+        logger.debug(f"Coalesced webhook for {entity} {entity_id}")
+        return False
+
+    async def begin(
+        self,
+        entity: str,
+        entity_id: int | str,
+        quiet_window: float | None = None,
+    ) -> float:
+        """
+        Отмечает начало обработки, если всплеск событий закончился.
+        Возвращает, сколько секунд ещё ждать; 0 - обработка начата
+        """
+        window = self.quiet_window if quiet_window is None else quiet_window
+        wait = await self._run(
+            BEGIN_SCRIPT,
+            self.state_key(entity, entity_id),
+            window,
+            self.state_ttl,
+            self.queued_ttl,
+        )
+        if wait is None or float(wait) <= 0:
+            return 0.0
+        self.deferred += 1
+        return float(wait)
+
+    async def finish(self, entity: str, entity_id: int | str) -> bool:
+        """Завершает обработку. True - нужен повторный прогон"""
+        result = await self._run(
+            FINISH_SCRIPT, self.state_key(entity, entity_id), self.queued_ttl
+        )
+        if result is not None and int(result):
+            self.follow_ups += 1
+            return True
+        return False
+
+    async def release(self, entity: str, entity_id: int | str) -> None:
+        """Сбрасывает состояние после ошибки обработки"""
+        if self.redis is None:
+            return
+        try:
+            await self.redis.delete(self.state_key(entity, entity_id))
+        except RedisError as e:
+            logger.warning(f"Failed to release {entity} {entity_id}: {e}")
+
+    async def remember_write(
+        self, entity: str, entity_id: int | str, data: dict[str, Any]
+    ) -> None:
+        """Сохраняет отметку о записи сущности в Битрикс24"""
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(
+                self.echo_key(entity, entity_id),
+                orjson.dumps(data).decode(),
+                ex=self.echo_ttl,
+            )
+        except RedisError as e:
+            logger.warning(f"Failed to store write of {entity}: {e}")
+
+    async def get_write(
+        self, entity: str, entity_id: int | str
+    ) -> dict[str, Any] | None:
+        """Последняя собственная запись сущности, если она ещё актуальна"""
+        if self.redis is None:
+            return None
+        try:
+            raw = await self.redis.get(self.echo_key(entity, entity_id))
+        except RedisError as e:
+            logger.warning(f"Failed to read write of {entity}: {e}")
+            return None
+        if not raw:
+            return None
+        try:
+            data = orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            return None
+        return data if isinstance(data, dict) else None
+
+    def stats(self) -> dict[str, Any]:
+        """Метрики объединения событий"""
+        return {
+            "enabled": self.redis is not None,
+            "quiet_window": self.quiet_window,
+            "admitted": self.admitted,
+            "coalesced": self.coalesced,
+            "follow_ups": self.follow_ups,
+            "deferred": self.deferred,
+            "echoes_dropped": self.echoes_dropped,
+        }
+
+    async def _run(self, script: str, key: str, *args: Any) -> Any:
+        if self.redis is None:
+            return None
+        try:
+            if script not in self._scripts:
+                self._scripts[script] = self.redis.register_script(script)
+            return await self._scripts[script](keys=[key], args=list(args))
+        except RedisError as e:
+            logger.warning(f"Webhook coalescing is unavailable: {e}")
+            return None
+
+
+_webhook_coalescer_instance: WebhookCoalescer | None = None
+
+
+async def get_webhook_coalescer() -> WebhookCoalescer:
+    global _webhook_coalescer_instance
+    if _webhook_coalescer_instance is None:
+        _webhook_coalescer_instance = WebhookCoalescer(await get_redis())
+    elif _webhook_coalescer_instance.redis is None:
+        _webhook_coalescer_instance.redis = await get_redis()
+    return _webhook_coalescer_instance
@@ -0,0 +1,271 @@
+import asyncio
+from typing import Any
+
+import aio_pika
+import orjson
+from aio_pika import ExchangeType, Message
+from aio_pika.abc import (
+    AbstractChannel,
+    AbstractExchange,
+    AbstractIncomingMessage,
+    AbstractQueue,
+)
+from aio_pika.exceptions import AMQPError
+from pydantic import ValidationError
+
+from core.logger import logger
+from core.settings import settings
+from schemas.deal_schemas import WebhookEvent
+
+from .rabbitmq_client import RabbitMQClient, get_rabbitmq
+
+SHUTDOWN_TIMEOUT = 30.0  # секунд на завершение обрабатываемых событий
+
+
+class WebhookQueue:
+    """
+    Очередь событий вебхуков Битрикс24.
+
+    Обработчик вебхука только проверяет событие и публикует его в
+    постоянную очередь RabbitMQ, ответ Битрикс24 уходит сразу. События
+    разбирает пул из `workers` воркеров: каждый создаёт сервисы в
+    собственном контексте с сессией БД и вызывает обработку сущности.
+    Неуспешное событие публикуется повторно через очередь задержки с
+    удвоением паузы от `retry_delay`, после `max_attempts` попыток уходит
+    в dead letter queue.
+
+    Отложенные события публикуются в очередь задержки без потребителей:
+    по истечении TTL сообщения RabbitMQ переносит их в основную очередь.
+    Так "тихое" окно объединения вебхуков выдерживается без ожидания в
+    воркерах.
+    """
+
+    def __init__(
+        self,
+        rabbitmq: RabbitMQClient,
+        queue_name: str = settings.WEBHOOK_QUEUE_NAME,
+        workers: int = settings.WEBHOOK_WORKERS,
+        max_attempts: int = settings.WEBHOOK_MAX_ATTEMPTS,
+        retry_delay: float = settings.WEBHOOK_RETRY_DELAY,
+    ) -> None:
+        self.rabbitmq = rabbitmq
+        self.queue_name = queue_name
+        self.delay_queue_name = f"{queue_name}.delay"
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay = max(0.0, retry_delay)
+        self.channel: AbstractChannel | None = None
+        self.exchange: AbstractExchange | None = None
+        self.queue: AbstractQueue | None = None
+        self._consumer_tag: str | None = None
+        self._buffer: asyncio.Queue[AbstractIncomingMessage] = asyncio.Queue()
+        self._worker_tasks: list[asyncio.Task[None]] = []
+        self.published = 0
+        self.processed = 0
+        self.retried = 0
+        self.deferred = 0
+        self.dead_lettered = 0
+        self.in_progress = 0
+
+    @property
+    def is_ready(self) -> bool:
+        return self.channel is not None and not self.channel.is_closed
+
+    async def startup(self) -> None:
+        """Объявление очереди событий на соединении RabbitMQClient"""
+        await self.rabbitmq.ensure_connection()
+        if not self.rabbitmq.connection:
+            raise RuntimeError("RabbitMQ connection is not initialized")
+
+        self.channel = await self.rabbitmq.connection.channel()
+        # Воркер получает не больше событий, чем может обработать сразу
+        await self.channel.set_qos(prefetch_count=self.workers)
+        self.exchange = await self.channel.declare_exchange(
+            name=settings.EXCHANGE_NAME,
+            type=ExchangeType.DIRECT,
+            durable=True,
+        )
+        self.queue = await self.channel.declare_queue(
+            name=self.queue_name,
+            durable=True,
+            arguments={"x-dead-letter-exchange": "dlx_exchange"},
+        )
+        await self.queue.bind(self.exchange, routing_key=self.queue_name)
+        delay_queue = await self.channel.declare_queue(
+            name=self.delay_queue_name,
+            durable=True,
+            arguments={
+                "x-dead-letter-exchange": settings.EXCHANGE_NAME,
+                "x-dead-letter-routing-key": self.queue_name,
+            },
+        )
+        await delay_queue.bind(
+            self.exchange, routing_key=self.delay_queue_name
+        )
+
+    async def start_workers(self) -> None:
+        """Запуск пула воркеров и подписка на очередь"""
+        if not self.queue:
+            raise RuntimeError("Webhook queue is not initialized")
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(), name=f"webhook-worker-{i}")
+            for i in range(self.workers)
+        ]
+        self._consumer_tag = await self.queue.consume(self._buffer.put)
+        logger.info(
+            f"Webhook workers started: {self.workers}, "
+            f"queue {self.queue_name}"
+        )
+
+    async def shutdown(self) -> None:
+        """Остановка приёма событий и завершение обрабатываемых"""
+        if self.queue and self._consumer_tag:
+            try:
+                await self.queue.cancel(self._consumer_tag)
+            except AMQPError as e:
+                logger.warning(f"Failed to cancel webhook consumer: {e}")
+            self._consumer_tag = None
+        if self._worker_tasks:
+            try:
+                await asyncio.wait_for(self._buffer.join(), SHUTDOWN_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning("Webhook workers did not finish in time")
+            for task in self._worker_tasks:
+                task.cancel()
+            await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+            self._worker_tasks = []
+        # Неподтверждённые события RabbitMQ вернёт в очередь
+        if self.channel and not self.channel.is_closed:
+            try:
+                await self.channel.close()
+            except AMQPError as e:
+                logger.warning(f"Failed to close webhook channel: {e}")
+        self.channel = None
+
+    async def publish(self, event: WebhookEvent, delay: float = 0.0) -> bool:
+        """
+        Публикует событие, при delay > 0 - с отложенной на delay секунд
+        доставкой. False - событие не принято очередью
+        """
+        if not self.exchange or not self.is_ready:
+            return False
+        try:
+            await self.exchange.publish(
+                Message(
+                    body=orjson.dumps(event.model_dump()),
+                    content_type="application/json",
+                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                    expiration=delay if delay > 0 else None,
+                ),
+                routing_key=(
+                    self.delay_queue_name if delay > 0 else self.queue_name
+                ),
+            )
+        except (AMQPError, RuntimeError, ConnectionError) as e:
+            logger.error(
+                f"Failed to enqueue {event.entity} {event.entity_id}: {e}"
+            )
+            return False
+        self.published += 1
+        return True
+
+    async def _worker(self) -> None:
+        while True:
+            message = await self._buffer.get()
+            self.in_progress += 1
+            try:
+                await self._process_message(message)
+            except Exception as e:
+                logger.error(f"Webhook worker failed: {e}")
+            finally:
+                self.in_progress -= 1
+                self._buffer.task_done()
+
+    async def _process_message(self, message: AbstractIncomingMessage) -> None:
+        try:
+            event = WebhookEvent.model_validate(orjson.loads(message.body))
+        except (orjson.JSONDecodeError, ValidationError) as e:
+            logger.error(f"Invalid webhook event in queue: {e}")
+            self.dead_lettered += 1
+            await message.reject(requeue=False)
+            return
+
+        try:
+            wait = await self.handle(event)
+        except Exception as e:
+            logger.error(
+                f"Failed to process {event.entity} {event.entity_id} "
+                f"(attempt {event.attempt}/{self.max_attempts}): {e}"
+            )
+            await self._retry_or_dead_letter(message, event)
+            return
+
+        if wait > 0:
+            await self._defer(message, event, wait)
+            return
+        self.processed += 1
+        await message.ack()
+
+    async def _defer(
+        self,
+        message: AbstractIncomingMessage,
+        event: WebhookEvent,
+        wait: float,
+    ) -> None:
+        """Возвращает событие в очередь задержки до конца "тихого" окна"""
+        if await self.publish(event, delay=wait):
+            self.deferred += 1
+            await message.ack()
+        else:
+            await message.nack(requeue=True)
+
+    async def _retry_or_dead_letter(
+        self, message: AbstractIncomingMessage, event: WebhookEvent
+    ) -> None:
+        if event.attempt >= self.max_attempts:
+            self.dead_lettered += 1
+            await message.reject(requeue=False)
+            return
+        retry = event.model_copy(update={"attempt": event.attempt + 1})
+        # Повтор откладывается, чтобы временная ошибка успела пройти
+        delay = self.retry_delay * 2 ** (event.attempt - 1)
+        if await self.publish(retry, delay=delay):
+            self.retried += 1
+            await message.ack()
+        else:
+            await message.nack(requeue=True)
+
+    async def handle(self, event: WebhookEvent) -> float:
+        """
+        Обработка события в отдельном контексте сервисов. Возвращает, на
+        сколько секунд отложить событие; 0 - событие обработано
+        """
+        from .dependencies import get_service, worker_context
+
+        async with worker_context():
+            client = await get_service(f"{event.entity}_client")
+            return float(await client.run_webhook_event(event))
+
+    def stats(self) -> dict[str, Any]:
+        """Метрики очереди событий"""
+        return {
+            "ready": self.is_ready,
+            "workers": self.workers,
+            "in_progress": self.in_progress,
+            "buffered": self._buffer.qsize(),
+            "published": self.published,
+            "processed": self.processed,
+            "retried": self.retried,
+            "deferred": self.deferred,
+            "dead_lettered": self.dead_lettered,
+        }
+
+
+_webhook_queue_instance: WebhookQueue | None = None
+
+
+def get_webhook_queue() -> WebhookQueue:
+    global _webhook_queue_instance
+    if _webhook_queue_instance is None:
+        _webhook_queue_instance = WebhookQueue(get_rabbitmq())
+    return _webhook_queue_instance